@@ -61,7 +61,9 @@ async function loadCsv(filePath: string): Promise<{ rows: AnyRecord[]; columns:
 async function getLatestFilename(): Promise<string> {
   const versionHistoryPath = path.join(process.cwd(), "data", "version_history.txt");
   const versionHistoryText = await fs.readFile(versionHistoryPath, "utf8");
-  const lines = versionHistoryText.trim().split("\n").filter(line => line.trim() && !line.trim().startsWith('#'));
+  // Skip comments and delta entries (replications_delta_*.csv); the site serves
+  // the latest full snapshot written by `python versioning.py compact`
+  const lines = versionHistoryText.trim().split("\n").filter(line => line.trim() && !line.trim().startsWith('#') && !line.includes("replications_delta_"));
   const lastLine = lines[lines.length - 1];
   // Strip any inline comments
   const filename = lastLine.split('#')[0].trim();
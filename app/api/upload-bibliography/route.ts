@@ -51,47 +51,109 @@ function extractDoisFromRis(content: string): string[] {
   return dois;
 }
 
-// Normalize DOI for comparison (remove https://doi.org/ prefix, lowercase)
-function normalizeDoi(doi: string): string {
-  return doi
-    .replace(/^https?:\/\/doi\.org\//i, "")
-    .replace(/^doi:/i, "")
-    .toLowerCase()
-    .trim();
+// Canonical DOI, by the same rules as data_ingestor/dois.py (which builds the DOI index):
+// percent-decoded, the first 10.<registrant>/<suffix> in the value (so doi.org URLs and
+// "doi:" prefixes work), a dropped leading 1 after doi.org/ restored, trailing punctuation
+// and an unbalanced ) or ] removed, lowercased. Returns null if there is no DOI.
+const DOI_REGEX = /(?:10|(?<=doi\.org\/)0)\.\d{4,9}\/[^\s"'?#]+/;
+
+function normalizeDoi(value: string): string | null {
+  if (!value || !value.trim()) return null;
+  if (value.includes("%")) {
+    try {
+      value = decodeURIComponent(value);
+    } catch {
+      // Malformed escapes: match the value as it is
+    }
+  }
+  const match = value.match(DOI_REGEX);
+  if (!match) return null;
+  let doi = match[0].replace(/[.,;:]+$/, "");
+  for (const [opening, closing] of [["(", ")"], ["[", "]"]]) {
+    if (doi.endsWith(closing) && doi.split(opening).length < doi.split(closing).length) {
+      doi = doi.slice(0, -1).replace(/[.,;:]+$/, "");
+    }
+  }
+  doi = doi.toLowerCase();
+  return doi.startsWith("0.") ? "1" + doi : doi;
 }
 
 // Extract DOIs from database URL column
 function extractDoiFromUrl(url: string): string | null {
-  if (!url) return null;
-  // Try to extract DOI from URL (handles both http://doi.org/10.xxx and https://doi.org/10.xxx)
-  const urlMatch = url.match(/https?:\/\/doi\.org\/(10\.\d+\/[^\s"<>'&]+)/i);
-  if (urlMatch) {
-    return normalizeDoi(urlMatch[1]);
-  }
-  // Try to extract DOI pattern directly (in case it's not a full URL)
-  const doiMatch = url.match(/(10\.\d+\/[^\s"<>'&]+)/i);
-  if (doiMatch) {
-    return normalizeDoi(doiMatch[1]);
-  }
-  return null;
+  return normalizeDoi(url);
 }
 
 async function getLatestFilename(): Promise<string> {
   const versionHistoryPath = path.join(process.cwd(), "data", "version_history.txt");
   const versionHistoryText = await fs.readFile(versionHistoryPath, "utf8");
-  const lines = versionHistoryText.trim().split("\n").filter(line => line.trim());
+  // Skip comments and delta entries (replications_delta_*.csv); only full snapshots are read here
+  const lines = versionHistoryText.trim().split("\n").filter(line => line.trim() && !line.trim().startsWith('#') && !line.includes("replications_delta_"));
   const lastLine = lines[lines.length - 1];
-  return lastLine.trim();
+  return lastLine.split('#')[0].trim();
 }
 
-async function loadDatabase(): Promise<AnyRecord[]> {
-  const filename = await getLatestFilename();
+async function loadDatabase(filename: string): Promise<AnyRecord[]> {
   const dataPath = path.join(process.cwd(), "data", filename);
   const csvText = await fs.readFile(dataPath, "utf8");
   const rows = csvParse(csvText);
   return rows as AnyRecord[];
 }
 
+// Sorted DOI index written next to each snapshot by data_ingestor/doi_index.py
+type DoiIndex = {
+  version: string;
+  dois: string[];
+  row_ids: number[][];
+  rows: Record<string, AnyRecord>;
+};
+
+let cachedIndex: DoiIndex | null = null;
+
+async function loadDoiIndex(filename: string): Promise<DoiIndex | null> {
+  if (cachedIndex && cachedIndex.version === filename) return cachedIndex;
+  const indexPath = path.join(process.cwd(), "data", filename.replace(/\.csv$/, ".doi_index.json"));
+  try {
+    cachedIndex = JSON.parse(await fs.readFile(indexPath, "utf8")) as DoiIndex;
+    return cachedIndex;
+  } catch {
+    // No index for this snapshot; fall back to scanning the CSV
+    return null;
+  }
+}
+
+// Binary search the sorted DOI list; returns the matching rows (empty if none)
+function lookupDoi(index: DoiIndex, doi: string): AnyRecord[] {
+  let lo = 0;
+  let hi = index.dois.length - 1;
+  while (lo <= hi) {
+    const mid = (lo + hi) >> 1;
+    const value = index.dois[mid];
+    if (value === doi) return index.row_ids[mid].map((id) => index.rows[String(id)]);
+    if (value < doi) lo = mid + 1;
+    else hi = mid - 1;
+  }
+  return [];
+}
+
+// Return [doi, row] pairs for every database row whose original DOI is in uniqueDois
+async function findMatchingRows(uniqueDois: string[]): Promise<Array<[string, AnyRecord]>> {
+  const filename = await getLatestFilename();
+  const index = await loadDoiIndex(filename);
+  if (index) {
+    return uniqueDois.flatMap((doi) => lookupDoi(index, doi).map((row): [string, AnyRecord] => [doi, row]));
+  }
+
+  const database = await loadDatabase(filename);
+  const found: Array<[string, AnyRecord]> = [];
+  for (const row of database) {
+    const dbDoi = extractDoiFromUrl(String(row.original_url || ""));
+    if (dbDoi && uniqueDois.includes(dbDoi)) {
+      found.push([dbDoi, row]);
+    }
+  }
+  return found;
+}
+
 export async function POST(request: NextRequest) {
   try {
     const formData = await request.formData();
@@ -133,11 +195,11 @@ export async function POST(request: NextRequest) {
     }
 
     // Normalize DOIs for comparison
-    const normalizedDois = dois.map(normalizeDoi);
+    const normalizedDois = dois.map(normalizeDoi).filter((doi): doi is string => doi !== null);
     const uniqueDois = Array.from(new Set(normalizedDois));
 
-    // Load database
-    const database = await loadDatabase();
+    // Look up matching rows (via the DOI index when available)
+    const matchingRows = await findMatchingRows(uniqueDois);
 
     // Find matches
     const matches: Array<{
@@ -153,27 +215,23 @@ export async function POST(request: NextRequest) {
       replicationN: number | null;
     }> = [];
 
-    for (const row of database) {
+    for (const [dbDoi, row] of matchingRows) {
       const originalUrl = String(row.original_url || "");
-      const dbDoi = extractDoiFromUrl(originalUrl);
-      
-      if (dbDoi && uniqueDois.includes(dbDoi)) {
-        const originalEs = row.original_es_r != null ? Number(row.original_es_r) : null;
-        const replicationEs = row.replication_es_r != null ? Number(row.replication_es_r) : null;
-        
-        matches.push({
-          doi: dbDoi,
-          originalUrl: originalUrl,
-          description: String(row.description || ""),
-          result: String(row.result || ""),
-          originalEs: Number.isFinite(originalEs) ? originalEs : null,
-          replicationEs: Number.isFinite(replicationEs) ? replicationEs : null,
-          originalEsType: String(row.original_es_type || ""),
-          replicationEsType: String(row.replication_es_type || ""),
-          originalN: row.original_n != null ? Number(row.original_n) : null,
-          replicationN: row.replication_n != null ? Number(row.replication_n) : null,
-        });
-      }
+      const originalEs = row.original_es_r != null ? Number(row.original_es_r) : null;
+      const replicationEs = row.replication_es_r != null ? Number(row.replication_es_r) : null;
+
+      matches.push({
+        doi: dbDoi,
+        originalUrl: originalUrl,
+        description: String(row.description || ""),
+        result: String(row.result || ""),
+        originalEs: Number.isFinite(originalEs) ? originalEs : null,
+        replicationEs: Number.isFinite(replicationEs) ? replicationEs : null,
+        originalEsType: String(row.original_es_type || ""),
+        replicationEsType: String(row.replication_es_type || ""),
+        originalN: row.original_n != null ? Number(row.original_n) : null,
+        replicationN: row.replication_n != null ? Number(row.replication_n) : null,
+      });
     }
 
     // Remove duplicates (same DOI might appear multiple times)
@@ -12,73 +12,57 @@ Usage:
 import pandas as pd
 import numpy as np
 import argparse
-import time
 import os
 import re
 import math
-from datetime import datetime
 from fetch_metadata_from_doi import fetch_metadata_from_doi
 from fetch_metadata_from_title import fetch_metadata_from_title
-from generate_citation_html_for_website import generate_citation_html_for_website
-
-# Get the directory where this script lives
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
-VERSION_HISTORY_PATH = os.path.join(DATA_DIR, 'version_history.txt')
+from generate_citation_html_for_website import generate_citation_html_series
+from export_aggregates import export_aggregates
+from doi_index import write_doi_index
+from schema import apply_schema_dtypes
+import sqlite_store
+import metrics
+from checkpoints import checkpoint_dir, has_checkpoint, load_checkpoint, save_checkpoint, clear_checkpoints
+from dedup import build_dedup_index, dedup_keys, find_duplicates
+from dois import canonical_doi, canonical_doi_series, canonicalize_url_columns, doi_url
+from versioning import (
+    DATA_DIR, ROW_ID_COLUMN, head_version, is_delta, materialize_version, compute_row_ids, diff_frames,
+    pending_version_path, write_pending, append_delta_rows, commit_version, compact,
+)
+
+# Stages whose output is checkpointed (see checkpoints.py). Duplicate detection
+# and saving ("merge") always rerun, since they depend on the current master.
+INGEST_STAGES = ['enrich', 'effect_sizes', 'citations', 'filter']
+ENRICH_CHECKPOINT_EVERY = 25
+
+# Bibliographic fields filled by enrichment (as {prefix}_{field} columns)
+METADATA_FIELDS = ['authors', 'title', 'journal', 'volume', 'issue', 'pages', 'year']
+# Authors with abbreviated first names, e.g. "J. Smith" (see needs_enrichment)
+ABBREVIATED_AUTHORS_PATTERN = r'(?:^| )[A-Z]\. '
+ABBREVIATED_AUTHORS_RE = re.compile(ABBREVIATED_AUTHORS_PATTERN)
+
+# Bits of the enrichment mask (see enrichment_mask): one per empty
+# METADATA_FIELDS column, then abbreviated authors and abbreviated journal
+MISSING_FIELD_BITS = {field: 1 << i for i, field in enumerate(METADATA_FIELDS)}
+ANY_MISSING_FIELD = sum(MISSING_FIELD_BITS.values())
+ABBREVIATED_AUTHORS_BIT = 1 << len(METADATA_FIELDS)
+ABBREVIATED_JOURNAL_BIT = 1 << (len(METADATA_FIELDS) + 1)
+ENRICHMENT_BITS = {**{f'missing_{field}': bit for field, bit in MISSING_FIELD_BITS.items()},
+                   'abbreviated_authors': ABBREVIATED_AUTHORS_BIT, 'abbreviated_journal': ABBREVIATED_JOURNAL_BIT}
 
 
 def get_latest_master_database():
-    """Get the latest master database filename from version_history.txt"""
-    if not os.path.exists(VERSION_HISTORY_PATH):
-        return None
-
-    with open(VERSION_HISTORY_PATH, 'r') as f:
-        lines = f.readlines()
-
-    # Find the last non-empty line
-    for line in reversed(lines):
-        line = line.strip()
-        # Skip empty lines and comments
-        if line and not line.startswith('#'):
-            # Extract just the filename (remove any path prefix and comments)
-            filename = line.split('#')[0].strip()
-            # Handle both relative paths and just filenames
-            if filename.startswith('../data/'):
-                filename = filename.replace('../data/', '')
-            return filename
-
-    return None
+    """Get the latest version entry (snapshot or delta filename) from version_history.txt"""
+    return head_version()
 
 def extract_doi_from_url(url):
-    """Extract DOI from URL like 'http://doi.org/10.1234/xyz'"""
-    if not isinstance(url, str) or not url.strip():
-        return None
-    url = url.strip()
-    if url.startswith("http://doi.org/"):
-        return url.replace("http://doi.org/", "")
-    elif url.startswith("https://doi.org/"):
-        return url.replace("https://doi.org/", "")
-    return None
+    """Canonical DOI from a URL like 'http://doi.org/10.1234/xyz' (see dois.py), or None"""
+    return canonical_doi(url)
 
 def normalize_doi(doi):
-    """
-    Normalize a DOI by removing any URL prefix.
-    Handles cases where DOI might already be a full URL.
-    Returns just the DOI part (e.g., '10.1234/xyz')
-    """
-    if not isinstance(doi, str) or not doi.strip():
-        return None
-    doi = doi.strip()
-    # Strip common URL prefixes
-    if doi.startswith("http://doi.org/"):
-        doi = doi.replace("http://doi.org/", "")
-    elif doi.startswith("https://doi.org/"):
-        doi = doi.replace("https://doi.org/", "")
-    elif doi.startswith("http://dx.doi.org/"):
-        doi = doi.replace("http://dx.doi.org/", "")
-    elif doi.startswith("https://dx.doi.org/"):
-        doi = doi.replace("https://dx.doi.org/", "")
-    return doi if doi else None
+    """Canonical DOI from a DOI that may be a full URL (see dois.py), e.g. '10.1234/xyz'"""
+    return canonical_doi(doi)
 
 def is_empty(value):
     """Check if value is empty/missing"""
@@ -278,6 +262,16 @@ def r2_to_r(r2):
     return math.sqrt(r2)
 
 
+# APA test statistic grammar (case-insensitive, with χ written as x). Shared with
+# pdf_processing/prefilter.py, which searches running text for the same patterns.
+TEST_STATISTIC_PATTERNS = {
+    't': r't\((\d+)\)\s*=\s*(-?\d+\.?\d*)',
+    'F': r'f\((\d+)\s*,\s*(\d+)\)\s*=\s*(\d+\.?\d*)',
+    'z': r'z\s*=\s*(-?\d+\.?\d*)\s*,\s*n\s*=\s*(\d+)',
+    'chi2': r'x2\(\s*1\s*,\s*n\s*=\s*(\d+)\s*\)\s*=\s*(\d+\.?\d*)',
+}
+
+
 def parse_test_statistic(stat_string):
     """
     Parse APA-formatted test statistics and convert to r.
@@ -296,14 +290,14 @@ def parse_test_statistic(stat_string):
     stat_string = stat_string.strip()
 
     # t-test: t(df) = value
-    t_match = re.match(r'^t\((\d+)\)\s*=\s*(-?\d+\.?\d*)$', stat_string, re.IGNORECASE)
+    t_match = re.match(f"^{TEST_STATISTIC_PATTERNS['t']}$", stat_string, re.IGNORECASE)
     if t_match:
         df = float(t_match.group(1))
         t_val = float(t_match.group(2))
         return t_val / math.sqrt(t_val ** 2 + df)
 
     # F-test: F(df1, df2) = value
-    f_match = re.match(r'^f\((\d+)\s*,\s*(\d+)\)\s*=\s*(\d+\.?\d*)$', stat_string, re.IGNORECASE)
+    f_match = re.match(f"^{TEST_STATISTIC_PATTERNS['F']}$", stat_string, re.IGNORECASE)
     if f_match:
         df1 = float(f_match.group(1))
         df2 = float(f_match.group(2))
@@ -315,7 +309,7 @@ def parse_test_statistic(stat_string):
             return None  # Cannot convert F with df1 > 1
 
     # z-test: z = value, N = value
-    z_match = re.match(r'^z\s*=\s*(-?\d+\.?\d*)\s*,\s*n\s*=\s*(\d+)$', stat_string, re.IGNORECASE)
+    z_match = re.match(f"^{TEST_STATISTIC_PATTERNS['z']}$", stat_string, re.IGNORECASE)
     if z_match:
         z_val = float(z_match.group(1))
         n_val = float(z_match.group(2))
@@ -324,7 +318,7 @@ def parse_test_statistic(stat_string):
     # Chi-squared: χ2(1, N = value) = value or x2(1, N = value) = value
     # Replace χ with x for matching
     normalized_stat = re.sub(r'^[χΧ]', 'x', stat_string)
-    chi_match = re.match(r'^x2\(\s*1\s*,\s*n\s*=\s*(\d+)\s*\)\s*=\s*(\d+\.?\d*)$', normalized_stat, re.IGNORECASE)
+    chi_match = re.match(f"^{TEST_STATISTIC_PATTERNS['chi2']}$", normalized_stat, re.IGNORECASE)
     if chi_match:
         n_val = float(chi_match.group(1))
         chi_val = float(chi_match.group(2))
@@ -486,30 +480,79 @@ def calculate_effect_sizes(df):
 
     return df
 
-def needs_enrichment(row, prefix):
-    """Check if any key metadata fields are missing or abbreviated"""
-    fields_to_check = ['authors', 'title', 'journal', 'volume', 'issue', 'pages', 'year']
+def is_abbreviated_journal(journal):
+    """Highly abbreviated journal names (less than 10 chars with a '.'), e.g. "J. Pers." """
+    return isinstance(journal, str) and len(journal.strip()) < 10 and "." in journal
 
-    # Check if any field is missing or doesn't exist
-    for field in fields_to_check:
+def enrichment_bits(row, prefix):
+    """The enrichment mask (see enrichment_mask) of a single row"""
+    bits = 0
+    for field, bit in MISSING_FIELD_BITS.items():
         col_name = f"{prefix}_{field}"
         # Need enrichment if column doesn't exist OR if it's empty
         if col_name not in row.index or is_empty(row.get(col_name)):
-            return True
-
-    # Check if authors contains abbreviated names (single letter first names like "J.")
+            bits |= bit
     authors = row.get(f"{prefix}_authors")
-    if isinstance(authors, str) and authors.strip():
-        # Check for pattern like "J. " or "M. " (abbreviated first names)
-        if any(f" {c}. " in authors or authors.startswith(f"{c}. ") for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"):
-            return True
-
-    # Check if journal is highly abbreviated (less than 10 chars, likely abbreviated)
-    journal = row.get(f"{prefix}_journal")
-    if isinstance(journal, str) and len(journal.strip()) < 10 and "." in journal:
-        return True
+    if isinstance(authors, str) and ABBREVIATED_AUTHORS_RE.search(authors):
+        bits |= ABBREVIATED_AUTHORS_BIT
+    if is_abbreviated_journal(row.get(f"{prefix}_journal")):
+        bits |= ABBREVIATED_JOURNAL_BIT
+    return bits
 
-    return False
+def needs_enrichment(row, prefix):
+    """Check if any key metadata fields are missing or abbreviated"""
+    return enrichment_bits(row, prefix) != 0
+
+def text_values(values):
+    """values as an object Series, so .where/.str work on categorical (schema.py) and string columns"""
+    if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values):
+        return values.astype(object)
+    return values
+
+def empty_mask(values):
+    """Vectorized is_empty: True where a value is missing, "", "NaN" or only whitespace"""
+    values = text_values(values)
+    if not pd.api.types.is_object_dtype(values):
+        return values.isna()
+    is_text = values.map(type, na_action='ignore') == str
+    text = values.where(is_text, 'x').astype(str)
+    return values.isna() | (is_text & ((text.str.strip() == '') | (text == 'NaN')))
+
+def enrichment_mask(df, prefix):
+    """
+    Per-row bitmask of why rows need enrichment for prefix, computed for the
+    whole DataFrame at once: MISSING_FIELD_BITS for each empty (or absent)
+    field, plus ABBREVIATED_AUTHORS_BIT and ABBREVIATED_JOURNAL_BIT. 0 means
+    the row is complete; see needs_enrichment for the single-row version.
+    """
+    mask = pd.Series(0, index=df.index, dtype='uint16')
+    for field, bit in MISSING_FIELD_BITS.items():
+        column = f'{prefix}_{field}'
+        mask |= (empty_mask(df[column]) if column in df.columns else True) * np.uint16(bit)
+
+    authors = df.get(f'{prefix}_authors')
+    if authors is not None:
+        authors = text_values(authors)
+        is_text = authors.map(type, na_action='ignore') == str
+        abbreviated = is_text & authors.where(is_text, '').str.contains(ABBREVIATED_AUTHORS_RE)
+        mask |= abbreviated * np.uint16(ABBREVIATED_AUTHORS_BIT)
+
+    journals = df.get(f'{prefix}_journal')
+    if journals is not None:
+        journals = text_values(journals)
+        is_text = journals.map(type, na_action='ignore') == str
+        text = journals.where(is_text, '')
+        abbreviated = is_text & (text.str.strip().str.len() < 10) & text.str.contains('.', regex=False)
+        mask |= abbreviated * np.uint16(ABBREVIATED_JOURNAL_BIT)
+    return mask.astype('uint16')
+
+def missing_field_count(mask):
+    """Number of empty fields in each enrichment mask value"""
+    return sum((mask & bit) != 0 for bit in MISSING_FIELD_BITS.values()).astype(int)
+
+def enrichment_reasons(bits):
+    """Names of the ENRICHMENT_BITS set in one mask value, e.g. ['missing_pages', 'abbreviated_authors']"""
+    return [name for name, bit in ENRICHMENT_BITS.items() if bits & bit]
 
 def enrich_from_metadata(row, prefix, metadata):
     """Fill row with metadata from API calls"""
@@ -561,8 +604,61 @@ def sanity_check_metadata(row, prefix, metadata):
     # If no year data to verify against, assume correct
     return True
 
-def process_row(row, row_idx, total_rows, doi_cache=None):
-    """Process a single row to enrich metadata"""
+def build_master_metadata(master_df):
+    """
+    Build {normalized DOI: {field: best known value}} from every original and
+    replication paper in the master database. For each field the most common
+    non-empty value is used, preferring unabbreviated authors and journals.
+    """
+    frames = []
+    for prefix in ('original', 'replication'):
+        if f'{prefix}_url' not in master_df.columns:
+            continue
+        part = pd.DataFrame({
+            field: master_df[f'{prefix}_{field}'].astype(object) if f'{prefix}_{field}' in master_df.columns else None
+            for field in METADATA_FIELDS
+        })
+        part['doi'] = canonical_doi_series(master_df[f'{prefix}_url'])
+        frames.append(part)
+    if not frames:
+        return {}
+    papers = pd.concat(frames, ignore_index=True).dropna(subset=['doi'])
+
+    master_metadata = {}
+    for field in METADATA_FIELDS:
+        values = papers[['doi', field]].dropna()
+        values = values[~values[field].map(is_empty)]
+        counts = values.groupby(['doi', field], sort=False).size().reset_index(name='count')
+        as_text = counts[field].astype(str)
+        if field == 'authors':
+            counts['abbreviated'] = as_text.str.contains(ABBREVIATED_AUTHORS_PATTERN)
+        elif field == 'journal':
+            counts['abbreviated'] = (as_text.str.strip().str.len() < 10) & as_text.str.contains('.', regex=False)
+        else:
+            counts['abbreviated'] = False
+        best = counts.sort_values(['abbreviated', 'count'], ascending=[True, False], kind='stable').drop_duplicates('doi')
+        for doi, value in zip(best['doi'], best[field]):
+            master_metadata.setdefault(doi, {})[field] = value
+    return master_metadata
+
+def fill_from_master_metadata(row, prefix, doi, master_metadata):
+    """Fill empty fields for the paper with this DOI from build_master_metadata's map"""
+    if master_metadata is None:
+        return row
+    known = master_metadata.get(canonical_doi(doi))
+    metrics.record_cache('master_metadata', known is not None)
+    if known:
+        print(f"  Filling {prefix} metadata from master database for DOI: {doi}")
+        row = enrich_from_metadata(row, prefix, known)
+    return row
+
+def process_row(row, row_idx, total_rows, doi_cache=None, master_metadata=None):
+    """
+    Process a single row to enrich metadata. Fields are filled from
+    master_metadata (see build_master_metadata) first, and from the APIs only
+    if a field is still empty (enrich_from_metadata never replaces values, so
+    abbreviated authors or journals alone don't justify a request).
+    """
     if doi_cache is None:
         doi_cache = {}
     print(f"\nProcessing row {row_idx + 1}/{total_rows}...")
@@ -572,15 +668,19 @@ def process_row(row, row_idx, total_rows, doi_cache=None):
     original_doi = extract_doi_from_url(original_url)
 
     if original_doi and needs_enrichment(row, 'original'):
-        if original_doi in doi_cache:
-            print(f"  Using cached metadata for original DOI: {original_doi}")
-            metadata = doi_cache[original_doi]
-        else:
-            print(f"  Fetching metadata for original DOI: {original_doi}")
-            metadata = fetch_metadata_from_doi(original_doi)
-            doi_cache[original_doi] = metadata
-            time.sleep(0.3)  # Rate limiting
-        row = enrich_from_metadata(row, 'original', metadata)
+        # Other rows of the master database may already have this paper's metadata
+        row = fill_from_master_metadata(row, 'original', original_doi, master_metadata)
+        if enrichment_bits(row, 'original') & ANY_MISSING_FIELD:
+            metrics.record_cache('doi_cache', original_doi in doi_cache)
+            if original_doi in doi_cache:
+                print(f"  Using cached metadata for original DOI: {original_doi}")
+                metadata = doi_cache[original_doi]
+            else:
+                print(f"  Fetching metadata for original DOI: {original_doi}")
+                metadata = fetch_metadata_from_doi(original_doi)
+                doi_cache[original_doi] = metadata
+                metrics.sleep(0.3)  # Rate limiting
+            row = enrich_from_metadata(row, 'original', metadata)
 
     # If no DOI URL but title exists, try to fetch DOI from title
     elif is_empty(original_url) and not is_empty(row.get('original_title')):
@@ -594,7 +694,7 @@ def process_row(row, row_idx, total_rows, doi_cache=None):
                 normalized_doi = normalize_doi(metadata['doi'])
                 if normalized_doi:
                     print(f"  ✓ Found and verified DOI: {normalized_doi}")
-                    row['original_url'] = f"http://doi.org/{normalized_doi}"
+                    row['original_url'] = doi_url(normalized_doi)
                     row = enrich_from_metadata(row, 'original', metadata)
                 else:
                     print(f"  ✗ Could not normalize DOI: {metadata['doi']}")
@@ -603,22 +703,26 @@ def process_row(row, row_idx, total_rows, doi_cache=None):
         else:
             print(f"  ✗ Could not find DOI from title")
 
-        time.sleep(0.3)  # Rate limiting
+        metrics.sleep(0.3)  # Rate limiting
 
     # ===== PROCESS REPLICATION STUDY =====
     replication_url = row.get('replication_url')
     replication_doi = extract_doi_from_url(replication_url)
 
     if replication_doi and needs_enrichment(row, 'replication'):
-        if replication_doi in doi_cache:
-            print(f"  Using cached metadata for replication DOI: {replication_doi}")
-            metadata = doi_cache[replication_doi]
-        else:
-            print(f"  Fetching metadata for replication DOI: {replication_doi}")
-            metadata = fetch_metadata_from_doi(replication_doi)
-            doi_cache[replication_doi] = metadata
-            time.sleep(0.3)  # Rate limiting
-        row = enrich_from_metadata(row, 'replication', metadata)
+        # Other rows of the master database may already have this paper's metadata
+        row = fill_from_master_metadata(row, 'replication', replication_doi, master_metadata)
+        if enrichment_bits(row, 'replication') & ANY_MISSING_FIELD:
+            metrics.record_cache('doi_cache', replication_doi in doi_cache)
+            if replication_doi in doi_cache:
+                print(f"  Using cached metadata for replication DOI: {replication_doi}")
+                metadata = doi_cache[replication_doi]
+            else:
+                print(f"  Fetching metadata for replication DOI: {replication_doi}")
+                metadata = fetch_metadata_from_doi(replication_doi)
+                doi_cache[replication_doi] = metadata
+                metrics.sleep(0.3)  # Rate limiting
+            row = enrich_from_metadata(row, 'replication', metadata)
 
     # If no DOI URL but title exists, try to fetch DOI from title
     elif is_empty(replication_url) and not is_empty(row.get('replication_title')):
@@ -632,7 +736,7 @@ def process_row(row, row_idx, total_rows, doi_cache=None):
                 normalized_doi = normalize_doi(metadata['doi'])
                 if normalized_doi:
                     print(f"  ✓ Found and verified DOI: {normalized_doi}")
-                    row['replication_url'] = f"http://doi.org/{normalized_doi}"
+                    row['replication_url'] = doi_url(normalized_doi)
                     row = enrich_from_metadata(row, 'replication', metadata)
                 else:
                     print(f"  ✗ Could not normalize DOI: {metadata['doi']}")
@@ -641,38 +745,72 @@ def process_row(row, row_idx, total_rows, doi_cache=None):
         else:
             print(f"  ✗ Could not find DOI from title")
 
-        time.sleep(0.3)  # Rate limiting
+        metrics.sleep(0.3)  # Rate limiting
 
     return row
 
-def generate_citations(df):
-    """Generate HTML citations for display on website"""
-    print("\nGenerating HTML citations...")
+def citation_keys(df, prefix):
+    """
+    One string per row identifying the citation inputs (authors, journal, year, url)
+    for prefix, so rows citing the same paper can share one generated citation
+    """
+    def column(name):
+        values = df[name].astype(object) if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        return values.where(values.notna(), '').astype(str)
 
-    # Extract DOI from URL for citation generation
-    def get_doi_for_citation(url):
-        doi = extract_doi_from_url(url)
-        return doi if doi else ""
-
-    df["replication_citation_html"] = df.apply(
-        lambda row: generate_citation_html_for_website(
-            row.get("replication_authors"),
-            row.get("replication_journal"),
-            row.get("replication_year"),
-            get_doi_for_citation(row.get("replication_url")),
-        ),
-        axis=1
-    )
+    years = pd.to_numeric(df[f'{prefix}_year'].astype(object), errors='coerce') if f'{prefix}_year' in df.columns \
+        else pd.Series(np.nan, index=df.index)
+    year = np.trunc(years).astype('Int64').astype(str).where(years.notna(), '')
+    return column(f'{prefix}_authors') + '\x1f' + column(f'{prefix}_journal') + '\x1f' + year + '\x1f' + column(f'{prefix}_url')
 
-    df["original_citation_html"] = df.apply(
-        lambda row: generate_citation_html_for_website(
-            row.get("original_authors"),
-            row.get("original_journal"),
-            row.get("original_year"),
-            get_doi_for_citation(row.get("original_url")),
-        ),
-        axis=1
-    )
+def citation_html_column(df, prefix, previous_df=None):
+    """
+    Citation HTML for each row of df. HTML is generated once per unique
+    (authors, journal, year, url) and broadcast back to the rows; inputs that
+    are unchanged from previous_df reuse its already generated HTML.
+    Returns (Series of HTML, number generated, number reused).
+    """
+    keys = citation_keys(df, prefix)
+    codes, unique_keys = pd.factorize(keys)
+    _, first_rows = np.unique(codes, return_index=True)
+    unique_rows = df.iloc[first_rows]
+
+    html = pd.Series(None, index=range(len(unique_keys)), dtype=object)
+    html_column = f'{prefix}_citation_html'
+    if previous_df is not None and not previous_df.empty and html_column in previous_df.columns:
+        previous_html = pd.Series(previous_df[html_column].astype(object).to_numpy(),
+                                  index=citation_keys(previous_df, prefix).to_numpy()).dropna()
+        previous_html = previous_html[~previous_html.index.duplicated(keep='last')]
+        html[:] = pd.Series(unique_keys).map(previous_html).to_numpy()
+    reused = int(html.notna().sum())
+
+    missing = html.isna().to_numpy()
+    if missing.any():
+        rows = unique_rows[missing]
+
+        def column(name):
+            return rows[name] if name in rows.columns else pd.Series(None, index=rows.index, dtype=object)
+
+        urls = column(f'{prefix}_url').astype(object)
+        dois = canonical_doi_series(urls).fillna('')
+        html[missing] = generate_citation_html_series(
+            column(f'{prefix}_authors'), column(f'{prefix}_journal'), column(f'{prefix}_year'), dois,
+        ).to_numpy()
+
+    return pd.Series(html.to_numpy()[codes], index=df.index), int(missing.sum()), reused
+
+def generate_citations(df, previous_df=None):
+    """
+    Generate HTML citations for display on website.
+    If previous_df (e.g. the previous version of the database) is given,
+    citations whose inputs haven't changed are copied from it instead of
+    being regenerated.
+    """
+    print("\nGenerating HTML citations...")
+
+    for prefix in ('replication', 'original'):
+        df[f'{prefix}_citation_html'], generated, reused = citation_html_column(df, prefix, previous_df)
+        print(f"  {prefix}: {generated} citations generated, {reused} reused for {len(df)} rows")
 
     return df
 
@@ -719,29 +857,139 @@ def reorder_columns(df, data_dict_path='data_dictionary.csv'):
     
     return df[final_column_order]
 
-def check_duplicate(row, master_df):
+def load_master_database():
     """
-    Check if row is duplicate based on original_url, replication_url, and description.
-    Returns True if duplicate found.
+    Load the latest master database from version_history.txt (snapshot + deltas).
+    Returns (version entry it was loaded from, DataFrame).
     """
-    if master_df.empty:
-        return False
+    latest_master = get_latest_master_database()
+    if latest_master:
+        print(f"\nLoading master database as of: {latest_master}")
+        try:
+            # Full-precision floats, since rows are written back to the database
+            master_df = apply_schema_dtypes(materialize_version(latest_master), float32=False)
+            print(f"  Loaded {len(master_df)} existing rows")
+        except FileNotFoundError as e:
+            print(f"  Master database file not found ({e.filename}), will create new one")
+            master_df = pd.DataFrame()
+    else:
+        print(f"\nNo master database found in version_history.txt, will create new one")
+        master_df = pd.DataFrame()
+    return latest_master, master_df
 
-    # Get values to check (handle different column names)
-    original_check = row.get('original_url')
-    replication_check = row.get('replication_url')
-    description_check = row.get('description')
+def index_snapshot(filename):
+    """Build the DOI lookup index for a newly committed full snapshot (deltas are skipped)"""
+    if filename and not is_delta(filename):
+        write_doi_index(materialize_version(filename), filename)
 
-    # Check for exact match on all three fields
-    matches = master_df[
-        (master_df['original_url'] == original_check) &
-        (master_df['replication_url'] == replication_check) &
-        (master_df['description'] == description_check)
-    ]
+def enrich_metadata(input_df, doi_cache, total_rows=None, checkpoint_dir=None, master_metadata=None):
+    """
+    Run process_row over every row of input_df and return the enriched DataFrame.
+    With a checkpoint_dir, progress is saved every ENRICH_CHECKPOINT_EVERY rows
+    and a previous partial run is picked up where it stopped.
+    """
+    total_rows = total_rows if total_rows is not None else len(input_df)
+    processed_rows = []
+    if checkpoint_dir:
+        partial = load_checkpoint(checkpoint_dir, 'enrich', partial=True)
+        if partial is not None:
+            processed_rows = [row for _, row in partial.iterrows()]
+            print(f"  Resuming enrichment after {len(processed_rows)} already processed rows")
+    for idx, row in input_df.iloc[len(processed_rows):].iterrows():
+        processed_row = process_row(row, idx, total_rows, doi_cache, master_metadata)
+        processed_rows.append(processed_row)
+        if checkpoint_dir and len(processed_rows) % ENRICH_CHECKPOINT_EVERY == 0:
+            save_checkpoint(checkpoint_dir, 'enrich', pd.DataFrame(processed_rows), partial=True)
+    return pd.DataFrame(processed_rows)
+
+def mark_unvalidated(new_rows_df):
+    """Set validated to "no" for any rows where it's empty"""
+    new_rows_df = new_rows_df.copy()
+    if 'validated' in new_rows_df.columns:
+        new_rows_df['validated'] = new_rows_df['validated'].apply(
+            lambda x: 'no' if pd.isna(x) or x == '' or (isinstance(x, str) and not x.strip()) else x
+        )
+    else:
+        new_rows_df['validated'] = 'no'
+    return new_rows_df
 
-    return len(matches) > 0
+def stage_banner(title):
+    print(f"\n{'='*60}")
+    print(title)
+    print(f"{'='*60}")
 
-def ingest_data(input_csv, skip_api_calls=False, discipline=None):
+def run_stages(input_df, input_csv, skip_api_calls=False, discipline=None, resume=False, from_stage=None,
+               master_df=None):
+    """
+    Run the checkpointed stages (INGEST_STAGES) over input_df and return the
+    filtered rows ready for duplicate detection.
+
+    Each stage's output is saved to a checkpoint directory keyed by the input
+    file and options. With resume, stages that already completed are loaded
+    instead of rerun (and a partial enrichment continues where it stopped).
+    With from_stage, that stage and everything after it are rerun from the
+    previous stage's checkpoint, e.g. after changing citation code.
+    Citations already in master_df are reused for rows citing the same papers.
+    """
+    directory = checkpoint_dir(input_csv, {'skip_api_calls': skip_api_calls, 'discipline': discipline})
+    if from_stage:
+        start = INGEST_STAGES.index(from_stage) if from_stage in INGEST_STAGES else len(INGEST_STAGES)
+        if start > 0 and not has_checkpoint(directory, INGEST_STAGES[start - 1]):
+            raise FileNotFoundError(
+                f"No checkpoint for stage '{INGEST_STAGES[start - 1]}' in {directory}; "
+                f"run without --from-stage (or with --resume) first")
+    elif resume:
+        start = next((i for i, stage in enumerate(INGEST_STAGES) if not has_checkpoint(directory, stage)),
+                     len(INGEST_STAGES))
+    else:
+        start = 0
+
+    # Partial enrichment is only reused when resuming
+    if resume and not from_stage:
+        clear_checkpoints(directory, INGEST_STAGES[start + 1:])
+    else:
+        clear_checkpoints(directory, INGEST_STAGES[start:])
+
+    print(f"\nCheckpoints: {directory}")
+    if start > 0:
+        print(f"  ✓ Loaded '{INGEST_STAGES[start - 1]}' checkpoint, skipping stages: {', '.join(INGEST_STAGES[:start])}")
+        processed_df = load_checkpoint(directory, INGEST_STAGES[start - 1])
+    else:
+        processed_df = input_df
+
+    for stage in INGEST_STAGES[start:]:
+        with metrics.stage(stage):
+            processed_df = run_stage(stage, processed_df, skip_api_calls, directory, master_df)
+        save_checkpoint(directory, stage, processed_df)
+
+    return processed_df
+
+def run_stage(stage, processed_df, skip_api_calls, directory, master_df):
+    """Run one of INGEST_STAGES and return its output"""
+    if stage == 'enrich':
+        if skip_api_calls:
+            stage_banner("STEP 1: SKIPPING METADATA ENRICHMENT (--skip-api-calls flag set)")
+            processed_df = processed_df.copy()
+        else:
+            stage_banner("STEP 1: ENRICHING METADATA")
+            doi_cache = {}  # Cache to avoid redundant API calls for same DOI
+            master_metadata = build_master_metadata(master_df) if master_df is not None else None
+            processed_df = enrich_metadata(processed_df, doi_cache, checkpoint_dir=directory,
+                                           master_metadata=master_metadata)
+    elif stage == 'effect_sizes':
+        stage_banner("STEP 2: CALCULATING EFFECT SIZES (converting to r)")
+        processed_df = calculate_effect_sizes(processed_df)
+    elif stage == 'citations':
+        stage_banner("STEP 3: GENERATING CITATIONS HTML")
+        processed_df = generate_citations(processed_df, master_df)
+    elif stage == 'filter':
+        stage_banner("STEP 4: FILTERING COLUMNS")
+        processed_df = filter_columns(processed_df)
+        processed_df = normalize_discipline_column(processed_df)
+    return processed_df
+
+def ingest_data(input_csv, skip_api_calls=False, discipline=None, compact_after=False, export=True,
+                resume=False, from_stage=None):
     """Main ingestion function"""
     print(f"\n{'='*60}")
     print(f"REPLICATIONS DATABASE INGESTION ENGINE")
@@ -752,7 +1000,8 @@ def ingest_data(input_csv, skip_api_calls=False, discipline=None):
 
     # Load input data
     print(f"\nLoading input file: {input_csv}")
-    input_df = pd.read_csv(input_csv)
+    # DOI URLs are canonicalized once here, so every later key sees one spelling per paper
+    input_df = canonicalize_url_columns(pd.read_csv(input_csv))
     print(f"  Loaded {len(input_df)} rows")
 
     # Apply discipline to all rows if specified
@@ -760,126 +1009,303 @@ def ingest_data(input_csv, skip_api_calls=False, discipline=None):
         input_df['discipline'] = discipline.lower()
         print(f"  Applied discipline '{discipline.lower()}' to all rows")
 
-    # Find latest master database from version_history.txt
-    latest_master = get_latest_master_database()
-    if latest_master:
-        master_csv = os.path.join(DATA_DIR, latest_master)
-        print(f"\nLoading master database: {master_csv}")
-        try:
-            master_df = pd.read_csv(master_csv)
-            print(f"  Loaded {len(master_df)} existing rows")
-        except FileNotFoundError:
-            print(f"  Master database not found at {master_csv}, will create new one")
-            master_df = pd.DataFrame()
-    else:
-        print(f"\nNo master database found in version_history.txt, will create new one")
-        master_df = pd.DataFrame()
+    with metrics.stage('load_master'):
+        master_entry, master_df = load_master_database()
 
-    # Process each row (skip API calls if flag is set)
-    if skip_api_calls:
+    processed_df = run_stages(input_df, input_csv, skip_api_calls, discipline, resume, from_stage, master_df)
+
+    with metrics.stage('merge'):
+        # Check for duplicates and append
         print(f"\n{'='*60}")
-        print(f"STEP 1: SKIPPING METADATA ENRICHMENT (--skip-api-calls flag set)")
+        print(f"STEP 5: CHECKING DUPLICATES AND APPENDING")
         print(f"{'='*60}")
-        processed_df = input_df.copy()
-    else:
+
+        # Build the duplicate index once, then flag duplicates with set lookups
+        dedup_index = build_dedup_index(master_df)
+        is_duplicate, duplicate_reason = find_duplicates(processed_df, dedup_index)
+
+        for idx, row in processed_df[is_duplicate].iterrows():
+            if duplicate_reason[idx] == 'database':
+                print(f"\n⚠️  WARNING: Row {idx + 1} is a duplicate (matching original_url, replication_url, and description)")
+            else:
+                print(f"\n⚠️  WARNING: Row {idx + 1} duplicates an earlier row in the input file")
+            print(f"    Original: {row.get('original_url')}")
+            print(f"    Replication: {row.get('replication_url')}")
+            print(f"    Description: {str(row.get('description', ''))[:80]}...")
+
+        duplicates_found = int(is_duplicate.sum())
+        new_rows_df = processed_df[~is_duplicate]
+
+        print(f"\n  Found {duplicates_found} duplicates (skipped)")
+        print(f"  Adding {len(new_rows_df)} new rows to master database")
+
+        # Append new rows to master
+        if not new_rows_df.empty:
+            new_rows_df = apply_schema_dtypes(mark_unvalidated(new_rows_df), float32=False)
+            updated_master_df = pd.concat([master_df, new_rows_df], ignore_index=True)
+        else:
+            updated_master_df = master_df
+
+        # Calculate effect sizes for ALL rows (including existing ones that may be missing conversions)
         print(f"\n{'='*60}")
-        print(f"STEP 1: ENRICHING METADATA")
+        print(f"STEP 5b: CALCULATING EFFECT SIZES FOR ALL ROWS")
         print(f"{'='*60}")
+        updated_master_df = calculate_effect_sizes(updated_master_df)
 
-        doi_cache = {}  # Cache to avoid redundant API calls for same DOI
-        processed_rows = []
-        for idx, row in input_df.iterrows():
-            processed_row = process_row(row, idx, len(input_df), doi_cache)
-            processed_rows.append(processed_row)
+        # Reorder columns according to data_dictionary.csv
+        updated_master_df = reorder_columns(updated_master_df)
 
-        processed_df = pd.DataFrame(processed_rows)
+    with metrics.stage('save'):
+        # Save a delta against the previous version (or a full snapshot if this
+        # is a brand new database). The file is written to a pending path, then
+        # committed under the version history lock, rebasing if another ingest
+        # committed in the meantime.
+        print(f"\n{'='*60}")
+        print(f"STEP 6: SAVING UPDATED DATABASE")
+        print(f"{'='*60}")
 
-    # Calculate effect sizes (convert to r)
-    print(f"\n{'='*60}")
-    print(f"STEP 2: CALCULATING EFFECT SIZES (converting to r)")
-    print(f"{'='*60}")
-    processed_df = calculate_effect_sizes(processed_df)
+        if master_df.empty:
+            pending_path = write_pending(updated_master_df)
+            output_filename = commit_version(pending_path, master_entry, snapshot=True)
+            print(f"\n✓ Saved full snapshot ({len(updated_master_df)} rows)")
+        else:
+            delta = diff_frames(master_df, updated_master_df)
+            if delta.empty:
+                output_filename = None
+                print(f"\n  No changes to save")
+            else:
+                op_counts = delta['_op'].value_counts()
+                print(f"\n✓ Saving delta: {op_counts.get('added', 0)} added, "
+                      f"{op_counts.get('changed', 0)} changed, {op_counts.get('removed', 0)} removed")
+                output_filename = commit_version(write_pending(delta), master_entry)
+        output_path = os.path.join(DATA_DIR, output_filename) if output_filename else None
+        print(f"  Total rows in database: {len(updated_master_df)}")
+        if output_filename:
+            print(f"✓ Added {output_filename} to version_history.txt")
+
+        index_snapshot(output_filename)
+
+    if compact_after:
+        with metrics.stage('compact'):
+            compacted = compact()
+            if compacted:
+                output_path = os.path.join(DATA_DIR, compacted)
+                index_snapshot(compacted)
+
+    # Export pre-aggregated JSON for the website
+    if export:
+        print(f"\n{'='*60}")
+        print(f"STEP 7: EXPORTING AGGREGATES")
+        print(f"{'='*60}")
+        # Rebuild from the head, which includes rows committed by concurrent ingests
+        head = get_latest_master_database()
+        with metrics.stage('export'):
+            export_aggregates(materialize_version(head), head)
 
-    # Generate citations
     print(f"\n{'='*60}")
-    print(f"STEP 3: GENERATING CITATIONS HTML")
+    print(f"INGESTION COMPLETE!")
     print(f"{'='*60}")
-    processed_df = generate_citations(processed_df)
+    print(f"Summary:")
+    print(f"  - Input rows: {len(input_df)}")
+    print(f"  - Duplicates skipped: {duplicates_found}")
+    print(f"  - New rows added: {len(new_rows_df)}")
+    print(f"  - Total rows in database: {len(updated_master_df)}")
+    print(f"  - Output file: {output_path}")
+    print()
 
-    # Filter columns
+def ingest_data_streaming(input_csv, chunk_size, skip_api_calls=False, discipline=None,
+                          compact_after=False, export=True, data_dict_path='data_dictionary.csv'):
+    """
+    Streaming ingestion for very large input files.
+
+    Reads the input in chunks of chunk_size rows and runs each chunk through
+    enrichment, effect size conversion, citation generation, column filtering
+    and duplicate detection. New rows are appended to the output delta as each
+    chunk finishes, so memory use depends on the chunk size rather than the
+    input size. Only the duplicate index of new rows is kept between chunks.
+    """
     print(f"\n{'='*60}")
-    print(f"STEP 4: FILTERING COLUMNS")
+    print(f"REPLICATIONS DATABASE INGESTION ENGINE (streaming, {chunk_size} rows per chunk)")
+    print(f"{'='*60}")
+    if skip_api_calls:
+        print("  [Skipping API calls - metadata enrichment disabled]")
     print(f"{'='*60}")
-    processed_df = filter_columns(processed_df)
 
-    # Normalize discipline column
-    processed_df = normalize_discipline_column(processed_df)
+    master_entry, master_df = load_master_database()
+    dedup_index = build_dedup_index(master_df)
+    row_id_counts = {}
+    compute_row_ids(master_df, row_id_counts)
 
-    # Check for duplicates and append
-    print(f"\n{'='*60}")
-    print(f"STEP 5: CHECKING DUPLICATES AND APPENDING")
-    print(f"{'='*60}")
+    # Fix the output column order up front since the file is written in pieces
+    dict_columns = pd.read_csv(data_dict_path)['column_name'].tolist()
+    output_columns = dict_columns + [col for col in master_df.columns if col not in dict_columns]
 
-    rows_to_append = []
+    # A brand new database is written as a full snapshot, otherwise as a delta.
+    # Either way it goes to a pending file until it is committed at the end.
+    writing_snapshot = master_df.empty
+    pending_path = pending_version_path()
+
+    doi_cache = {}  # Cache to avoid redundant API calls for same DOI
+    master_metadata = None if skip_api_calls else build_master_metadata(master_df)
+    input_rows = 0
     duplicates_found = 0
+    rows_added = 0
 
-    for idx, row in processed_df.iterrows():
-        if check_duplicate(row, master_df):
-            print(f"\n⚠️  WARNING: Row {idx + 1} is a duplicate (matching original_url, replication_url, and description)")
-            print(f"    Original: {row.get('original_url')}")
-            print(f"    Replication: {row.get('replication_url')}")
-            print(f"    Description: {row.get('description', '')[:80]}...")
-            duplicates_found += 1
-        else:
-            rows_to_append.append(row)
-
-    print(f"\n  Found {duplicates_found} duplicates (skipped)")
-    print(f"  Adding {len(rows_to_append)} new rows to master database")
-
-    # Append new rows to master
-    if rows_to_append:
-        new_rows_df = pd.DataFrame(rows_to_append)
-        # Set validated to "no" for any rows where it's empty
-        if 'validated' in new_rows_df.columns:
-            new_rows_df['validated'] = new_rows_df['validated'].apply(
-                lambda x: 'no' if pd.isna(x) or x == '' or (isinstance(x, str) and not x.strip()) else x
-            )
+    print(f"\nStreaming input file: {input_csv}")
+    for chunk_number, chunk in enumerate(pd.read_csv(input_csv, chunksize=chunk_size)):
+        print(f"\n{'='*60}")
+        print(f"CHUNK {chunk_number + 1}: rows {input_rows + 1}-{input_rows + len(chunk)}")
+        print(f"{'='*60}")
+        input_rows += len(chunk)
+        chunk = canonicalize_url_columns(chunk)
+
+        if discipline:
+            chunk['discipline'] = discipline.lower()
+
+        with metrics.stage('enrich'):
+            processed_df = chunk if skip_api_calls else enrich_metadata(
+                chunk, doi_cache, total_rows='?', master_metadata=master_metadata)
+        with metrics.stage('effect_sizes'):
+            processed_df = calculate_effect_sizes(processed_df)
+        with metrics.stage('citations'):
+            processed_df = generate_citations(processed_df, master_df)
+        with metrics.stage('filter'):
+            processed_df = filter_columns(processed_df, data_dict_path)
+            processed_df = normalize_discipline_column(processed_df)
+
+        is_duplicate, _ = find_duplicates(processed_df, dedup_index)
+        duplicates_found += int(is_duplicate.sum())
+        new_rows_df = processed_df[~is_duplicate]
+        print(f"\n  Chunk: {int(is_duplicate.sum())} duplicates skipped, {len(new_rows_df)} new rows")
+        if new_rows_df.empty:
+            continue
+
+        new_rows_df = apply_schema_dtypes(mark_unvalidated(new_rows_df), float32=False)
+        dedup_index.update(dedup_keys(new_rows_df).dropna())
+        if writing_snapshot:
+            new_rows_df.reindex(columns=output_columns).to_csv(
+                pending_path, mode='a', header=not os.path.exists(pending_path), index=False)
         else:
-            new_rows_df['validated'] = 'no'
-        updated_master_df = pd.concat([master_df, new_rows_df], ignore_index=True)
+            row_ids = compute_row_ids(new_rows_df, row_id_counts)
+            append_delta_rows(pending_path, new_rows_df, 'added', row_ids, output_columns)
+        rows_added += len(new_rows_df)
+
+    # Existing rows may be missing conversions; record the ones that change
+    if not master_df.empty:
+        print(f"\n{'='*60}")
+        print(f"CALCULATING EFFECT SIZES FOR EXISTING ROWS")
+        print(f"{'='*60}")
+        recalculated_df = calculate_effect_sizes(master_df.copy())
+        changes = diff_frames(master_df, recalculated_df)
+        if not changes.empty:
+            changes = changes.set_index(ROW_ID_COLUMN)
+            append_delta_rows(pending_path, changes, 'changed', changes.index.to_series(), output_columns)
+            print(f"  ✓ {len(changes)} existing rows updated")
+
+    print(f"\n{'='*60}")
+    print(f"SAVING UPDATED DATABASE")
+    print(f"{'='*60}")
+    output_path = None
+    output_filename = None
+    if os.path.exists(pending_path):
+        output_filename = commit_version(pending_path, master_entry, snapshot=writing_snapshot)
+        if output_filename:
+            output_path = os.path.join(DATA_DIR, output_filename)
+            print(f"✓ Added {output_filename} to version_history.txt")
     else:
-        updated_master_df = master_df
+        print(f"  No changes to save")
+
+    index_snapshot(output_filename)
+
+    if compact_after:
+        compacted = compact()
+        if compacted:
+            output_path = os.path.join(DATA_DIR, compacted)
+            index_snapshot(compacted)
+
+    if export:
+        head = get_latest_master_database()
+        export_aggregates(materialize_version(head), head)
 
-    # Calculate effect sizes for ALL rows (including existing ones that may be missing conversions)
     print(f"\n{'='*60}")
-    print(f"STEP 5b: CALCULATING EFFECT SIZES FOR ALL ROWS")
+    print(f"INGESTION COMPLETE!")
     print(f"{'='*60}")
-    updated_master_df = calculate_effect_sizes(updated_master_df)
+    print(f"Summary:")
+    print(f"  - Input rows: {input_rows}")
+    print(f"  - Duplicates skipped: {duplicates_found}")
+    print(f"  - New rows added: {rows_added}")
+    print(f"  - Total rows in database: {len(master_df) + rows_added}")
+    print(f"  - Output file: {output_path}")
+    print()
 
-    # Reorder columns according to data_dictionary.csv
-    updated_master_df = reorder_columns(updated_master_df)
+def ingest_data_sqlite(input_csv, skip_api_calls=False, discipline=None, sqlite_path=None,
+                       export=True, resume=False, from_stage=None):
+    """
+    Ingestion into the SQLite backend (see sqlite_store.py).
+
+    Same stages as ingest_data, but the master database is never loaded as a
+    whole: duplicates are found with indexed lookups on the dedup key, new
+    rows are upserted, and only rows missing es_r are read back to fill in
+    effect size conversions. If the SQLite file doesn't exist yet it is
+    seeded from the latest CSV version. Use `python sqlite_store.py publish`
+    to commit the result as a CSV snapshot for the website.
+    """
+    sqlite_path = sqlite_path or sqlite_store.SQLITE_PATH
+    print(f"\n{'='*60}")
+    print(f"REPLICATIONS DATABASE INGESTION ENGINE (SQLite backend: {sqlite_path})")
+    print(f"{'='*60}")
+    if skip_api_calls:
+        print("  [Skipping API calls - metadata enrichment disabled]")
+    print(f"{'='*60}")
+
+    seed = not os.path.exists(sqlite_path)
+    conn = sqlite_store.connect(sqlite_path)
+    if seed and get_latest_master_database():
+        print(f"\nSeeding {sqlite_path} from {get_latest_master_database()}...")
+        print(f"  Imported {sqlite_store.import_version(conn)} rows")
+
+    print(f"\nLoading input file: {input_csv}")
+    # DOI URLs are canonicalized once here, so every later key sees one spelling per paper
+    input_df = canonicalize_url_columns(pd.read_csv(input_csv))
+    print(f"  Loaded {len(input_df)} rows")
+    if discipline:
+        input_df['discipline'] = discipline.lower()
+        print(f"  Applied discipline '{discipline.lower()}' to all rows")
+
+    # Only master rows citing the input's papers are needed for metadata fill and citation reuse
+    input_dois = pd.concat([canonical_doi_series(input_df[column])
+                            for column in ('original_url', 'replication_url') if column in input_df.columns])
+    master_df = apply_schema_dtypes(sqlite_store.rows_for_dois(conn, input_dois.dropna()), float32=False)
+    print(f"  Found {len(master_df)} existing rows citing the same papers")
+
+    processed_df = run_stages(input_df, input_csv, skip_api_calls, discipline, resume, from_stage, master_df)
 
-    # Save with timestamp
     print(f"\n{'='*60}")
-    print(f"STEP 6: SAVING UPDATED DATABASE")
+    print(f"STEP 5: CHECKING DUPLICATES AND UPSERTING")
     print(f"{'='*60}")
+    existing_keys = sqlite_store.existing_dedup_keys(conn, dedup_keys(processed_df))
+    is_duplicate, _ = find_duplicates(processed_df, existing_keys)
+    duplicates_found = int(is_duplicate.sum())
+    new_rows_df = processed_df[~is_duplicate]
+    if not new_rows_df.empty:
+        new_rows_df = apply_schema_dtypes(mark_unvalidated(new_rows_df), float32=False)
+        sqlite_store.upsert_rows(conn, new_rows_df)
+    print(f"  Found {duplicates_found} duplicates (skipped)")
+    print(f"  Added {len(new_rows_df)} new rows")
+
+    # Only rows that are missing a conversion need to be read back
+    print(f"\n{'='*60}")
+    print(f"STEP 5b: CALCULATING EFFECT SIZES FOR ROWS MISSING es_r")
+    print(f"{'='*60}")
+    missing_df, missing_ids = sqlite_store.rows_missing_es_r(conn)
+    if not missing_df.empty:
+        sqlite_store.upsert_rows(conn, calculate_effect_sizes(missing_df), missing_ids)
+
+    total_rows = conn.execute(f"SELECT COUNT(*) FROM {sqlite_store.TABLE}").fetchone()[0]
 
-    timestamp = datetime.now().strftime("%Y_%m_%d_%H%M%S")
-    output_filename = f"replications_database_{timestamp}.csv"
-    output_path = os.path.join(DATA_DIR, output_filename)
-    updated_master_df.to_csv(output_path, index=False)
-    print(f"\n✓ Saved updated database to: {output_path}")
-    print(f"  Total rows in database: {len(updated_master_df)}")
-
-    # Update version history
-    print(f"\nUpdating {VERSION_HISTORY_PATH}...")
-    # Ensure the file ends with a newline before appending
-    with open(VERSION_HISTORY_PATH, 'r') as f:
-        content = f.read()
-    with open(VERSION_HISTORY_PATH, 'w') as f:
-        # Strip trailing whitespace and ensure single newline at end
-        f.write(content.rstrip() + '\n' + output_filename + '\n')
-    print(f"✓ Added {output_filename} to version_history.txt")
+    if export:
+        export_aggregates(sqlite_store.export_frame(conn), os.path.basename(sqlite_path))
+    conn.close()
 
     print(f"\n{'='*60}")
     print(f"INGESTION COMPLETE!")
@@ -887,9 +1313,9 @@ def ingest_data(input_csv, skip_api_calls=False, discipline=None):
     print(f"Summary:")
     print(f"  - Input rows: {len(input_df)}")
     print(f"  - Duplicates skipped: {duplicates_found}")
-    print(f"  - New rows added: {len(rows_to_append)}")
-    print(f"  - Total rows in database: {len(updated_master_df)}")
-    print(f"  - Output file: {output_path}")
+    print(f"  - New rows added: {len(new_rows_df)}")
+    print(f"  - Total rows in database: {total_rows}")
+    print(f"  - Database: {sqlite_path}")
     print()
 
 if __name__ == "__main__":
@@ -900,6 +1326,12 @@ if __name__ == "__main__":
 Examples:
   python data_ingestor.py cancer_biology_replications_data.csv --discipline "cancer biology"
   python data_ingestor.py --skip-api-calls psych_file_drawer_data_to_ingest.csv
+  python data_ingestor.py --compact new_rows.csv
+  python data_ingestor.py --chunk-size 5000 large_replication_project.csv
+  python data_ingestor.py --backend sqlite new_rows.csv
+  python data_ingestor.py --resume cancer_biology_replications_data.csv --discipline "cancer biology"
+  python data_ingestor.py --from-stage citations cancer_biology_replications_data.csv --discipline "cancer biology"
+  python data_ingestor.py --metrics-out metrics/ingest.json --profile-dir metrics/profiles new_rows.csv
         """
     )
     parser.add_argument('input_csv', help='Input CSV file to ingest')
@@ -907,7 +1339,44 @@ Examples:
                        help='Skip metadata enrichment API calls (faster but no metadata updates)')
     parser.add_argument('--discipline', type=str, default=None,
                        help='Set discipline value for all rows (e.g., "cancer biology")')
+    parser.add_argument('--compact', action='store_true',
+                       help='Fold deltas into a new full snapshot after ingesting (publishes to the website)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                       help='Stream the input in chunks of this many rows (for very large files)')
+    parser.add_argument('--skip-export', action='store_true',
+                       help='Skip exporting aggregate JSON shards for the website')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv',
+                       help='Storage backend: CSV version history (default) or SQLite')
+    parser.add_argument('--sqlite-path', type=str, default=None,
+                       help='SQLite database file for --backend sqlite (default: ../data/replications.sqlite)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Reuse checkpoints from a previous run on the same input, skipping completed stages')
+    parser.add_argument('--from-stage', choices=INGEST_STAGES + ['merge'], default=None,
+                       help='Rerun from this stage using the previous stage\'s checkpoint')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                       help='Write stage timings and provider metrics to this JSON file (plus a .prom Prometheus textfile)')
+    parser.add_argument('--profile-dir', type=str, default=None,
+                       help='Dump a cProfile of each stage to this directory')
 
     args = parser.parse_args()
-
-    ingest_data(args.input_csv, skip_api_calls=args.skip_api_calls, discipline=args.discipline)
+    if args.chunk_size and (args.resume or args.from_stage):
+        parser.error('--resume and --from-stage are not supported with --chunk-size')
+    metrics.set_profile_dir(args.profile_dir)
+
+    try:
+        if args.backend == 'sqlite':
+            ingest_data_sqlite(args.input_csv, skip_api_calls=args.skip_api_calls, discipline=args.discipline,
+                               sqlite_path=args.sqlite_path, export=not args.skip_export,
+                               resume=args.resume, from_stage=args.from_stage)
+        elif args.chunk_size:
+            ingest_data_streaming(args.input_csv, args.chunk_size, skip_api_calls=args.skip_api_calls,
+                                  discipline=args.discipline, compact_after=args.compact,
+                                  export=not args.skip_export)
+        else:
+            ingest_data(args.input_csv, skip_api_calls=args.skip_api_calls, discipline=args.discipline,
+                        compact_after=args.compact, export=not args.skip_export,
+                        resume=args.resume, from_stage=args.from_stage)
+    finally:
+        # Written even if ingestion fails, to see where the time went
+        if args.metrics_out:
+            metrics.write_metrics(args.metrics_out)
@@ -0,0 +1,86 @@
+"""
+Duplicate Detection for Replications Database
+
+Rows are duplicates when they have the same original DOI/URL, replication
+DOI/URL and description after normalization. Keys are computed for a whole
+DataFrame at once and kept in a set, so checking a batch of new rows against
+the master database is a hash lookup per row rather than a scan.
+
+Normalization:
+  - URLs: the canonical DOI (dois.py) where there is one, otherwise the URL
+    with http/https, dx.doi.org/doi.org and "doi:" prefixes stripped,
+    lowercased
+  - descriptions: lowercased, whitespace collapsed and trimmed
+
+Descriptions that differ by more than that (punctuation, small rewordings)
+are found by near_duplicates.py, which reports them for review.
+"""
+
+import pandas as pd
+import re
+from dois import canonical_doi_series
+
+# Prefixes that may appear in front of a DOI in the url columns
+DOI_PREFIX_RE = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
+KEY_SEPARATOR = '\x1f'
+
+
+def normalize_url_series(urls):
+    """Normalize a Series of DOI URLs for comparison (empty string if missing)"""
+    fallback = (
+        urls.fillna('').astype(str).str.strip()
+        .str.replace(DOI_PREFIX_RE, '', regex=True)
+        .str.lower()
+    )
+    return canonical_doi_series(urls).fillna(fallback)
+
+
+def normalize_description_series(descriptions):
+    """Normalize a Series of descriptions for comparison (empty string if missing)"""
+    return (
+        descriptions.fillna('').astype(str)
+        .str.replace(WHITESPACE_RE, ' ', regex=True)
+        .str.strip()
+        .str.lower()
+    )
+
+
+def dedup_keys(df):
+    """
+    Compute the duplicate-detection key of every row in df.
+    Rows without a description get a missing key and are never treated as
+    duplicates, since several effects from the same paper pair would collide.
+    """
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+
+    original = normalize_url_series(df.reindex(columns=['original_url'])['original_url'])
+    replication = normalize_url_series(df.reindex(columns=['replication_url'])['replication_url'])
+    description = normalize_description_series(df.reindex(columns=['description'])['description'])
+
+    keys = (original + KEY_SEPARATOR + replication + KEY_SEPARATOR + description).astype(object)
+    return keys.where(description != '', None)
+
+
+def build_dedup_index(df):
+    """Build the set of duplicate-detection keys for a DataFrame (e.g. the master database)"""
+    return set(dedup_keys(df).dropna())
+
+
+def find_duplicates(df, dedup_index):
+    """
+    Flag rows of df that duplicate a key in dedup_index or an earlier row of df.
+    Returns (is_duplicate, reason): boolean and string Series aligned with df.index,
+    reason being "database", "batch" or "" for non-duplicates.
+    """
+    keys = dedup_keys(df)
+    has_key = keys.notna()
+    in_index = has_key & keys.isin(dedup_index)
+    in_batch = has_key & ~in_index & keys.duplicated(keep='first')
+
+    reason = pd.Series('', index=df.index, dtype=object)
+    reason[in_index] = 'database'
+    reason[in_batch] = 'batch'
+    return in_index | in_batch, reason
@@ -0,0 +1,93 @@
+"""
+DOI Lookup Index for Bibliography Matching
+
+For each full snapshot replications_database_<timestamp>.csv, writes
+replications_database_<timestamp>.doi_index.json next to it. The index maps
+normalized original-paper DOIs (sorted, for binary search) to the positions of
+the rows that cite them, and carries the handful of fields the
+upload-bibliography route returns for a match. The route can then match a
+user's .bib/.ris DOIs without reading or parsing the full CSV.
+
+Index format:
+    {
+      "version": "replications_database_<timestamp>.csv",
+      "dois": ["10.1000/abc", ...],          # sorted, normalized
+      "row_ids": [[12, 40], ...],            # row positions in the snapshot, parallel to "dois"
+      "rows": {"12": {"original_url": ..., "description": ..., ...}, ...}
+    }
+
+DOIs are canonicalized by dois.py, which follows the same rules as
+normalizeDoi in app/api/upload-bibliography/route.ts.
+
+Usage:
+    python doi_index.py                  # build the index for the latest snapshot
+    python doi_index.py --version replications_database_2026_01_28_151337.csv
+"""
+
+import pandas as pd
+import argparse
+import json
+import os
+from dois import canonical_doi_series
+from versioning import DATA_DIR, atomic_write_text, is_delta, materialize_version, read_version_history
+
+# Fields returned by the upload-bibliography route for each match
+MATCH_FIELDS = [
+    'original_url', 'description', 'result', 'original_es_r', 'replication_es_r',
+    'original_es_type', 'replication_es_type', 'original_n', 'replication_n',
+]
+
+
+def doi_index_filename(snapshot_filename):
+    """Return the index filename that goes with a snapshot CSV"""
+    return os.path.splitext(snapshot_filename)[0] + '.doi_index.json'
+
+
+def extract_normalized_dois(urls):
+    """Canonical DOI of each URL in a Series (None where there is none)"""
+    return canonical_doi_series(urls)
+
+
+def build_doi_index(df, version):
+    """Build the index dict for a snapshot DataFrame"""
+    dois = extract_normalized_dois(df['original_url']) if 'original_url' in df.columns else pd.Series(dtype=object)
+    positions = pd.Series(range(len(df)), index=df.index)[dois.notna()]
+    dois = dois.dropna()
+
+    grouped = positions.groupby(dois).apply(list).sort_index()
+
+    matched = df.iloc[positions.to_numpy()].reindex(columns=MATCH_FIELDS)
+    matched = matched.astype(object).where(matched.notna(), None)
+    rows = {str(pos): record for pos, record in zip(positions.to_numpy(), matched.to_dict(orient='records'))}
+
+    return {
+        'version': version,
+        'dois': grouped.index.tolist(),
+        'row_ids': [[int(p) for p in ids] for ids in grouped.tolist()],
+        'rows': rows,
+    }
+
+
+def write_doi_index(df, snapshot_filename, data_dir=DATA_DIR):
+    """Build and write the DOI index for a snapshot, returning the index filename"""
+    index = build_doi_index(df, snapshot_filename)
+    filename = doi_index_filename(snapshot_filename)
+    atomic_write_text(os.path.join(data_dir, filename), json.dumps(index, separators=(',', ':'), ensure_ascii=False))
+    print(f"  ✓ Wrote DOI index with {len(index['dois'])} DOIs to {filename}")
+    return filename
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the DOI lookup index for a snapshot")
+    parser.add_argument('--version', type=str, default=None,
+                        help='Snapshot to index (default: latest full snapshot)')
+    args = parser.parse_args()
+
+    snapshots = [entry for entry in read_version_history() if not is_delta(entry)]
+    version = args.version or (snapshots[-1] if snapshots else None)
+    if version is None:
+        print("No snapshot found in version_history.txt")
+    elif is_delta(version):
+        print(f"{version} is a delta; DOI indexes are built for full snapshots only")
+    else:
+        write_doi_index(materialize_version(version), version)
@@ -0,0 +1,118 @@
+"""
+DOI Canonicalization
+
+One definition of "the DOI of this value", used as the join, cache and dedup
+key everywhere (ingestion, dedup, the DOI index, metadata refresh, PDF
+fetching and file names). app/api/upload-bibliography/route.ts implements
+the same rules in normalizeDoi.
+
+A value's canonical DOI is found by:
+  - percent-decoding it (10.1037%2Fabc -> 10.1037/abc)
+  - taking the first 10.<registrant>/<suffix> in it, so http(s)://(dx.)doi.org/,
+    doi:, "DOI " and publisher URLs that embed the DOI all work; the suffix
+    stops at whitespace, quotes and a ?query or #fragment (SICI DOIs
+    contain < > and ;)
+  - repairing doi.org/0.1037/... (a dropped leading 1, common in the
+    database) to 10.1037/...
+  - dropping trailing punctuation (. , ; :) and an unbalanced closing
+    parenthesis or bracket, e.g. from "(doi:10.1037/abc)."
+  - lowercasing it (DOIs are case-insensitive)
+
+Values without a DOI (OSF links, empty cells) have none (None / NaN).
+
+canonical_doi_series does the same for a whole Series, once per distinct
+value (pd.factorize), so columns where the same paper repeats on many rows
+cost one regex search per paper rather than per row.
+
+canonicalize_url_columns rewrites original_url and replication_url values
+that are DOI references (doi.org/, dx.doi.org/, doi: or a bare 10.x/...) to
+http://doi.org/<canonical DOI> when rows are loaded, so everything
+downstream sees one spelling per paper. Publisher, preprint and other URLs
+are stored as given (their DOI may carry path segments like v1.full.pdf);
+canonical_doi of them is only used as a join, cache and dedup key.
+
+Usage:
+    from dois import canonical_doi, canonical_doi_series
+    canonical_doi("https://dx.doi.org/10.1037/MOT0000097")   # '10.1037/mot0000097'
+"""
+
+import re
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+# The (?<=doi\.org/)0 alternative catches DOIs missing their leading 1
+DOI_PATTERN = r'(?:10|(?<=doi\.org/)0)\.\d{4,9}/[^\s"\'?#]+'
+DOI_RE = re.compile(DOI_PATTERN)
+# Values that are a DOI rather than a URL that happens to contain one
+DOI_REFERENCE_RE = re.compile(
+    r'^\s*(?:(?:https?://)?(?:www\.|dx\.)?doi\.org/|doi:\s*)?(?:10|(?<=doi\.org/)0)\.\d{4,9}/', re.IGNORECASE)
+TRAILING_PUNCTUATION = '.,;:'
+URL_COLUMNS = ['original_url', 'replication_url']
+DOI_URL_PREFIX = 'http://doi.org/'
+
+
+def strip_unbalanced(doi):
+    """Drop a closing ) or ] that has no opening partner in the DOI"""
+    for opening, closing in ('()', '[]'):
+        if doi.endswith(closing) and doi.count(opening) < doi.count(closing):
+            doi = doi[:-1].rstrip(TRAILING_PUNCTUATION)
+    return doi
+
+
+def canonical_doi(value):
+    """Canonical DOI in a DOI, DOI URL or citation string, or None if there is none"""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    if '%' in value:
+        value = unquote(value)
+    match = DOI_RE.search(value)
+    if not match:
+        return None
+    doi = strip_unbalanced(match.group(0).rstrip(TRAILING_PUNCTUATION)).lower()
+    return ('1' + doi if doi.startswith('0.') else doi) or None
+
+
+def canonical_doi_series(values):
+    """canonical_doi for every value of a Series (NaN where there is no DOI), computed once per distinct value"""
+    codes, uniques = pd.factorize(values.astype(object))
+    # factorize codes missing values as -1, which picks the trailing None
+    dois = np.array([canonical_doi(value) for value in uniques] + [None], dtype=object)
+    return pd.Series(dois[codes], index=values.index, dtype=object)
+
+
+def doi_reference(value):
+    """canonical_doi of a value that is a DOI reference (see DOI_REFERENCE_RE), None for any other value"""
+    if not isinstance(value, str):
+        return None
+    if not DOI_REFERENCE_RE.match(unquote(value) if '%' in value else value):
+        return None
+    return canonical_doi(value)
+
+
+def doi_url(doi):
+    """The URL form the database stores DOIs in"""
+    return f"{DOI_URL_PREFIX}{doi}"
+
+
+def doi_filename(doi):
+    """File name stem for a DOI's PDF/Markdown (as pull_pdfs.ipynb saves them): 10.1037--abc"""
+    return doi.replace('/', '--')
+
+
+def canonicalize_urls(urls):
+    """DOI references rewritten to http://doi.org/<canonical DOI>; other values (including publisher URLs) are kept as they are"""
+    codes, uniques = pd.factorize(urls.astype(object))
+    references = np.array([doi_reference(value) for value in uniques] + [None], dtype=object)
+    dois = pd.Series(references[codes], index=urls.index, dtype=object)
+    return (DOI_URL_PREFIX + dois).where(dois.notna(), urls.astype(object))
+
+
+def canonicalize_url_columns(df, columns=URL_COLUMNS):
+    """Copy of df with its DOI URL columns canonicalized (see canonicalize_urls)"""
+    df = df.copy()
+    for column in columns:
+        if column in df.columns:
+            df[column] = canonicalize_urls(df[column])
+    return df
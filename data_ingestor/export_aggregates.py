@@ -0,0 +1,157 @@
+"""
+Aggregate Export for the Website
+
+Writes small pre-aggregated JSON files ("shards") computed from the
+replications database, so the website can serve summary statistics as static
+files instead of parsing the full CSV on every request.
+
+Shards written to public/aggregates/ (served at /aggregates/ by Next.js):
+    manifest.json               - version the shards were built from (and its timestamp),
+                                  row count, shard list
+    counts_by_discipline.json   - [{"name", "count"}] sorted by count
+    counts_by_result.json       - [{"name", "count"}] sorted by count
+    counts_by_journal.json      - {"original": [...], "replication": [...]}
+    counts_by_year.json         - {"original": [{"year", "count"}], "replication": [...]}
+    projects.json               - per project_tag summary
+    es_r_histograms.json        - histograms of original_es_r and replication_es_r
+
+Usage:
+    python export_aggregates.py            # export for the latest version
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import re
+from datetime import datetime
+from versioning import SCRIPT_DIR, atomic_write_text, head_version, materialize_version
+
+AGGREGATES_DIR = os.path.join(SCRIPT_DIR, '..', 'public', 'aggregates')
+
+# Timestamp in version entry names, e.g. replications_delta_2026_01_28_151337.csv
+VERSION_TIMESTAMP_RE = re.compile(r'(\d{4}_\d{2}_\d{2}_\d{6})')
+
+# Histogram bins for effect sizes on the r scale
+ES_R_BIN_EDGES = np.linspace(-1, 1, 41)
+
+
+def value_counts_list(series, key='name'):
+    """Return [{key: value, "count": n}] for non-empty values, most common first"""
+    values = series.dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    if values.dtype == object or pd.api.types.is_string_dtype(values):
+        values = values.astype(str).str.strip()
+        values = values[values != '']
+    counts = values.value_counts()
+    return [{key: name, 'count': int(count)} for name, count in counts.items()]
+
+
+def counts_by_year(series):
+    """Return [{"year", "count"}] sorted by year"""
+    years = pd.to_numeric(series, errors='coerce').dropna().astype(int)
+    counts = years.value_counts().sort_index()
+    return [{'year': int(year), 'count': int(count)} for year, count in counts.items()]
+
+
+def es_r_histogram(series):
+    """Histogram of an es_r column over ES_R_BIN_EDGES (values clipped to [-1, 1])"""
+    values = pd.to_numeric(series, errors='coerce').dropna().clip(-1, 1)
+    counts, _ = np.histogram(values, bins=ES_R_BIN_EDGES)
+    return {
+        'n': int(len(values)),
+        'mean': round(float(values.mean()), 4) if len(values) else None,
+        'median': round(float(values.median()), 4) if len(values) else None,
+        'counts': [int(c) for c in counts],
+    }
+
+
+def project_summaries(df):
+    """Summarize each project_tag: row count, results, effect sizes, disciplines and years"""
+    if 'project_tag' not in df.columns:
+        return []
+
+    summaries = []
+    for tag, group in df.dropna(subset=['project_tag']).groupby('project_tag', observed=True):
+        original_es = pd.to_numeric(group.get('original_es_r'), errors='coerce').dropna()
+        replication_es = pd.to_numeric(group.get('replication_es_r'), errors='coerce').dropna()
+        replication_years = pd.to_numeric(group.get('replication_year'), errors='coerce').dropna()
+        summaries.append({
+            'project_tag': tag,
+            'count': int(len(group)),
+            'results': {item['name']: item['count'] for item in value_counts_list(group.get('result', pd.Series(dtype=object)))},
+            'disciplines': [item['name'] for item in value_counts_list(group.get('discipline', pd.Series(dtype=object)))],
+            'median_original_es_r': round(float(original_es.median()), 4) if len(original_es) else None,
+            'median_replication_es_r': round(float(replication_es.median()), 4) if len(replication_es) else None,
+            'replication_year_min': int(replication_years.min()) if len(replication_years) else None,
+            'replication_year_max': int(replication_years.max()) if len(replication_years) else None,
+        })
+    return sorted(summaries, key=lambda s: -s['count'])
+
+
+def build_aggregates(df):
+    """Compute every shard for df. Returns {shard filename: JSON-serializable object}"""
+    def column(name):
+        return df[name] if name in df.columns else pd.Series(dtype=object)
+
+    return {
+        'counts_by_discipline.json': value_counts_list(column('discipline')),
+        'counts_by_result.json': value_counts_list(column('result')),
+        'counts_by_journal.json': {
+            'original': value_counts_list(column('original_journal')),
+            'replication': value_counts_list(column('replication_journal')),
+        },
+        'counts_by_year.json': {
+            'original': counts_by_year(column('original_year')),
+            'replication': counts_by_year(column('replication_year')),
+        },
+        'projects.json': project_summaries(df),
+        'es_r_histograms.json': {
+            'bin_edges': [round(float(e), 4) for e in ES_R_BIN_EDGES],
+            'original': es_r_histogram(column('original_es_r')),
+            'replication': es_r_histogram(column('replication_es_r')),
+        },
+    }
+
+
+def version_timestamp(version):
+    """ISO timestamp of a version entry, from its filename (None if it has none)"""
+    match = VERSION_TIMESTAMP_RE.search(version or '')
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y_%m_%d_%H%M%S").isoformat(timespec='seconds')
+
+
+def export_aggregates(df, version, output_dir=AGGREGATES_DIR):
+    """Write all aggregate shards for df plus a manifest.json naming the version"""
+    print(f"\nExporting aggregate JSON shards to {output_dir}...")
+    os.makedirs(output_dir, exist_ok=True)
+
+    shards = build_aggregates(df)
+    for filename, data in shards.items():
+        atomic_write_text(os.path.join(output_dir, filename), json.dumps(data, separators=(',', ':'), ensure_ascii=False))
+
+    manifest = {
+        'version': version,
+        # From the version, not the clock, so re-exporting the same data leaves the manifest unchanged
+        'generated_at': version_timestamp(version),
+        'rows': int(len(df)),
+        'shards': sorted(shards),
+    }
+    # Manifest goes last so it never points at shards from an older version
+    atomic_write_text(os.path.join(output_dir, 'manifest.json'), json.dumps(manifest, indent=2))
+    print(f"  ✓ Wrote {len(shards)} shards for {version}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export aggregate JSON shards for the website")
+    parser.add_argument('--version', type=str, default=None,
+                        help='Version entry to export (default: latest)')
+    parser.add_argument('--output-dir', type=str, default=AGGREGATES_DIR,
+                        help='Directory to write the shards to')
+    args = parser.parse_args()
+
+    version = args.version or head_version()
+    export_aggregates(materialize_version(version), version, args.output_dir)
@@ -1,5 +1,11 @@
-import requests
-import time
+import argparse
+import json
+import metrics
+from dois import canonical_doi
+from providers import provider_url
+
+# At most one request per provider in the chain below
+MAX_REQUESTS_PER_DOI = 6
 
 def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
     """
@@ -7,11 +13,10 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
     OpenAlex → DataCite → Crossref → Unpaywall → EuropePMC → Semantic Scholar
     Stops early if all fields are filled.
     """
-    if not isinstance(doi, str) or not doi.strip():
+    doi = canonical_doi(doi)
+    if not doi:
         return None
 
-    doi = doi.strip()
-
     headers = {
         # Pure Chrome-on-Windows user-agent (spoof)
         "User-Agent": (
@@ -23,13 +28,16 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
 
     meta = {k: None for k in ["authors", "title", "journal", "volume", "issue", "pages", "year", "url"]}
 
-    def enrich(current, new):
+    def enrich(current, new, provider):
         """Fill missing fields in current dict with non-empty values from new dict."""
         if not new:
             return current
+        filled = []
         for k, v in new.items():
             if (current.get(k) in [None, "", "NaN"]) and (v not in [None, "", "NaN"]):
                 current[k] = v
+                filled.append(k)
+        metrics.record_fill(provider, filled)
         return current
 
     def is_complete(m):
@@ -38,7 +46,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
 
     # ---------- 1️⃣ OpenAlex ----------
     try:
-        r = requests.get(f"https://api.openalex.org/works/https://doi.org/{doi}", timeout=10, headers=headers)
+        r = metrics.timed_get("openalex", f"{provider_url('openalex')}/works/https://doi.org/{doi}", timeout=10, headers=headers)
         if r.status_code == 200:
             data = r.json()
             oa = {
@@ -51,16 +59,16 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
                 "year": data.get("publication_year"),
                 "url": data.get("host_venue", {}).get("url") or f"https://doi.org/{doi}",
             }
-            meta = enrich(meta, oa)
+            meta = enrich(meta, oa, "openalex")
             if is_complete(meta):
                 return meta
     except Exception:
         pass
-    time.sleep(delay)
+    metrics.sleep(delay)
 
     # ---------- 2️⃣ DataCite ----------
     try:
-        r = requests.get(f"https://api.datacite.org/dois/{doi.lower()}", timeout=10, headers=headers)
+        r = metrics.timed_get("datacite", f"{provider_url('datacite')}/dois/{doi.lower()}", timeout=10, headers=headers)
         if r.status_code == 200:
             d = r.json().get("data", {}).get("attributes", {})
             authors = []
@@ -75,7 +83,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
                 "year": d.get("publicationYear"),
                 "url": d.get("url") or f"https://doi.org/{doi}",
             }
-            meta = enrich(meta, dc)
+            meta = enrich(meta, dc, "datacite")
             if is_complete(meta):
                 return meta
     except Exception:
@@ -83,7 +91,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
 
     # ---------- 3️⃣ Crossref ----------
     try:
-        r = requests.get(f"https://api.crossref.org/works/{doi}", timeout=10, headers=headers)
+        r = metrics.timed_get("crossref", f"{provider_url('crossref')}/works/{doi}", timeout=10, headers=headers)
         if r.status_code == 200:
             m = r.json()["message"]
             authors = []
@@ -108,7 +116,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
                 "year": year,
                 "url": f"https://doi.org/{doi}",
             }
-            meta = enrich(meta, cr)
+            meta = enrich(meta, cr, "crossref")
             if is_complete(meta):
                 return meta
     except Exception:
@@ -116,7 +124,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
 
     # ---------- 4️⃣ Unpaywall ----------
     try:
-        r = requests.get(f"https://api.unpaywall.org/v2/{doi}?email={email}", timeout=10, headers=headers)
+        r = metrics.timed_get("unpaywall", f"{provider_url('unpaywall')}/v2/{doi}?email={email}", timeout=10, headers=headers)
         if r.status_code == 200:
             u = r.json()
             best_loc = u.get("best_oa_location") or {}
@@ -133,7 +141,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
                 "year": u.get("year"),
                 "url": best_loc.get("url") or u.get("doi_url") or f"https://doi.org/{doi}",
             }
-            meta = enrich(meta, up)
+            meta = enrich(meta, up, "unpaywall")
             if is_complete(meta):
                 return meta
     except Exception:
@@ -141,8 +149,9 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
 
     # ---------- 5️⃣ Europe PMC ----------
     try:
-        r = requests.get(
-            f"https://www.ebi.ac.uk/europepmc/webservices/rest/search?query=DOI:{doi}&format=json",
+        r = metrics.timed_get(
+            "europepmc",
+            f"{provider_url('europepmc')}/search?query=DOI:{doi}&format=json",
             timeout=10,
         )
         if r.status_code == 200:
@@ -159,7 +168,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
                     "year": d.get("pubYear"),
                     "url": d.get("fullTextUrlList", {}).get("fullTextUrl", [{}])[0].get("url", f"https://doi.org/{doi}"),
                 }
-                meta = enrich(meta, ep)
+                meta = enrich(meta, ep, "europepmc")
                 if is_complete(meta):
                     return meta
     except Exception:
@@ -167,8 +176,9 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
 
     # ---------- 6️⃣ Semantic Scholar ----------
     try:
-        r = requests.get(
-            f"https://api.semanticscholar.org/graph/v1/paper/DOI:{doi}"
+        r = metrics.timed_get(
+            "semanticscholar",
+            f"{provider_url('semanticscholar')}/graph/v1/paper/DOI:{doi}"
             "?fields=title,year,venue,url,authors",
             timeout=10,
             headers=headers,
@@ -182,7 +192,7 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
                 "year": s.get("year"),
                 "url": s.get("url") or f"https://doi.org/{doi}",
             }
-            meta = enrich(meta, ss)
+            meta = enrich(meta, ss, "semanticscholar")
             if is_complete(meta):
                 return meta
     except Exception:
@@ -192,3 +202,17 @@ def fetch_metadata_from_doi(doi, email="your_email@example.com", delay=0.2):
     if not meta["url"]:
         meta["url"] = f"https://doi.org/{doi}"
     return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch metadata for one or more DOIs")
+    parser.add_argument('dois', nargs='+', help='DOIs to look up')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                        help='Write provider metrics to this JSON file (plus a .prom Prometheus textfile)')
+    args = parser.parse_args()
+
+    for doi in args.dois:
+        with metrics.stage('fetch_metadata_from_doi'):
+            print(json.dumps({doi: fetch_metadata_from_doi(doi)}, indent=2))
+    if args.metrics_out:
+        metrics.write_metrics(args.metrics_out)
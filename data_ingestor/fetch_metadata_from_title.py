@@ -1,27 +1,10 @@
-import requests
-import time
+import argparse
+import json
 import urllib.parse
 import re
-
-def normalize_doi(doi):
-    """
-    Normalize a DOI by removing any URL prefix.
-    Handles cases where DOI might already be a full URL.
-    Returns just the DOI part (e.g., '10.1234/xyz')
-    """
-    if not isinstance(doi, str) or not doi.strip():
-        return None
-    doi = doi.strip()
-    # Strip common URL prefixes
-    if doi.startswith("http://doi.org/"):
-        doi = doi.replace("http://doi.org/", "")
-    elif doi.startswith("https://doi.org/"):
-        doi = doi.replace("https://doi.org/", "")
-    elif doi.startswith("http://dx.doi.org/"):
-        doi = doi.replace("http://dx.doi.org/", "")
-    elif doi.startswith("https://dx.doi.org/"):
-        doi = doi.replace("https://dx.doi.org/", "")
-    return doi if doi else None
+import metrics
+from dois import canonical_doi as normalize_doi
+from providers import provider_url
 
 def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
     """
@@ -48,12 +31,15 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
 
     meta = {k: None for k in ["doi", "authors", "title", "journal", "volume", "issue", "pages", "year", "url"]}
 
-    def enrich(current, new):
+    def enrich(current, new, provider):
         if not new:
             return current
+        filled = []
         for k, v in new.items():
             if (current.get(k) in [None, "", "NaN"]) and (v not in [None, "", "NaN"]):
                 current[k] = v
+                filled.append(k)
+        metrics.record_fill(provider, filled)
         return current
 
     def is_complete(m):
@@ -62,7 +48,7 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
     # ---------- 1️⃣ OpenAlex search by title ----------
     try:
         q = urllib.parse.quote(title)
-        r = requests.get(f"https://api.openalex.org/works?filter=title.search:{q}", timeout=10, headers=headers)
+        r = metrics.timed_get("openalex", f"{provider_url('openalex')}/works?filter=title.search:{q}", timeout=10, headers=headers)
         if r.status_code == 200:
             results = r.json().get("results", [])
             if results:
@@ -80,19 +66,19 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
                     "year": data.get("publication_year"),
                     "url": f"https://doi.org/{doi}" if doi else data.get("host_venue", {}).get("url"),
                 }
-                meta = enrich(meta, oa)
+                meta = enrich(meta, oa, "openalex")
                 if is_complete(meta):
                     return meta
     except Exception:
         pass
-    time.sleep(delay)
+    metrics.sleep(delay)
 
     doi = meta.get("doi")
     if not doi:
         # ---------- 2️⃣ Try Crossref title search ----------
         try:
             q = urllib.parse.quote(title)
-            r = requests.get(f"https://api.crossref.org/works?query.title={q}&rows=1", timeout=10, headers=headers)
+            r = metrics.timed_get("crossref", f"{provider_url('crossref')}/works?query.title={q}&rows=1", timeout=10, headers=headers)
             if r.status_code == 200:
                 items = r.json()["message"].get("items", [])
                 if items:
@@ -122,7 +108,7 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
                         "year": year,
                         "url": f"https://doi.org/{doi}" if doi else None,
                     }
-                    meta = enrich(meta, cr)
+                    meta = enrich(meta, cr, "crossref")
                     if is_complete(meta):
                         return meta
         except Exception:
@@ -132,8 +118,9 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
         # ---------- 3️⃣ Europe PMC fallback ----------
         try:
             q = urllib.parse.quote(title)
-            r = requests.get(
-                f"https://www.ebi.ac.uk/europepmc/webservices/rest/search?query={q}&format=json&pageSize=1",
+            r = metrics.timed_get(
+                "europepmc",
+                f"{provider_url('europepmc')}/search?query={q}&format=json&pageSize=1",
                 timeout=10,
             )
             if r.status_code == 200:
@@ -153,7 +140,7 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
                         "year": d.get("pubYear"),
                         "url": d.get("fullTextUrlList", {}).get("fullTextUrl", [{}])[0].get("url"),
                     }
-                    meta = enrich(meta, ep)
+                    meta = enrich(meta, ep, "europepmc")
                     doi = meta.get("doi")
                     if is_complete(meta):
                         return meta
@@ -163,7 +150,7 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
     # ---------- 4️⃣ DataCite (if DOI found) ----------
     if doi:
         try:
-            r = requests.get(f"https://api.datacite.org/dois/{doi.lower()}", timeout=10, headers=headers)
+            r = metrics.timed_get("datacite", f"{provider_url('datacite')}/dois/{doi.lower()}", timeout=10, headers=headers)
             if r.status_code == 200:
                 d = r.json().get("data", {}).get("attributes", {})
                 authors = []
@@ -178,7 +165,7 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
                     "year": d.get("publicationYear"),
                     "url": d.get("url") or f"https://doi.org/{doi}",
                 }
-                meta = enrich(meta, dc)
+                meta = enrich(meta, dc, "datacite")
                 if is_complete(meta):
                     return meta
         except Exception:
@@ -187,11 +174,11 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
     # ---------- 5️⃣ Semantic Scholar (if DOI or title available) ----------
     try:
         if doi:
-            url = f"https://api.semanticscholar.org/graph/v1/paper/DOI:{doi}?fields=title,year,venue,url,authors"
+            url = f"{provider_url('semanticscholar')}/graph/v1/paper/DOI:{doi}?fields=title,year,venue,url,authors"
         else:
             q = urllib.parse.quote(title)
-            url = f"https://api.semanticscholar.org/graph/v1/paper/search?query={q}&limit=1&fields=title,year,venue,url,authors,externalIds"
-        r = requests.get(url, timeout=10, headers=headers)
+            url = f"{provider_url('semanticscholar')}/graph/v1/paper/search?query={q}&limit=1&fields=title,year,venue,url,authors,externalIds"
+        r = metrics.timed_get("semanticscholar", url, timeout=10, headers=headers)
         if r.status_code == 200:
             data = r.json()
             s = data.get("data", [{}])[0] if "data" in data else data
@@ -206,7 +193,7 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
                 "year": s.get("year"),
                 "url": s.get("url") or (f"https://doi.org/{doi}" if doi else None),
             }
-            meta = enrich(meta, ss)
+            meta = enrich(meta, ss, "semanticscholar")
     except Exception:
         pass
 
@@ -214,3 +201,17 @@ def fetch_metadata_from_title(title, email="your_email@example.com", delay=0.2):
     if meta.get("doi") and not meta.get("url"):
         meta["url"] = f"https://doi.org/{meta['doi']}"
     return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find DOI and metadata for one or more paper titles")
+    parser.add_argument('titles', nargs='+', help='Titles to look up')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                        help='Write provider metrics to this JSON file (plus a .prom Prometheus textfile)')
+    args = parser.parse_args()
+
+    for title in args.titles:
+        with metrics.stage('fetch_metadata_from_title'):
+            print(json.dumps({title: fetch_metadata_from_title(title)}, indent=2))
+    if args.metrics_out:
+        metrics.write_metrics(args.metrics_out)
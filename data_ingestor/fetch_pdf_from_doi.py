@@ -1,12 +1,14 @@
 import os
 import re
-import time
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 #from paperscraper.pdf import save_pdf
 from ddgs import DDGS
+from dois import canonical_doi
 from fetch_metadata_from_doi import fetch_metadata_from_doi
+import metrics
+from providers import provider_url
 
 
 api_keys = {
@@ -34,7 +36,7 @@ headers = {
 }
 
 #-----------------------------------------------------------------------------------------
-def try_download(url, save_path):
+def try_download(url, save_path, provider="pdf"):
     """Try downloading PDF from URL and save to save_path."""
 
     if not url:
@@ -45,7 +47,8 @@ def try_download(url, save_path):
     try:
 
         try:
-            r = requests.get(
+            r = metrics.timed_get(
+                provider,
                 url,
                 headers=headers,
                 timeout=20,
@@ -54,7 +57,8 @@ def try_download(url, save_path):
             )
         except SSLError as e:
             print("SSL verification failed, retrying with verify=False (INSECURE):", e)
-            r = requests.get(
+            r = metrics.timed_get(
+                provider,
                 url,
                 headers=headers,
                 timeout=25,
@@ -69,6 +73,7 @@ def try_download(url, save_path):
                 for chunk in r.iter_content(8192):
                     if chunk:
                         f.write(chunk)
+                        metrics.record_bytes(provider, len(chunk))
             print("PDF downloaded OK from direct URL.")
             return True
         else:
@@ -140,20 +145,19 @@ def fetch_pdf_from_doi(doi,
       5. Europe PMC
       6. Direct DOI resolver (html scraping)
 
-    Saves PDF to save_dir as: doi.replace('/', '--') + '.pdf'
+    Saves PDF to save_dir as: doi_filename(doi) + '.pdf' (10.1037--abc.pdf)
     Returns the path if successful, else None.
     """
 
-    doi = doi.strip().lower()
-    
-    if not isinstance(doi, str) or not doi.strip():
+    if not canonical_doi(doi):
         print(f"ERROR with doi: {doi}")
         return None
+    doi = canonical_doi(doi)
 
     if os.path.exists(save_path):
         print(f"WARNING: Already have {save_path}")
 
-    time.sleep(delay)
+    metrics.sleep(delay)
 
     # ---------------- 0  OSF DOI handling ----------------
     if doi.lower().startswith("10.17605/osf.io") or "osf" in doi.lower():
@@ -167,25 +171,25 @@ def fetch_pdf_from_doi(doi,
             if osf_id:
                 # Try the simple direct download first
                 candidate_urls = [
-                    f"https://osf.io/{osf_id}/download",
-                    f"https://osf.io/{osf_id}/?action=download",
-                    f"https://osf.io/{osf_id}/",
+                    f"{provider_url('osf')}/{osf_id}/download",
+                    f"{provider_url('osf')}/{osf_id}/?action=download",
+                    f"{provider_url('osf')}/{osf_id}/",
                 ]
 
                 for url in candidate_urls:
-                    if try_download(url, save_path):
+                    if try_download(url, save_path, provider="osf_pdf"):
                         print(f"✅ OSF direct download success for {doi}")
                         return save_path
 
                 # Try the OSF API (to find attached files)
-                r = requests.get(f"https://api.osf.io/v2/nodes/{osf_id}/files/", timeout=10)
+                r = metrics.timed_get("osf", f"{provider_url('osf_api')}/v2/nodes/{osf_id}/files/", timeout=10)
                 if r.status_code == 200:
                     files_json = r.json()
                     for entry in files_json.get("data", []):
                         links = entry.get("links", {})
                         pdf_url = links.get("download")
                         if pdf_url and pdf_url.lower().endswith(".pdf"):
-                            if try_download(pdf_url, save_path):
+                            if try_download(pdf_url, save_path, provider="osf_pdf"):
                                 print(f"✅ OSF API file download success for {doi}")
                                 return save_path
         except Exception as e:
@@ -205,12 +209,12 @@ def fetch_pdf_from_doi(doi,
     
     # ----------------OpenAlex ----------------
     try:
-        r = requests.get(f"https://api.openalex.org/works/https://doi.org/{doi}", timeout=10)
+        r = metrics.timed_get("openalex", f"{provider_url('openalex')}/works/https://doi.org/{doi}", timeout=10)
         if r.status_code == 200:
             data = r.json()
             best = data.get("best_oa_location") or {}
             pdf_url = best.get("url_for_pdf") or best.get("url")
-            if try_download(pdf_url, save_path):
+            if try_download(pdf_url, save_path, provider="openalex_pdf"):
                 if (verbose): print(f"✅ OpenAlex success for {doi}")
                 return save_path
         else:
@@ -223,13 +227,14 @@ def fetch_pdf_from_doi(doi,
 
     # ----------------  Semantic Scholar ----------------
     try:
-        r = requests.get(
-            f"https://api.semanticscholar.org/graph/v1/paper/DOI:{doi}?fields=openAccessPdf",
+        r = metrics.timed_get(
+            "semanticscholar",
+            f"{provider_url('semanticscholar')}/graph/v1/paper/DOI:{doi}?fields=openAccessPdf",
             timeout=10,
         )
         if r.status_code == 200:
             pdf_url = r.json().get("openAccessPdf", {}).get("url")
-            if try_download(pdf_url, save_path):
+            if try_download(pdf_url, save_path, provider="semanticscholar_pdf"):
                 if (verbose): print(f"✅ Semantic Scholar success for {doi}")
                 return save_path
     except Exception as e:
@@ -238,12 +243,12 @@ def fetch_pdf_from_doi(doi,
 
     # ---------------- Unpaywall ----------------
     try:
-        r = requests.get(f"https://api.unpaywall.org/v2/{doi}?email={email}", timeout=10)
+        r = metrics.timed_get("unpaywall", f"{provider_url('unpaywall')}/v2/{doi}?email={email}", timeout=10)
         if r.status_code == 200:
             data = r.json()
             best = data.get("best_oa_location") or {}
             pdf_url = best.get("url_for_pdf") or best.get("url")
-            if try_download(pdf_url, save_path):
+            if try_download(pdf_url, save_path, provider="unpaywall_pdf"):
                 if (verbose): print(f"✅ Unpaywall success for {doi}")
                 return save_path
     except Exception as e: 
@@ -252,18 +257,18 @@ def fetch_pdf_from_doi(doi,
 
     # ----------------  Crossref ----------------
     try:
-        r = requests.get(f"https://api.crossref.org/works/{doi}", timeout=10)
+        r = metrics.timed_get("crossref", f"{provider_url('crossref')}/works/{doi}", timeout=10)
         if r.status_code == 200:
             m = r.json().get("message", {})
             # Direct PDF links in Crossref metadata
             for link in m.get("link", []):
                 if link.get("content-type") == "application/pdf":
-                    if try_download(link.get("URL"), save_path):
+                    if try_download(link.get("URL"), save_path, provider="crossref_pdf"):
                         if (verbose): print(f"✅ Crossref direct link success for {doi}")
                         return save_path
             # Landing page fallback
             landing = m.get("URL")
-            if try_download(landing, save_path):
+            if try_download(landing, save_path, provider="crossref_pdf"):
                 if (verbose): print(f"✅ Crossref landing page worked for {doi}")
                 return save_path
     except Exception as e:
@@ -272,8 +277,9 @@ def fetch_pdf_from_doi(doi,
 
     # ----------------  Europe PMC ----------------
     try:
-        r = requests.get(
-            f"https://www.ebi.ac.uk/europepmc/webservices/rest/search?query=DOI:{doi}&format=json",
+        r = metrics.timed_get(
+            "europepmc",
+            f"{provider_url('europepmc')}/search?query=DOI:{doi}&format=json",
             timeout=10,
         )
         if r.status_code == 200:
@@ -282,7 +288,7 @@ def fetch_pdf_from_doi(doi,
                 full_urls = results[0].get("fullTextUrlList", {}).get("fullTextUrl", [])
                 for u in full_urls:
                     if "pdf" in (u.get("url", "").lower()):
-                        if try_download(u["url"], save_path):
+                        if try_download(u["url"], save_path, provider="europepmc_pdf"):
                             if (verbose): print(f"✅ EuropePMC success for {doi}")
                             return save_path
     except Exception as e:
@@ -304,7 +310,7 @@ def fetch_pdf_from_doi(doi,
             url = r['href']
             if ddg_title in title: 
                 if ".pdf" in url:
-                    if try_download(url, save_path):
+                    if try_download(url, save_path, provider="duckduckgo_pdf"):
                         print("------------------- YOU MAY WANT TO CHECK THIS!! -----------")
                         print(f"Succesfully downloaded {title} from DuckDuckGo")
                         return save_path
@@ -329,9 +335,9 @@ def fetch_pdf_from_doi(doi,
 
     # ---------------- Direct DOI resolver ----------------
     try:
-        resolved_url = f"https://doi.org/{doi}"
+        resolved_url = f"{provider_url('doi')}/{doi}"
         headers['Referer'] = resolved_url
-        r = requests.get(resolved_url, headers=headers, timeout=20, allow_redirects=True)
+        r = metrics.timed_get("doi_resolver", resolved_url, headers=headers, timeout=20, allow_redirects=True)
         if r.status_code == 200:
             # Direct PDF response
             if "application/pdf" in r.headers.get("content-type", "").lower():
@@ -347,7 +353,7 @@ def fetch_pdf_from_doi(doi,
                     base = re.match(r"^https?://[^/]+", r.url)
                     if base:
                         link = base.group(0) + link
-                if try_download(link, save_path):
+                if try_download(link, save_path, provider="doi_resolver_pdf"):
                     if (verbose): print(f"✅ Found PDF via DOI HTML for {doi}")
                     return save_path
                     
@@ -364,3 +370,19 @@ def fetch_pdf_from_doi(doi,
             
     print(f"!?!?!? Nothing worked 🙃🙃🙃 for {doi}")
 
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Download the PDF for a DOI")
+    parser.add_argument('doi', help='DOI to download')
+    parser.add_argument('save_path', help='Where to save the PDF')
+    parser.add_argument('--verbose', action='store_true', help='Print errors from each source')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                        help='Write provider metrics to this JSON file (plus a .prom Prometheus textfile)')
+    args = parser.parse_args()
+
+    with metrics.stage('fetch_pdf_from_doi'):
+        fetch_pdf_from_doi(args.doi, args.save_path, verbose=args.verbose)
+    if args.metrics_out:
+        metrics.write_metrics(args.metrics_out)
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import html
 
 def format_authors(author_str):
@@ -33,3 +34,43 @@ def generate_citation_html_for_website(authors, journal, year, doi):
         citation_html = citation_text
 
     return citation_html
+
+def escape_html_series(series):
+    """Vectorized html.escape for a Series of strings"""
+    return (series.str.replace("&", "&amp;", regex=False)
+                  .str.replace("<", "&lt;", regex=False)
+                  .str.replace(">", "&gt;", regex=False)
+                  .str.replace('"', "&quot;", regex=False)
+                  .str.replace("'", "&#x27;", regex=False))
+
+def strings_only(series):
+    """Series as object dtype with non-string values replaced by ''"""
+    series = series.astype(object)
+    return series.where(series.map(lambda v: isinstance(v, str)), "")
+
+def format_authors_series(authors):
+    """Vectorized format_authors"""
+    parts = strings_only(authors).str.split(";").str[0].str.strip().str.split()
+    first = parts.str[0].fillna("").astype(object)
+    last = parts.str[-1].fillna("").astype(object)
+    et_al = last + " " + first.str[0] + ". <i>et al.</i>"
+    return et_al.where(parts.str.len() >= 2, first)
+
+def generate_citation_html_series(authors, journal, year, doi):
+    """
+    Vectorized generate_citation_html_for_website over aligned Series.
+    Produces the same HTML as the scalar function for every element.
+    """
+    authors_part = format_authors_series(authors)
+    journal_part = escape_html_series(strings_only(journal))
+    years = pd.to_numeric(pd.Series(year).astype(object), errors="coerce")
+    year_part = np.trunc(years).astype("Int64").astype(str).where(years.notna(), "")
+
+    citation_text = (authors_part.where(authors_part == "", authors_part + " ")
+                     + "<i>" + journal_part + "</i>"
+                     + year_part.where(year_part == "", " " + year_part))
+
+    doi = strings_only(doi).str.strip()
+    url = escape_html_series("https://doi.org/" + doi)
+    linked = '<a href="' + url + '" target="_blank" style="text-decoration:none; color:inherit;">' + citation_text + "</a>"
+    return linked.where(doi != "", citation_text)
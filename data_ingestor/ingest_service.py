@@ -0,0 +1,265 @@
+"""
+Watch-Folder Ingestion Service
+
+Runs continuously and ingests every CSV dropped into an inbox directory.
+Unlike `python data_ingestor.py file.csv`, the master database, its
+duplicate index, row id counts and the metadata maps stay loaded between
+files. Each file only costs the work for its own rows: enrichment,
+conversions, citations, a duplicate check against the in-memory index, and
+a delta containing just the new rows.
+
+The master database is only reloaded when another process (a manual ingest,
+refresh_metadata.py, compaction) has moved the head of version_history.txt.
+
+Directories (created if missing):
+    inbox/            - drop CSV files here
+    inbox/archive/    - successfully ingested files, each with a .report.json
+    inbox/error/      - files that failed, each with a .report.json holding the traceback
+
+A file is picked up once its size has stopped changing between two polls, so
+files that are still being copied in are left alone.
+
+Usage:
+    python ingest_service.py                        # watch ./inbox
+    python ingest_service.py --inbox /srv/replications/inbox --skip-api-calls
+    python ingest_service.py --once                 # ingest what's there, then exit
+"""
+
+import pandas as pd
+import argparse
+import json
+import os
+import shutil
+import time
+import traceback
+from datetime import datetime
+import metrics
+from data_ingestor import (
+    build_master_metadata, calculate_effect_sizes, enrich_metadata, filter_columns, generate_citations,
+    load_master_database, mark_unvalidated, normalize_discipline_column,
+)
+from dedup import build_dedup_index, dedup_keys, find_duplicates
+from dois import canonicalize_url_columns
+from export_aggregates import export_aggregates
+from schema import apply_schema_dtypes
+from versioning import (
+    SCRIPT_DIR, append_delta_rows, commit_version, compute_row_ids, head_version, pending_version_path,
+    read_version_history,
+)
+
+INBOX_DIR = os.path.join(SCRIPT_DIR, 'inbox')
+DATA_DICT_PATH = os.path.join(SCRIPT_DIR, 'data_dictionary.csv')
+
+
+class WarmMaster:
+    """The master database and the indexes derived from it, kept in memory between files"""
+
+    def __init__(self, build_metadata=True):
+        self.build_metadata = build_metadata
+        self.doi_cache = {}  # API results, valid across reloads
+        self.reload()
+
+    def reload(self):
+        with metrics.stage('load_master'):
+            self.entry, self.df = load_master_database()
+            self.dedup_index = build_dedup_index(self.df)
+            self.row_id_counts = {}
+            compute_row_ids(self.df, self.row_id_counts)
+            self.master_metadata = build_master_metadata(self.df) if self.build_metadata else None
+        dict_columns = pd.read_csv(DATA_DICT_PATH)['column_name'].tolist()
+        self.columns = dict_columns + [col for col in self.df.columns if col not in dict_columns]
+
+    def refresh_if_stale(self):
+        """Reload if another process committed a version since we last looked"""
+        if head_version() != self.entry:
+            print(f"\n  Version history moved to {head_version()}, reloading master database...")
+            self.reload()
+
+    def add_rows(self, new_rows_df, row_ids, committed_entry):
+        """Apply rows we just committed as committed_entry to the in-memory state"""
+        history = read_version_history()
+        if len(history) < 2 or history[-1] != committed_entry or history[-2] != self.entry:
+            # Rebased onto someone else's commit, so our view is out of date
+            self.reload()
+            return
+        self.entry = committed_entry
+        self.df = pd.concat([self.df, new_rows_df.reindex(columns=self.columns)], ignore_index=True)
+        self.dedup_index.update(dedup_keys(new_rows_df).dropna())
+        if self.master_metadata is not None:
+            for doi, fields in build_master_metadata(new_rows_df).items():
+                known = self.master_metadata.setdefault(doi, {})
+                for field, value in fields.items():
+                    known.setdefault(field, value)
+
+
+def ingest_file(path, warm, skip_api_calls=False, discipline=None, export=True):
+    """Ingest one CSV against the warm master. Returns a report dict."""
+    start = time.perf_counter()
+    warm.refresh_if_stale()
+
+    input_df = canonicalize_url_columns(pd.read_csv(path))
+    if discipline:
+        input_df['discipline'] = discipline.lower()
+
+    with metrics.stage('enrich'):
+        processed_df = input_df.copy() if skip_api_calls else enrich_metadata(
+            input_df, warm.doi_cache, master_metadata=warm.master_metadata)
+    with metrics.stage('effect_sizes'):
+        processed_df = calculate_effect_sizes(processed_df)
+    with metrics.stage('citations'):
+        processed_df = generate_citations(processed_df, warm.df)
+    with metrics.stage('filter'):
+        processed_df = filter_columns(processed_df, DATA_DICT_PATH)
+        processed_df = normalize_discipline_column(processed_df)
+
+    with metrics.stage('merge'):
+        is_duplicate, duplicate_reason = find_duplicates(processed_df, warm.dedup_index)
+        new_rows_df = processed_df[~is_duplicate]
+
+    output_filename = None
+    with metrics.stage('save'):
+        if not new_rows_df.empty:
+            new_rows_df = apply_schema_dtypes(mark_unvalidated(new_rows_df), float32=False)
+            counts = dict(warm.row_id_counts)
+            row_ids = compute_row_ids(new_rows_df, counts)
+            pending_path = pending_version_path()
+            if warm.df.empty:
+                # Brand new database: the first version is a full snapshot
+                new_rows_df.reindex(columns=warm.columns).to_csv(pending_path, index=False)
+            else:
+                append_delta_rows(pending_path, new_rows_df, 'added', row_ids, warm.columns)
+            output_filename = commit_version(pending_path, warm.entry, snapshot=warm.df.empty)
+            if output_filename:
+                warm.row_id_counts = counts
+                warm.add_rows(new_rows_df, row_ids, output_filename)
+
+    if export and output_filename:
+        with metrics.stage('export'):
+            export_aggregates(warm.df, warm.entry)
+
+    return {
+        'file': os.path.basename(path),
+        'status': 'ok',
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'seconds': round(time.perf_counter() - start, 3),
+        'input_rows': int(len(input_df)),
+        'duplicates_in_database': int((duplicate_reason == 'database').sum()),
+        'duplicates_in_file': int((duplicate_reason == 'batch').sum()),
+        'rows_added': int(len(new_rows_df)),
+        'version': output_filename,
+        'total_rows': int(len(warm.df)),
+    }
+
+
+def move_with_report(path, directory, report):
+    """Move a processed file into directory (timestamped, so names never clash) and write its report"""
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{datetime.now().strftime('%Y_%m_%d_%H%M%S')}_{os.path.basename(path)}"
+    shutil.move(path, os.path.join(directory, stem))
+    with open(os.path.join(directory, os.path.splitext(stem)[0] + '.report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def ready_files(inbox, sizes):
+    """CSV files in inbox whose size hasn't changed since the last poll (sizes is updated in place)"""
+    ready = []
+    current = {}
+    for name in sorted(os.listdir(inbox)):
+        path = os.path.join(inbox, name)
+        if name.startswith('.') or not name.lower().endswith('.csv') or not os.path.isfile(path):
+            continue
+        current[name] = os.path.getsize(path)
+        if sizes.get(name) == current[name]:
+            ready.append(path)
+    sizes.clear()
+    sizes.update(current)
+    return ready
+
+
+def run_service(inbox=INBOX_DIR, archive_dir=None, error_dir=None, poll_interval=5.0, once=False,
+                skip_api_calls=False, discipline=None, export=True, metrics_out=None):
+    """Watch inbox and ingest files as they arrive (or just the ones already there, with once)"""
+    archive_dir = archive_dir or os.path.join(inbox, 'archive')
+    error_dir = error_dir or os.path.join(inbox, 'error')
+    os.makedirs(inbox, exist_ok=True)
+
+    print(f"\n{'='*60}")
+    print(f"REPLICATIONS DATABASE INGESTION SERVICE")
+    print(f"{'='*60}")
+    print(f"  Inbox: {inbox}")
+    print(f"  Archive: {archive_dir}")
+    print(f"  Errors: {error_dir}")
+    if skip_api_calls:
+        print("  [Skipping API calls - metadata enrichment disabled]")
+
+    warm = WarmMaster(build_metadata=not skip_api_calls)
+    print(f"  ✓ Master database loaded: {len(warm.df)} rows as of {warm.entry}")
+
+    sizes = {}
+    if once:
+        ready_files(inbox, sizes)  # files already there are complete
+    while True:
+        for path in ready_files(inbox, sizes):
+            print(f"\n{'='*60}")
+            print(f"INGESTING {os.path.basename(path)}")
+            print(f"{'='*60}")
+            try:
+                with metrics.stage('file'):
+                    report = ingest_file(path, warm, skip_api_calls, discipline, export)
+                move_with_report(path, archive_dir, report)
+                print(f"\n✓ {report['file']}: {report['rows_added']} added, "
+                      f"{report['duplicates_in_database'] + report['duplicates_in_file']} duplicates, "
+                      f"{report['seconds']}s -> {report['version']}")
+            except Exception as e:
+                report = {
+                    'file': os.path.basename(path),
+                    'status': 'error',
+                    'finished_at': datetime.now().isoformat(timespec='seconds'),
+                    'error': f"{type(e).__name__}: {e}",
+                    'traceback': traceback.format_exc(),
+                }
+                move_with_report(path, error_dir, report)
+                print(f"\n⚠️  {report['file']} failed: {report['error']} (moved to {error_dir})")
+                # The failure may have left the in-memory state half updated
+                warm.reload()
+            sizes.pop(os.path.basename(path), None)
+            if metrics_out:
+                metrics.write_metrics(metrics_out)
+        if once:
+            break
+        time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Watch an inbox directory and ingest dropped CSV files into the Replications Database",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python ingest_service.py
+  python ingest_service.py --inbox /srv/replications/inbox --poll-interval 10
+  python ingest_service.py --once --skip-api-calls
+        """
+    )
+    parser.add_argument('--inbox', type=str, default=INBOX_DIR, help='Directory to watch for CSV files')
+    parser.add_argument('--archive-dir', type=str, default=None,
+                       help='Where ingested files go (default: <inbox>/archive)')
+    parser.add_argument('--error-dir', type=str, default=None,
+                       help='Where failed files go (default: <inbox>/error)')
+    parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds between inbox scans')
+    parser.add_argument('--once', action='store_true', help='Ingest the files already in the inbox, then exit')
+    parser.add_argument('--skip-api-calls', action='store_true',
+                       help='Skip metadata enrichment API calls (faster but no metadata updates)')
+    parser.add_argument('--discipline', type=str, default=None,
+                       help='Set discipline value for all rows of every file')
+    parser.add_argument('--skip-export', action='store_true',
+                       help='Skip exporting aggregate JSON shards for the website')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                       help='Rewrite metrics to this JSON file (plus a .prom Prometheus textfile) after each file')
+
+    args = parser.parse_args()
+    try:
+        run_service(args.inbox, args.archive_dir, args.error_dir, args.poll_interval, args.once,
+                    args.skip_api_calls, args.discipline, not args.skip_export, args.metrics_out)
+    except KeyboardInterrupt:
+        print("\nStopped")
@@ -0,0 +1,254 @@
+"""
+Ingestion Metrics
+
+Collects timing and counters while the ingestor and the fetch modules run,
+and writes them out as JSON plus a Prometheus textfile (for the node_exporter
+textfile collector):
+
+    stages      - wall time per pipeline stage (optionally cProfile'd)
+    providers   - per metadata/PDF provider: requests, successes, errors,
+                  latency histogram, bytes downloaded, fields filled,
+                  LLM tokens used
+    caches      - hit/miss counts (e.g. the per-run DOI cache)
+    sleep       - time spent in rate-limiting sleeps
+
+Metrics are always collected (it's a few dict updates per request); they are
+only written when asked, e.g. with --metrics-out.
+
+Usage:
+    import metrics
+    with metrics.stage('enrich'):
+        ...
+    r = metrics.timed_get('crossref', url, timeout=10)
+    metrics.write_metrics('ingest_metrics.json')   # also writes ingest_metrics.prom
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import requests
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+METRIC_PREFIX = 'metascience_ingest'
+
+_stages = {}
+_providers = {}
+_caches = {}
+_sleep = {'seconds': 0.0, 'calls': 0}
+_profile_dir = None
+_profilers = {}  # one per stage name, so stages run once per chunk accumulate
+_lock = threading.Lock()  # the GROBID batch client records from worker threads
+
+
+def reset():
+    """Clear all collected metrics"""
+    _stages.clear()
+    _providers.clear()
+    _caches.clear()
+    _sleep.update(seconds=0.0, calls=0)
+    _profilers.clear()
+
+
+def set_profile_dir(directory):
+    """
+    Dump a cProfile of each stage to <directory>/<stage>.prof (None to
+    disable). A stage that runs several times (e.g. once per streamed chunk)
+    gets one profile covering all of its calls.
+    """
+    global _profile_dir
+    _profile_dir = directory
+    _profilers.clear()
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage (and profile it if a profile directory is set)"""
+    profiler = None
+    # Only one profiler can run at a time, so nested stages aren't profiled separately
+    if _profile_dir and sys.getprofile() is None:
+        profiler = _profilers.setdefault(name, cProfile.Profile())
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(_profile_dir, f"{name}.prof"))
+        entry = _stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += elapsed
+        entry['calls'] += 1
+
+
+def _provider(name):
+    return _providers.setdefault(name, {
+        'requests': 0, 'success': 0, 'errors': 0, 'bytes': 0,
+        'latency_sum': 0.0, 'latency_buckets': [0] * len(LATENCY_BUCKETS),
+        'fields_filled': {},
+        'tokens': {'input': 0, 'output': 0},
+    })
+
+
+def record_request(provider, seconds, success, nbytes=0):
+    """Record one request to a provider"""
+    with _lock:
+        entry = _provider(provider)
+        entry['requests'] += 1
+        entry['success' if success else 'errors'] += 1
+        entry['bytes'] += nbytes
+        entry['latency_sum'] += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                entry['latency_buckets'][i] += 1
+
+
+def record_bytes(provider, nbytes):
+    """Record bytes downloaded from a provider outside timed_get (e.g. streamed PDFs)"""
+    with _lock:
+        _provider(provider)['bytes'] += nbytes
+
+
+def record_fill(provider, fields):
+    """Record which metadata fields a provider filled in"""
+    with _lock:
+        filled = _provider(provider)['fields_filled']
+        for field in fields:
+            filled[field] = filled.get(field, 0) + 1
+
+
+def record_tokens(provider, input_tokens, output_tokens):
+    """Record LLM tokens used by one request"""
+    with _lock:
+        tokens = _provider(provider)['tokens']
+        tokens['input'] += input_tokens
+        tokens['output'] += output_tokens
+
+
+def record_cache(cache, hit):
+    """Record a cache lookup"""
+    with _lock:
+        entry = _caches.setdefault(cache, {'hits': 0, 'misses': 0})
+        entry['hits' if hit else 'misses'] += 1
+
+
+def timed_get(provider, url, **kwargs):
+    """requests.get that records latency, outcome and (for non-streamed responses) size"""
+    start = time.perf_counter()
+    try:
+        r = requests.get(url, **kwargs)
+    except Exception:
+        record_request(provider, time.perf_counter() - start, False)
+        raise
+    nbytes = 0 if kwargs.get('stream') else len(r.content)
+    record_request(provider, time.perf_counter() - start, r.status_code == 200, nbytes)
+    return r
+
+
+def sleep(seconds):
+    """time.sleep that records time spent rate limiting"""
+    with _lock:
+        _sleep['seconds'] += seconds
+        _sleep['calls'] += 1
+    time.sleep(seconds)
+
+
+def snapshot():
+    """Return the collected metrics as a JSON-serializable dict"""
+    providers = {}
+    for name, entry in sorted(_providers.items()):
+        buckets = {str(bound): count for bound, count in zip(LATENCY_BUCKETS, entry['latency_buckets'])}
+        buckets['+Inf'] = entry['requests']
+        providers[name] = {
+            'requests': entry['requests'],
+            'success': entry['success'],
+            'errors': entry['errors'],
+            'bytes': entry['bytes'],
+            'latency_seconds': {
+                'sum': round(entry['latency_sum'], 4),
+                'count': entry['requests'],
+                'mean': round(entry['latency_sum'] / entry['requests'], 4) if entry['requests'] else None,
+                'buckets': buckets,
+            },
+            'fields_filled': dict(sorted(entry['fields_filled'].items())),
+            'tokens': dict(entry['tokens']),
+        }
+    caches = {}
+    for name, entry in sorted(_caches.items()):
+        lookups = entry['hits'] + entry['misses']
+        caches[name] = dict(entry, hit_rate=round(entry['hits'] / lookups, 4) if lookups else None)
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'stages': {name: {'seconds': round(e['seconds'], 4), 'calls': e['calls']} for name, e in _stages.items()},
+        'providers': providers,
+        'caches': caches,
+        'sleep': {'seconds': round(_sleep['seconds'], 4), 'calls': _sleep['calls']},
+    }
+
+
+def prometheus_text(data):
+    """Render a snapshot() dict in the Prometheus text exposition format"""
+    p = METRIC_PREFIX
+    lines = [
+        f"# HELP {p}_stage_seconds Wall time spent in each pipeline stage.",
+        f"# TYPE {p}_stage_seconds gauge",
+    ]
+    lines += [f'{p}_stage_seconds{{stage="{name}"}} {e["seconds"]}' for name, e in data['stages'].items()]
+
+    lines += [f"# TYPE {p}_provider_requests_total counter"]
+    for name, e in data['providers'].items():
+        lines.append(f'{p}_provider_requests_total{{provider="{name}",outcome="success"}} {e["success"]}')
+        lines.append(f'{p}_provider_requests_total{{provider="{name}",outcome="error"}} {e["errors"]}')
+    lines += [f"# TYPE {p}_provider_latency_seconds histogram"]
+    for name, e in data['providers'].items():
+        latency = e['latency_seconds']
+        lines += [f'{p}_provider_latency_seconds_bucket{{provider="{name}",le="{le}"}} {count}'
+                  for le, count in latency['buckets'].items()]
+        lines.append(f'{p}_provider_latency_seconds_sum{{provider="{name}"}} {latency["sum"]}')
+        lines.append(f'{p}_provider_latency_seconds_count{{provider="{name}"}} {latency["count"]}')
+    lines += [f"# TYPE {p}_provider_bytes_total counter"]
+    lines += [f'{p}_provider_bytes_total{{provider="{name}"}} {e["bytes"]}' for name, e in data['providers'].items()]
+    lines += [f"# TYPE {p}_provider_fields_filled_total counter"]
+    for name, e in data['providers'].items():
+        lines += [f'{p}_provider_fields_filled_total{{provider="{name}",field="{field}"}} {count}'
+                  for field, count in e['fields_filled'].items()]
+
+    lines += [f"# TYPE {p}_provider_tokens_total counter"]
+    for name, e in data['providers'].items():
+        lines += [f'{p}_provider_tokens_total{{provider="{name}",direction="{direction}"}} {count}'
+                  for direction, count in e['tokens'].items() if count]
+
+    lines += [f"# TYPE {p}_cache_lookups_total counter"]
+    for name, e in data['caches'].items():
+        lines.append(f'{p}_cache_lookups_total{{cache="{name}",result="hit"}} {e["hits"]}')
+        lines.append(f'{p}_cache_lookups_total{{cache="{name}",result="miss"}} {e["misses"]}')
+
+    lines += [f"# TYPE {p}_sleep_seconds_total counter", f"{p}_sleep_seconds_total {data['sleep']['seconds']}"]
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path):
+    """Write metrics as JSON to path and as a Prometheus textfile next to it (.prom)"""
+    data = snapshot()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    prom_path = os.path.splitext(path)[0] + '.prom'
+    # Textfile collectors may read at any moment, so replace the file atomically
+    tmp_path = prom_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text(data))
+    os.replace(tmp_path, prom_path)
+    print(f"\n✓ Wrote metrics to {path} and {prom_path}")
+    return prom_path
@@ -0,0 +1,495 @@
+"""
+Local Mock Server for the Scholarly Metadata APIs
+
+Emulates the parts of OpenAlex, DataCite, Crossref, Unpaywall, Europe PMC,
+Semantic Scholar, OSF and the doi.org resolver that the fetch modules use,
+so concurrency, retries and rate limiting can be load-tested offline.
+
+Every provider is served under /<name> (see providers.py), so pointing the
+fetchers at the mock is one environment variable:
+
+    python mock_api_server.py --port 8765 --latency 0.2 --error-rate 0.05 --burst-rate 0.01
+    METASCIENCE_API_BASE_URL=http://localhost:8765 python data_ingestor.py --metrics-out m.json new_rows.csv
+
+Responses:
+  - DOIs found in the master database get their real metadata (authors,
+    title, journal, volume, issue, pages, year) in each provider's JSON shape
+  - other DOIs get deterministic synthetic metadata (or 404 with --unknown 404)
+  - <fixtures-dir>/<provider>/<url-quoted DOI>.json is served verbatim if present
+  - PDF links point at /pdf/..., which serves a small generated PDF
+
+Fault injection (all per request, independent):
+  --latency/--jitter      response delay in seconds (uniform in latency ± jitter)
+  --error-rate            fraction of requests answered with 500 or 503
+  --burst-rate            chance a request starts a burst of --burst-length 429s
+                          for that provider (with Retry-After)
+  --slow-body-rate        fraction of bodies trickled out over --slow-body-seconds
+
+GROBID is emulated too (POST /grobid/api/processFulltextDocument): it
+answers with a small TEI document after --grobid-seconds and, like a real
+GROBID, returns 503 once --grobid-capacity requests are already in progress.
+GET /grobid/api/isalive answers true.
+
+GET /_stats returns request counts by provider and status.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+import os
+
+CONFIG = {
+    'latency': 0.0,
+    'jitter': 0.0,
+    'error_rate': 0.0,
+    'burst_rate': 0.0,
+    'burst_length': 5,
+    'slow_body_rate': 0.0,
+    'slow_body_seconds': 2.0,
+    'unknown': 'synthetic',
+    'fixtures_dir': None,
+    'grobid_seconds': 0.5,
+}
+
+PAPERS = {}         # normalized DOI -> metadata dict (from the master database)
+TITLES = {}         # lowercased title -> DOI
+STATS = Counter()
+_bursts = {}        # provider -> 429s left in the current burst
+_lock = threading.Lock()
+_grobid_slots = threading.BoundedSemaphore(4)
+
+SURNAMES = ['Smith', 'Garcia', 'Chen', 'Müller', 'Okafor', 'Tanaka', 'Novak', 'Silva', 'Haddad', 'Larsen']
+GIVEN_NAMES = ['Anna', 'Ben', 'Chloé', 'David', 'Emeka', 'Fatima', 'Gustav', 'Hana', 'Ivan', 'Julia']
+JOURNALS = ['Psychological Science', 'Journal of Experimental Social Psychology', 'eLife',
+            'Cognition', 'Royal Society Open Science', 'Nature Human Behaviour']
+
+
+def load_papers_from_master():
+    """Index the master database's metadata by DOI and title"""
+    from data_ingestor import build_master_metadata
+    from versioning import materialize_version
+    PAPERS.update(build_master_metadata(materialize_version()))
+    for doi, paper in PAPERS.items():
+        # Numeric columns come back as floats (2003.0, '16.0'); APIs send integers
+        for field, value in paper.items():
+            if isinstance(value, float) and value.is_integer():
+                paper[field] = int(value)
+            elif isinstance(value, str) and value.endswith('.0') and value[:-2].isdigit():
+                paper[field] = value[:-2]
+        if isinstance(paper.get('title'), str):
+            TITLES[paper['title'].strip().lower()] = doi
+
+
+def synthetic_paper(doi):
+    """Deterministic fake metadata for a DOI"""
+    rng = random.Random(hashlib.sha1(doi.encode('utf-8')).hexdigest())
+    first_page = rng.randint(1, 900)
+    return {
+        'authors': '; '.join(f"{rng.choice(GIVEN_NAMES)} {rng.choice(SURNAMES)}" for _ in range(rng.randint(1, 5))),
+        'title': f"Mock study {doi.rsplit('/', 1)[-1]}: effects of {rng.choice(['priming', 'framing', 'feedback', 'anchoring'])}",
+        'journal': rng.choice(JOURNALS),
+        'volume': str(rng.randint(1, 60)),
+        'issue': str(rng.randint(1, 12)),
+        'pages': f"{first_page}-{first_page + rng.randint(5, 30)}",
+        'year': rng.randint(1990, 2024),
+    }
+
+
+def find_paper(doi):
+    """Metadata for a DOI, or None if unknown and --unknown 404"""
+    from dois import canonical_doi
+
+    doi = canonical_doi(doi) or doi.strip().lower()
+    if doi in PAPERS:
+        return dict(PAPERS[doi], doi=doi)
+    if CONFIG['unknown'] == '404':
+        return None
+    return dict(synthetic_paper(doi), doi=doi)
+
+
+def find_paper_by_title(title):
+    """Metadata for a title search (known titles match their DOI, others get a synthetic DOI)"""
+    title = title.strip().lower()
+    if title in TITLES:
+        return find_paper(TITLES[title])
+    if CONFIG['unknown'] == '404':
+        return None
+    doi = f"10.5555/mock.{hashlib.sha1(title.encode('utf-8')).hexdigest()[:10]}"
+    return dict(synthetic_paper(doi), doi=doi, title=title.title())
+
+
+def author_names(paper):
+    authors = paper.get('authors')
+    return [a.strip() for a in authors.split(';') if a.strip()] if isinstance(authors, str) else []
+
+
+def split_name(name):
+    parts = name.rsplit(' ', 1)
+    return {'given': parts[0], 'family': parts[1]} if len(parts) == 2 else {'family': name}
+
+
+def as_str(value):
+    return None if value is None else str(value)
+
+
+def pdf_url(base, paper):
+    return f"{base}/pdf/{quote(paper['doi'], safe='')}.pdf"
+
+
+# ---------- Provider response shapes ----------
+
+def openalex_work(paper, base):
+    pages = as_str(paper.get('pages')) or ''
+    return {
+        'doi': f"https://doi.org/{paper['doi']}",
+        'title': paper.get('title'),
+        'publication_year': paper.get('year'),
+        'authorships': [{'author': {'display_name': name}} for name in author_names(paper)],
+        'host_venue': {'display_name': paper.get('journal'), 'url': f"{base}/doi/{paper['doi']}"},
+        'biblio': {'volume': as_str(paper.get('volume')), 'issue': as_str(paper.get('issue')),
+                   'first_page': pages.split('-')[0] or None},
+        'best_oa_location': {'url_for_pdf': pdf_url(base, paper), 'url': f"{base}/doi/{paper['doi']}"},
+    }
+
+
+def crossref_work(paper, base):
+    return {
+        'DOI': paper['doi'],
+        'author': [split_name(name) for name in author_names(paper)],
+        'title': [paper.get('title')],
+        'container-title': [paper.get('journal')],
+        'volume': as_str(paper.get('volume')),
+        'issue': as_str(paper.get('issue')),
+        'page': as_str(paper.get('pages')),
+        'published-print': {'date-parts': [[paper.get('year')]]},
+        'URL': f"{base}/doi/{paper['doi']}",
+        'link': [{'URL': pdf_url(base, paper), 'content-type': 'application/pdf'}],
+    }
+
+
+def datacite_record(paper, base):
+    return {'data': {'attributes': {
+        'creators': [{'name': name} for name in author_names(paper)],
+        'titles': [{'title': paper.get('title')}],
+        'publisher': paper.get('journal'),
+        'publicationYear': paper.get('year'),
+        'url': f"{base}/doi/{paper['doi']}",
+    }}}
+
+
+def unpaywall_record(paper, base):
+    return {
+        'title': paper.get('title'),
+        'z_authors': [split_name(name) for name in author_names(paper)],
+        'journal_name': paper.get('journal'),
+        'journal_volume': as_str(paper.get('volume')),
+        'journal_issue': as_str(paper.get('issue')),
+        'journal_pages': as_str(paper.get('pages')),
+        'year': paper.get('year'),
+        'doi_url': f"https://doi.org/{paper['doi']}",
+        'best_oa_location': {'url_for_pdf': pdf_url(base, paper), 'url': pdf_url(base, paper)},
+    }
+
+
+def europepmc_result(paper, base):
+    return {
+        'doi': paper['doi'],
+        'authorString': ', '.join(author_names(paper)),
+        'title': paper.get('title'),
+        'journalTitle': paper.get('journal'),
+        'journalVolume': as_str(paper.get('volume')),
+        'issue': as_str(paper.get('issue')),
+        'pageInfo': as_str(paper.get('pages')),
+        'pubYear': as_str(paper.get('year')),
+        'fullTextUrlList': {'fullTextUrl': [{'url': pdf_url(base, paper)}]},
+    }
+
+
+def semanticscholar_paper(paper, base):
+    return {
+        'title': paper.get('title'),
+        'year': paper.get('year'),
+        'venue': paper.get('journal'),
+        'url': f"{base}/doi/{paper['doi']}",
+        'authors': [{'name': name} for name in author_names(paper)],
+        'externalIds': {'DOI': paper['doi']},
+        'openAccessPdf': {'url': pdf_url(base, paper)},
+    }
+
+
+def mock_pdf(title):
+    """A minimal valid one-page PDF showing title"""
+    text = (title or 'Mock paper').replace('\\', '').replace('(', '').replace(')', '')[:80]
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode('latin-1', 'replace')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+
+def route(provider, rest, query, base):
+    """Return (status, content type, body) for a request, ignoring fault injection"""
+    def found(paper, shape):
+        if paper is None:
+            return 404, 'application/json', {'error': 'not found'}
+        fixture = CONFIG['fixtures_dir'] and os.path.join(
+            CONFIG['fixtures_dir'], provider, quote(paper['doi'], safe='') + '.json')
+        if fixture and os.path.exists(fixture):
+            with open(fixture, 'rb') as f:
+                return 200, 'application/json', f.read()
+        return 200, 'application/json', shape(paper)
+
+    if provider == 'openalex' and rest.startswith('works/'):
+        return found(find_paper(rest[len('works/'):].replace('https://doi.org/', '')), lambda p: openalex_work(p, base))
+    if provider == 'openalex' and rest == 'works':
+        title = query.get('filter', [''])[0].replace('title.search:', '')
+        paper = find_paper_by_title(title)
+        return 200, 'application/json', {'results': [openalex_work(paper, base)] if paper else []}
+    if provider == 'datacite' and rest.startswith('dois/'):
+        return found(find_paper(rest[len('dois/'):]), lambda p: datacite_record(p, base))
+    if provider == 'crossref' and rest.startswith('works/'):
+        return found(find_paper(rest[len('works/'):]), lambda p: {'message': crossref_work(p, base)})
+    if provider == 'crossref' and rest == 'works':
+        paper = find_paper_by_title(query.get('query.title', [''])[0])
+        return 200, 'application/json', {'message': {'items': [crossref_work(paper, base)] if paper else []}}
+    if provider == 'unpaywall' and rest.startswith('v2/'):
+        return found(find_paper(rest[len('v2/'):]), lambda p: unpaywall_record(p, base))
+    if provider == 'europepmc' and rest == 'search':
+        q = query.get('query', [''])[0]
+        paper = find_paper(q[len('DOI:'):]) if q.startswith('DOI:') else find_paper_by_title(q)
+        return 200, 'application/json', {'resultList': {'result': [europepmc_result(paper, base)] if paper else []}}
+    if provider == 'semanticscholar' and rest.startswith('graph/v1/paper/DOI:'):
+        return found(find_paper(rest[len('graph/v1/paper/DOI:'):]), lambda p: semanticscholar_paper(p, base))
+    if provider == 'semanticscholar' and rest == 'graph/v1/paper/search':
+        paper = find_paper_by_title(query.get('query', [''])[0])
+        return 200, 'application/json', {'data': [semanticscholar_paper(paper, base)] if paper else []}
+    if provider == 'osf_api' and rest.startswith('v2/nodes/'):
+        node = rest.split('/')[2]
+        return 200, 'application/json', {'data': [{'links': {'download': f"{base}/pdf/osf-{node}.pdf"}}]}
+    if provider == 'osf' and rest.endswith('download'):
+        return 200, 'application/pdf', mock_pdf(f"OSF preprint {rest.split('/')[0]}")
+    if provider == 'doi':
+        paper = find_paper(rest)
+        if paper is None:
+            return 404, 'text/html', b"<html><body>DOI not found</body></html>"
+        html = f'<html><body><h1>{paper.get("title")}</h1><a href="/pdf/{quote(paper["doi"], safe="")}.pdf">PDF</a></body></html>'
+        return 200, 'text/html', html.encode('utf-8')
+    if provider == 'pdf':
+        name = unquote(rest[:-len('.pdf')] if rest.endswith('.pdf') else rest)
+        paper = find_paper(name) if name.startswith('10.') else None
+        return 200, 'application/pdf', mock_pdf(paper.get('title') if paper else name)
+    if provider == 'grobid' and rest == 'api/isalive':
+        return 200, 'text/plain', b'true'
+    if provider == '_stats':
+        with _lock:
+            return 200, 'application/json', dict(STATS)
+    return 404, 'application/json', {'error': f'no mock route for /{provider}/{rest}'}
+
+
+def mock_tei(title):
+    """A small GROBID-style TEI document for a paper titled title"""
+    from xml.sax.saxutils import escape
+    rng = random.Random(title)
+    n = rng.randint(40, 400)
+    t = round(rng.uniform(1.5, 4.5), 2)
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0">
+<teiHeader><fileDesc>
+<titleStmt><title level="a" type="main">{escape(title)}</title></titleStmt>
+<sourceDesc><biblStruct><analytic>
+<author><persName><forename type="first">{rng.choice(GIVEN_NAMES)}</forename><surname>{rng.choice(SURNAMES)}</surname></persName>
+<affiliation><orgName type="institution">Mock University</orgName></affiliation></author>
+</analytic><monogr><title level="j">{rng.choice(JOURNALS)}</title><imprint><date type="published" when="{rng.randint(1990, 2024)}"/></imprint></monogr>
+</biblStruct></sourceDesc></fileDesc>
+<profileDesc><abstract><div><p>We tested whether the effect replicates in a sample of {n} participants.</p></div></abstract></profileDesc>
+</teiHeader>
+<text><body>
+<div><head n="1">Introduction</head><p>Prior work <ref type="bibr" target="#b0">(Smith, 2001)</ref> reported a large effect.</p></div>
+<div><head n="2">Method</head><p>Participants (N = {n}) were randomly assigned to two conditions.</p></div>
+<div><head n="3">Results</head><p>The effect was significant, t({n - 2}) = {t}, p = .{rng.randint(1, 49):03d}, d = {round(2 * t / (n - 2) ** 0.5, 2)}.</p>
+<formula xml:id="formula_0">d = 2t / \\sqrt{{df}}</formula></div>
+<figure type="table"><head>Table 1</head><figDesc>Descriptive statistics</figDesc>
+<table><row><cell>Condition</cell><cell>M</cell><cell>SD</cell></row><row><cell>Control</cell><cell>3.1</cell><cell>1.2</cell></row></table></figure>
+</body><back><div type="references"><listBibl>
+<biblStruct xml:id="b0"><analytic><title level="a">An earlier finding</title>
+<author><persName><forename>John</forename><surname>Smith</surname></persName></author></analytic>
+<monogr><title level="j">Cognition</title><imprint><biblScope unit="volume">10</biblScope><date when="2001"/></imprint></monogr></biblStruct>
+</listBibl></div></back></text>
+</TEI>
+"""
+
+
+def injected_fault(provider):
+    """Return a (status, headers) fault to send instead of the real response, or None"""
+    with _lock:
+        if _bursts.get(provider, 0) > 0:
+            _bursts[provider] -= 1
+            return 429, {'Retry-After': '1'}
+        if random.random() < CONFIG['burst_rate']:
+            _bursts[provider] = CONFIG['burst_length'] - 1
+            return 429, {'Retry-After': '1'}
+    if random.random() < CONFIG['error_rate']:
+        return random.choice([500, 503]), {}
+    return None
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        provider, _, rest = url.path.lstrip('/').partition('/')
+        base = f"http://{self.headers.get('Host', 'localhost')}"
+
+        delay = CONFIG['latency'] + random.uniform(-CONFIG['jitter'], CONFIG['jitter'])
+        if delay > 0 and provider != '_stats':
+            time.sleep(delay)
+
+        fault = injected_fault(provider) if provider != '_stats' else None
+        if fault:
+            status, headers = fault
+            content_type, body = 'application/json', json.dumps({'error': 'injected fault'}).encode()
+        else:
+            status, content_type, body = route(provider, unquote(rest), parse_qs(url.query), base)
+            headers = {}
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode('utf-8')
+
+        with _lock:
+            STATS[f"{provider} {status}"] += 1
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        if status == 200 and random.random() < CONFIG['slow_body_rate']:
+            # Trickle the body out to exercise read timeouts
+            pieces = 10
+            step = max(1, len(body) // pieces)
+            for start in range(0, len(body), step):
+                self.wfile.write(body[start:start + step])
+                self.wfile.flush()
+                time.sleep(CONFIG['slow_body_seconds'] / pieces)
+        else:
+            self.wfile.write(body)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        provider = url.path.lstrip('/').partition('/')[0]
+
+        fault = injected_fault(provider)
+        if fault:
+            status, headers, content = fault[0], fault[1], b'injected fault'
+        elif url.path.rstrip('/') != '/grobid/api/processFulltextDocument':
+            status, headers, content = 404, {}, b'no mock route'
+        elif not _grobid_slots.acquire(blocking=False):
+            # Real GROBID answers 503 when all its workers are busy
+            status, headers, content = 503, {}, b'GROBID busy'
+        else:
+            try:
+                time.sleep(CONFIG['grobid_seconds'])
+                # The mock PDFs carry their title as the page text
+                start = body.find(b'(')
+                end = body.find(b') Tj', start)
+                title = body[start + 1:end].decode('latin-1') if 0 <= start < end else 'Untitled'
+                status, headers, content = 200, {}, mock_tei(title).encode('utf-8')
+            finally:
+                _grobid_slots.release()
+
+        with _lock:
+            STATS[f"{provider} {status}"] += 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/xml' if status == 200 else 'text/plain')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if CONFIG.get('verbose'):
+            super().log_message(format, *args)
+
+
+def serve(host='127.0.0.1', port=8765):
+    """Start the mock server and block"""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    print(f"Mock scholarly APIs on http://{host}:{port} ({len(PAPERS)} papers from the master database)")
+    print(f"  export METASCIENCE_API_BASE_URL=http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local mock server for the scholarly metadata APIs",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python mock_api_server.py
+  python mock_api_server.py --latency 0.3 --jitter 0.2 --error-rate 0.05 --burst-rate 0.02
+  python mock_api_server.py --slow-body-rate 0.1 --slow-body-seconds 15 --unknown 404
+        """
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Delay varies uniformly by ± this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 500/503')
+    parser.add_argument('--burst-rate', type=float, default=0.0, help='Chance per request of starting a 429 burst')
+    parser.add_argument('--burst-length', type=int, default=5, help='Number of 429s in a burst')
+    parser.add_argument('--slow-body-rate', type=float, default=0.0, help='Fraction of responses sent slowly')
+    parser.add_argument('--slow-body-seconds', type=float, default=2.0, help='How long a slow body takes')
+    parser.add_argument('--unknown', choices=['synthetic', '404'], default='synthetic',
+                        help='Response for DOIs not in the master database')
+    parser.add_argument('--fixtures-dir', type=str, default=None,
+                        help='Serve <dir>/<provider>/<url-quoted DOI>.json verbatim when present')
+    parser.add_argument('--grobid-seconds', type=float, default=0.5, help='Time the mock GROBID takes per PDF')
+    parser.add_argument('--grobid-capacity', type=int, default=4,
+                        help='Concurrent GROBID requests before answering 503 (default: 4)')
+    parser.add_argument('--no-master', action='store_true', help="Don't load metadata from the master database")
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for fault injection')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    args = parser.parse_args()
+    CONFIG.update(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, burst_rate=args.burst_rate,
+        burst_length=args.burst_length, slow_body_rate=args.slow_body_rate,
+        slow_body_seconds=args.slow_body_seconds, unknown=args.unknown, fixtures_dir=args.fixtures_dir,
+        verbose=args.verbose, grobid_seconds=args.grobid_seconds,
+    )
+    _grobid_slots = threading.BoundedSemaphore(args.grobid_capacity)
+    if args.seed is not None:
+        random.seed(args.seed)
+    if not args.no_master:
+        load_papers_from_master()
+    serve(args.host, args.port)
@@ -0,0 +1,235 @@
+"""
+Near-Duplicate Detection for Replications Database
+
+dedup.py only catches rows whose description is identical after collapsing
+whitespace, so re-uploads with tweaked punctuation, trailing spaces or a
+reworded phrase end up as extra rows. This finds them with MinHash and
+locality-sensitive hashing (LSH) and writes a duplicate-cluster report to
+review; nothing is removed automatically.
+
+  - Blocking: only rows with the same original and replication DOI/URL
+    (normalized as in dedup.py) and the same numbers in their description
+    are compared, so "Subexperiment #3" and "Subexperiment #20" of one
+    replication never match. Rows alone in their block are skipped.
+  - Shingles: descriptions are lowercased with punctuation removed, then
+    hashed as overlapping SHINGLE_SIZE-byte windows (vectorized with numpy).
+  - MinHash: NUM_PERM multiply-shift hashes give each distinct description a
+    signature whose agreement with another estimates their Jaccard similarity.
+  - LSH: signatures are split into LSH_BANDS bands; rows of a block sharing
+    a band are candidates, checked against --threshold and merged into
+    clusters. Each bucket is chained rather than compared all-pairs, so
+    the work grows linearly with the number of rows.
+
+Punctuation, case and whitespace edits always match. A one-word change in a
+short description may be a re-upload or a different effect of the same
+paper ("Extrinsic"/"Intrinsic success ..."), which is why clusters are
+reported for review rather than dropped.
+
+Signatures are computed in chunks of CHUNK_ROWS descriptions to bound memory
+on million-row frames.
+
+Usage:
+    python near_duplicates.py --report-out near_duplicates.csv
+    python near_duplicates.py new_rows.csv --threshold 0.8
+"""
+
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from dedup import KEY_SEPARATOR, normalize_url_series
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+LSH_BANDS = 16
+DEFAULT_THRESHOLD = 0.9
+CHUNK_ROWS = 50_000
+
+NON_WORD_RE = re.compile(r'[\W_]+')
+NUMBER_RE = re.compile(r'\d+')
+
+REPORT_COLUMNS = ['cluster', 'row', 'similarity', 'original_url', 'replication_url', 'project_tag', 'description']
+
+# Fixed seed so reports are reproducible between runs
+_rng = np.random.default_rng(20240601)
+PERM_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+PERM_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+BAND_MIX = _rng.integers(1, 2**63, NUM_PERM // LSH_BANDS, dtype=np.uint64) | np.uint64(1)
+
+
+def shingle_text(description):
+    """A description as compared by MinHash: lowercased, punctuation removed, whitespace collapsed"""
+    if not isinstance(description, str):
+        return ''
+    return NON_WORD_RE.sub(' ', description.lower()).strip()
+
+
+def shingle_text_series(descriptions):
+    """shingle_text for every value of a Series, computed once per distinct value"""
+    codes, uniques = pd.factorize(descriptions.astype(object))
+    texts = np.array([shingle_text(value) for value in uniques] + [''], dtype=object)
+    return pd.Series(texts[codes], index=descriptions.index, dtype=object)
+
+
+def block_keys(df, texts):
+    """Blocking key of each row: normalized original and replication DOI/URL plus the numbers in the description"""
+    original = normalize_url_series(df.reindex(columns=['original_url'])['original_url'])
+    replication = normalize_url_series(df.reindex(columns=['replication_url'])['replication_url'])
+    codes, uniques = pd.factorize(texts)
+    numbers = np.array([' '.join(NUMBER_RE.findall(text)) for text in uniques], dtype=object)
+    return original + KEY_SEPARATOR + replication + KEY_SEPARATOR + pd.Series(numbers[codes], index=texts.index)
+
+
+def shingle_hashes(texts):
+    """
+    64-bit hashes of every SHINGLE_SIZE-byte window of each text. Returns
+    (hashes, starts): text i's shingles are hashes[starts[i]:starts[i + 1]].
+    Texts shorter than a shingle are padded so every text has at least one.
+    """
+    encoded = [text.ljust(SHINGLE_SIZE).encode('utf-8') for text in texts]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    # Polynomial rolling hash of every window of the concatenated buffer (uint64 wraps)
+    windows = len(buffer) - SHINGLE_SIZE + 1
+    hashes = np.zeros(windows, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint64(1099511628211) + buffer[offset:offset + windows]
+
+    # Keep only the windows that lie within one text
+    counts = lengths - SHINGLE_SIZE + 1
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    positions = np.repeat(offsets - starts[:-1], counts) + np.arange(starts[-1])
+    return hashes[positions], starts
+
+
+def minhash_signatures(texts):
+    """NUM_PERM-value MinHash signature (uint32) of each text's shingle set, as an array of shape (len(texts), NUM_PERM)"""
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for chunk in range(0, len(texts), CHUNK_ROWS):
+        hashes, starts = shingle_hashes(texts[chunk:chunk + CHUNK_ROWS])
+        for perm in range(NUM_PERM):
+            # Multiply-shift hashing: the top 32 bits of a*x + b mod 2^64
+            permuted = ((hashes * PERM_A[perm] + PERM_B[perm]) >> np.uint64(32)).astype(np.uint32)
+            signatures[chunk:chunk + len(starts) - 1, perm] = np.minimum.reduceat(permuted, starts[:-1])
+    return signatures
+
+
+def band_hashes(signatures):
+    """One uint64 hash per (row, LSH band) of the signatures"""
+    rows_per_band = NUM_PERM // LSH_BANDS
+    bands = signatures.reshape(len(signatures), LSH_BANDS, rows_per_band).astype(np.uint64)
+    return (bands * BAND_MIX).sum(axis=2)
+
+
+def find_root(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def near_duplicate_clusters(df, threshold=DEFAULT_THRESHOLD):
+    """
+    Clusters of near-duplicate rows in df. Returns a DataFrame with one row
+    per clustered row: cluster (numbered from 1, largest first), row (df
+    index label) and similarity (estimated Jaccard similarity to the first
+    row of its cluster), sorted by cluster.
+    """
+    texts = shingle_text_series(df.reindex(columns=['description'])['description'])
+    blocks = block_keys(df, texts).where(texts != '')
+    # Rows alone in their block (or without a description) can't be near-duplicates
+    candidates = blocks.notna() & blocks.duplicated(keep=False)
+    if not candidates.any():
+        return pd.DataFrame(columns=['cluster', 'row', 'similarity'])
+
+    block_codes = pd.factorize(blocks[candidates])[0]
+    text_codes, unique_texts = pd.factorize(texts[candidates])
+    signatures = minhash_signatures(list(unique_texts))[text_codes]
+    positions = np.arange(len(block_codes))
+
+    # Chain the rows of every (block, band) bucket and keep links above the threshold
+    parents = list(positions)
+    similarity = lambda a, b: float(np.mean(signatures[a] == signatures[b]))
+    band_values = band_hashes(signatures)
+    for band in range(LSH_BANDS):
+        order = np.lexsort((positions, band_values[:, band], block_codes))
+        same_bucket = ((block_codes[order][1:] == block_codes[order][:-1])
+                       & (band_values[order, band][1:] == band_values[order, band][:-1]))
+        for a, b in zip(order[:-1][same_bucket], order[1:][same_bucket]):
+            root_a, root_b = find_root(parents, a), find_root(parents, b)
+            if root_a != root_b and similarity(a, b) >= threshold:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    roots = np.array([find_root(parents, i) for i in positions])
+    sizes = pd.Series(roots).value_counts()
+    clustered = sizes.index[sizes > 1]
+    if clustered.empty:
+        return pd.DataFrame(columns=['cluster', 'row', 'similarity'])
+    cluster_numbers = {root: number for number, root in enumerate(
+        sorted(clustered, key=lambda root: (-sizes[root], root)), start=1)}
+
+    members = positions[np.isin(roots, clustered)]
+    return pd.DataFrame({
+        'cluster': [cluster_numbers[roots[i]] for i in members],
+        'row': candidates.index[candidates][members],
+        'similarity': [round(similarity(roots[i], i), 3) for i in members],
+    }).sort_values(['cluster', 'row'], kind='stable').reset_index(drop=True)
+
+
+def near_duplicate_report(df, threshold=DEFAULT_THRESHOLD, rows=None):
+    """
+    near_duplicate_clusters with each row's URLs, project_tag and description,
+    for review. If rows (index labels) is given, only clusters containing one
+    of them are reported, e.g. the rows of a new upload checked against the master.
+    """
+    clusters = near_duplicate_clusters(df, threshold)
+    if rows is not None:
+        clusters = clusters[clusters['cluster'].isin(clusters.loc[clusters['row'].isin(rows), 'cluster'])]
+    details = df.reindex(columns=REPORT_COLUMNS[3:]).loc[clusters['row']].reset_index(drop=True)
+    return pd.concat([clusters.reset_index(drop=True), details], axis=1)[REPORT_COLUMNS]
+
+
+if __name__ == "__main__":
+    from versioning import head_version, materialize_version
+
+    parser = argparse.ArgumentParser(
+        description="Report clusters of near-duplicate rows (same DOI pair, nearly identical description)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python near_duplicates.py
+  python near_duplicates.py --report-out near_duplicates.csv
+  python near_duplicates.py new_rows.csv --threshold 0.8
+        """
+    )
+    parser.add_argument('input_files', nargs='*',
+                       help='CSV files to check against the master database (default: check the master itself)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                       help=f'Minimum estimated Jaccard similarity of descriptions (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--report-out', type=str, default=None, help='Write the cluster report to this CSV file')
+
+    args = parser.parse_args()
+    master_entry = head_version()
+    df = materialize_version(master_entry) if master_entry else pd.DataFrame()
+    new_rows = None
+    if args.input_files:
+        new_df = pd.concat([pd.read_csv(path) for path in args.input_files], ignore_index=True)
+        df = pd.concat([df, new_df], ignore_index=True)
+        new_rows = df.index[len(df) - len(new_df):]
+
+    print(f"\n{'='*60}")
+    print(f"NEAR-DUPLICATE DETECTION ({len(df)} rows, threshold {args.threshold})")
+    print(f"{'='*60}")
+    report = near_duplicate_report(df, args.threshold, new_rows)
+    print(f"  {report['cluster'].nunique()} clusters covering {len(report)} rows")
+    for cluster, rows in list(report.groupby('cluster'))[:10]:
+        print(f"\n  Cluster {cluster} ({rows['original_url'].iloc[0]} → {rows['replication_url'].iloc[0]}):")
+        for _, row in rows.iterrows():
+            print(f"    [{row['row']}] {row['similarity']:.2f}  {str(row['description'])[:100]}")
+    if args.report_out:
+        report.to_csv(args.report_out, index=False)
+        print(f"\n✓ Wrote {args.report_out}")
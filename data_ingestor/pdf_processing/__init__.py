@@ -0,0 +1,8 @@
+"""
+PDF Processing Pipeline
+
+PDF → TEI (GROBID) → Markdown, for extracting statistical results from the
+papers fetched by fetch_pdf_from_doi.py. See PDF_PROCESSING_CONTEXT.md.
+
+    from pdf_processing.grobid_client import process_pdf_to_markdown, process_batch
+"""
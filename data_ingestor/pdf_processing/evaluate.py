@@ -0,0 +1,305 @@
+"""
+Extraction Evaluation Against ground_truth.csv
+
+Runs an extraction backend (a Claude model, "rules", "stub", optionally with
+--rules-first / --prefilter) over every ground-truth study whose paper is
+available, and compares what it extracted with the validated values:
+
+    _es, _es_type, _p_value, _n   (PDF_PROCESSING_CONTEXT.md, section 7)
+    _es_r                         (the effect size converted to r)
+
+A study is eligible when its _pdf_exists flag is set and its paper is in
+--pdf-dir (named like pull_pdfs.ipynb saves them, 10.1037--abc.pdf) or, to
+skip GROBID, in --markdown-dir (10.1037--abc.md). PDFs are converted with
+--converter (see pipeline.py; "text" needs no GROBID). Each paper is processed
+once, however many studies cite it, with a process pool of --workers.
+
+A field counts as found when any extracted result matches it: exactly (to 3
+decimals) or within TOLERANCES. Effect sizes are compared by magnitude,
+since sign conventions differ between papers and the database.
+
+Speed (papers/min) and cost/paper are reported alongside accuracy so
+backends can be compared on both. Cost/paper uses each record's token usage,
+so it is the backend's cost even when records come from the cache; use
+--refresh to time fresh calls.
+
+Usage:
+    python -m pdf_processing.evaluate --pdf-dir pdfs/ --model rules
+    python -m pdf_processing.evaluate --markdown-dir markdown/ --model claude-sonnet-4-5 --prefilter --limit 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dois import canonical_doi, doi_filename
+from pdf_processing.grobid_client import GROBID_URL
+from pdf_processing.llm_extractor import DEFAULT_MODEL, LLM_CACHE_DIR, record_cost
+from pdf_processing.pipeline import CONVERTERS, process_pdf_record
+from pdf_processing.schemas import ES_TYPE_ALIASES, to_number
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUND_TRUTH_CSV = os.path.join(SCRIPT_DIR, 'ground_truth.csv')
+
+# ground-truth suffix -> extracted result field
+FIELDS = {
+    'es': 'effect_size_value',
+    'es_type': 'effect_size_type',
+    'p_value': 'p_value',
+    'n': 'sample_size',
+    'es_r': 'effect_size_r',
+}
+
+# Numeric fields match when |extracted - truth| <= max(abs, rel * |truth|)
+TOLERANCES = {
+    'es': {'abs': 0.01, 'rel': 0.05},
+    'p_value': {'abs': 0.001, 'rel': 0.05},
+    'n': {'abs': 0, 'rel': 0.02},
+    'es_r': {'abs': 0.02, 'rel': 0},
+}
+MAGNITUDE_FIELDS = ('es', 'es_r')
+
+
+# ---------- Eligible studies ----------
+
+def is_flag_set(value):
+    """_pdf_exists is True/False in the CSV, "yes"/"no" in older exports"""
+    return value is True or str(value).strip().lower() in ('true', 'yes', '1')
+
+
+def paper_path(doi, pdf_dir=None, markdown_dir=None):
+    """Markdown (preferred) or PDF for a DOI, or None if neither is there"""
+    name = doi_filename(doi)
+    for directory, extension in ((markdown_dir, '.md'), (pdf_dir, '.pdf')):
+        if directory and os.path.exists(os.path.join(directory, name + extension)):
+            return os.path.join(directory, name + extension)
+    return None
+
+
+def eligible_studies(ground_truth_csv, pdf_dir=None, markdown_dir=None):
+    """
+    Ground-truth studies whose paper is available, as dicts with the DOI,
+    side (original/replication), paper path and ground-truth values.
+    Also returns how many flagged studies had no file.
+    """
+    import pandas as pd
+
+    ground_truth = pd.read_csv(ground_truth_csv)
+    studies = []
+    missing = 0
+    for prefix in ('original', 'replication'):
+        for index, row in ground_truth.iterrows():
+            doi = canonical_doi(row.get(f'{prefix}_url'))
+            if not doi or not is_flag_set(row.get(f'{prefix}_pdf_exists')):
+                continue
+            path = paper_path(doi, pdf_dir, markdown_dir)
+            if path is None:
+                missing += 1
+                continue
+            truth = {}
+            for suffix in FIELDS:
+                value = row.get(f'{prefix}_{suffix}')
+                truth[suffix] = None if pd.isna(value) else value
+            studies.append({'row': int(index), 'side': prefix, 'doi': doi, 'path': path, 'truth': truth})
+    return studies, missing
+
+
+# ---------- Scoring ----------
+
+def normalize_es_type(es_type):
+    es_type = str(es_type or '').strip().lower()
+    return ES_TYPE_ALIASES.get(es_type, es_type)
+
+
+def match_field(suffix, truth, results):
+    """('exact' | 'tolerance' | None) for the best match of a ground-truth value among the extracted results"""
+    field = FIELDS[suffix]
+    if suffix == 'es_type':
+        expected = normalize_es_type(truth)
+        return 'exact' if any(normalize_es_type(r[field]) == expected for r in results) else None
+
+    expected = to_number(truth)
+    if expected is None:
+        return None
+    best = None
+    for result in results:
+        value = to_number(result[field])
+        if value is None:
+            continue
+        if suffix in MAGNITUDE_FIELDS:
+            value, expected = abs(value), abs(expected)
+        if round(value, 3) == round(expected, 3):
+            return 'exact'
+        tolerance = TOLERANCES[suffix]
+        if abs(value - expected) <= max(tolerance['abs'], tolerance['rel'] * abs(expected)):
+            best = 'tolerance'
+    return best
+
+
+def score_study(study, extraction):
+    """{suffix: 'exact' | 'tolerance' | None} for each ground-truth value the study has"""
+    results = extraction['statistical_results'] if extraction else []
+    return {suffix: match_field(suffix, truth, results)
+            for suffix, truth in study['truth'].items() if truth is not None}
+
+
+def summarize(studies):
+    """Per-field counts and rates over the scored studies"""
+    summary = {}
+    for suffix in FIELDS:
+        scored = [s['scores'][suffix] for s in studies if suffix in s['scores']]
+        exact = sum(1 for m in scored if m == 'exact')
+        within = sum(1 for m in scored if m is not None)
+        summary[suffix] = {
+            'studies': len(scored),
+            'exact': exact,
+            'within_tolerance': within,
+            'exact_rate': exact / len(scored) if scored else None,
+            'within_tolerance_rate': within / len(scored) if scored else None,
+        }
+    return summary
+
+
+# ---------- Running ----------
+
+def run_paper(path, options):
+    """Worker: the extraction record for one paper (or the error), with wall time"""
+    start = time.perf_counter()
+    try:
+        record = process_pdf_record(path, options['model'], options['grobid_url'], options['cache_dir'],
+                                    options['refresh'], options['prefilter'], options['rules_first'],
+                                    options['converter'])
+        error = None
+    except Exception as e:
+        record = None
+        error = f"{type(e).__name__}: {e}"
+    return {'path': path, 'record': record, 'error': error, 'seconds': time.perf_counter() - start}
+
+
+def evaluate(ground_truth_csv=GROUND_TRUTH_CSV, pdf_dir=None, markdown_dir=None, model=DEFAULT_MODEL,
+             workers=None, grobid_url=GROBID_URL, cache_dir=LLM_CACHE_DIR, refresh=False, prefilter=False,
+             rules_first=False, limit=None, converter='auto'):
+    """Run the backend over every eligible paper and score it. Returns the report dict."""
+    studies, missing = eligible_studies(ground_truth_csv, pdf_dir, markdown_dir)
+    paths = list(dict.fromkeys(s['path'] for s in studies))
+    if limit:
+        paths = paths[:limit]
+        studies = [s for s in studies if s['path'] in set(paths)]
+    workers = workers or os.cpu_count() or 1
+    options = {'model': model, 'grobid_url': grobid_url, 'cache_dir': cache_dir, 'refresh': refresh,
+               'prefilter': prefilter, 'rules_first': rules_first, 'converter': converter}
+
+    backend = model + (' (rules first)' if rules_first else '') + (' (prefilter)' if prefilter else '')
+    print(f"\n{'='*60}")
+    print(f"EXTRACTION EVALUATION: {backend}")
+    print(f"{len(studies)} studies in {len(paths)} papers, {workers} workers")
+    if missing:
+        print(f"⚠️  {missing} studies flagged _pdf_exists have no file in the given directories")
+    print(f"{'='*60}")
+
+    runs = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_paper, path, options) for path in paths]
+        for i, future in enumerate(as_completed(futures), 1):
+            run = future.result()
+            runs[run['path']] = run
+            name = os.path.splitext(os.path.basename(run['path']))[0]
+            if run['error']:
+                print(f"  [{i}/{len(paths)}] ⚠️  {name}: {run['error']}")
+            elif i % 50 == 0 or i == len(paths):
+                print(f"  [{i}/{len(paths)}] ✓ {name}")
+    elapsed = time.perf_counter() - start
+
+    for study in studies:
+        run = runs[study['path']]
+        study['scores'] = score_study(study, run['record']['extraction'] if run['record'] else None)
+    summary = summarize(studies)
+
+    records = [run['record'] for run in runs.values() if run['record']]
+    costs = [record_cost(r) for r in records]
+    known_costs = [c for c in costs if c is not None]
+    report = {
+        'backend': {'model': model, 'rules_first': rules_first, 'prefilter': prefilter, 'converter': converter},
+        'papers': len(paths),
+        'studies': len(studies),
+        'failed': sum(1 for run in runs.values() if run['error']),
+        'cached': sum(1 for r in records if r['cached']),
+        'elapsed_seconds': round(elapsed, 2),
+        'papers_per_minute': len(paths) / elapsed * 60 if elapsed else None,
+        'median_seconds_per_paper': statistics.median(run['seconds'] for run in runs.values()) if runs else None,
+        'results_per_paper': sum(len(r['extraction']['statistical_results']) for r in records) / len(records)
+        if records else None,
+        'input_tokens_per_paper': sum(r['input_tokens'] for r in records) / len(records) if records else None,
+        'cost_per_paper_usd': sum(known_costs) / len(known_costs) if known_costs else None,
+        'accuracy': summary,
+        'study_scores': [{'row': s['row'], 'side': s['side'], 'doi': s['doi'], 'scores': s['scores'],
+                          'error': runs[s['path']]['error']} for s in studies],
+    }
+
+    print(f"\n{'field':<10} {'studies':>8} {'exact':>8} {'within tol':>11}")
+    for suffix, counts in summary.items():
+        if counts['studies']:
+            print(f"{suffix:<10} {counts['studies']:>8} {counts['exact_rate']:>8.1%} "
+                  f"{counts['within_tolerance_rate']:>11.1%}")
+        else:
+            print(f"{suffix:<10} {0:>8} {'–':>8} {'–':>11}")
+
+    cost = f"${report['cost_per_paper_usd']:.4f}" if report['cost_per_paper_usd'] is not None else 'unknown'
+    print(f"\n✓ {len(paths) - report['failed']} papers extracted ({report['failed']} failed, "
+          f"{report['cached']} from cache) in {elapsed:.1f}s")
+    print(f"  Speed: {report['papers_per_minute'] or 0:.1f} papers/min "
+          f"(median {report['median_seconds_per_paper'] or 0:.2f}s/paper)")
+    print(f"  Cost: {cost}/paper, {report['input_tokens_per_paper'] or 0:,.0f} input tokens/paper, "
+          f"{report['results_per_paper'] or 0:.1f} results/paper")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate an extraction backend against ground_truth.csv",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.evaluate --pdf-dir pdfs/ --model rules
+  python -m pdf_processing.evaluate --pdf-dir pdfs/ --model rules --converter text
+  python -m pdf_processing.evaluate --pdf-dir pdfs/ --model claude-sonnet-4-5 --rules-first --prefilter
+  python -m pdf_processing.evaluate --markdown-dir markdown/ --model stub --limit 20 --report-out eval.json
+        """
+    )
+    parser.add_argument('--ground-truth', type=str, default=GROUND_TRUTH_CSV,
+                       help='Ground-truth CSV (default: ground_truth.csv)')
+    parser.add_argument('--pdf-dir', type=str, help='Directory of PDFs named <doi with / as -->.pdf')
+    parser.add_argument('--markdown-dir', type=str,
+                       help='Directory of already converted Markdown (<doi with / as -->.md), used before --pdf-dir')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL,
+                       help=f'Extraction backend: a model name, "rules" or "stub" (default: {DEFAULT_MODEL})')
+    parser.add_argument('--rules-first', action='store_true',
+                       help='Use the rule-based extractor, and the model only for papers it cannot handle')
+    parser.add_argument('--prefilter', action='store_true',
+                       help='Send only the statistics-bearing passages to the model')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Worker processes (default: one per CPU)')
+    parser.add_argument('--limit', type=int, default=None, help='Only evaluate the first N papers')
+    parser.add_argument('--converter', choices=CONVERTERS, default='auto',
+                       help='PDF to text: GROBID, the PDF text layer, or GROBID if reachable (default: auto)')
+    parser.add_argument('--grobid-url', type=str, default=GROBID_URL,
+                       help=f'GROBID server URL (default: {GROBID_URL})')
+    parser.add_argument('--cache-dir', type=str, default=LLM_CACHE_DIR,
+                       help='Extraction cache directory (default: data_ingestor/.llm_cache)')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached extractions (for timing)')
+    parser.add_argument('--report-out', type=str, help='Write the report (with per-study scores) as JSON')
+
+    args = parser.parse_args()
+    if not args.pdf_dir and not args.markdown_dir:
+        parser.error('give --pdf-dir and/or --markdown-dir')
+    report = evaluate(args.ground_truth, args.pdf_dir, args.markdown_dir, args.model, args.workers,
+                      args.grobid_url, args.cache_dir, args.refresh, args.prefilter, args.rules_first, args.limit,
+                      args.converter)
+    if args.report_out:
+        with open(args.report_out, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"  Report: {args.report_out}")
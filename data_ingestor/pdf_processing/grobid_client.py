@@ -0,0 +1,270 @@
+"""
+GROBID Batch Client
+
+Sends PDFs to a GROBID service (processFulltextDocument) and converts the
+returned TEI to Markdown. Built for running over the whole corpus of PDFs
+fetched by fetch_pdf_from_doi.py:
+
+  - a fixed number of requests are in flight at once (--concurrency), which
+    should match the GROBID server's concurrency setting so it stays busy
+    without queueing
+  - 503 responses (GROBID's "all workers busy") and dropped connections are
+    retried with exponential backoff, honoring Retry-After
+  - the TEI is cached by the PDF's sha256, so reconverting the corpus after
+    a change to the Markdown converter makes no GROBID calls at all, and
+    the same PDF saved under two names is only processed once
+
+Cache layout: .tei_cache/<sha256[:2]>/<sha256>.tei.xml (use --refresh after
+changing GROBID versions or options).
+
+Start GROBID with:
+    docker run --rm --init --ulimit core=0 -p 8070:8070 lfoppiano/grobid:0.8.1
+
+Usage:
+    python -m pdf_processing.grobid_client ~/PDFs --markdown-dir markdown/
+    python -m pdf_processing.grobid_client paper.pdf --grobid-url http://localhost:8070
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import requests
+
+import metrics
+from pdf_processing.tei_to_markdown import tei_to_markdown
+
+GROBID_URL = "http://localhost:8070"
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEI_CACHE_DIR = os.path.join(SCRIPT_DIR, '.tei_cache')
+
+DEFAULT_CONCURRENCY = 10   # GROBID's default concurrency in grobid.yaml
+MAX_RETRIES = 8
+MAX_BACKOFF = 60
+REQUEST_TIMEOUT = 300
+
+GROBID_OPTIONS = {
+    'consolidateHeader': '1',
+    'consolidateCitations': '0',
+    'includeRawCitations': '0',
+}
+
+_sessions = threading.local()
+
+
+def pdf_sha256(pdf_path):
+    """sha256 hex digest of a PDF's bytes"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def tei_cache_path(sha256, cache_dir=TEI_CACHE_DIR):
+    return os.path.join(cache_dir, sha256[:2], f"{sha256}.tei.xml")
+
+
+def load_cached_tei(sha256, cache_dir=TEI_CACHE_DIR):
+    """Cached TEI for a PDF hash, or None"""
+    path = tei_cache_path(sha256, cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def save_cached_tei(sha256, tei, cache_dir=TEI_CACHE_DIR):
+    """Cache TEI (atomically, so concurrent workers never see a partial file)"""
+    path = tei_cache_path(sha256, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(tei)
+    os.replace(tmp_path, path)
+
+
+def backoff_seconds(attempt, retry_after=None):
+    """Delay before retry number attempt (0-based): Retry-After if given, else exponential with jitter"""
+    if retry_after and str(retry_after).isdigit():
+        return float(retry_after)
+    return min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def request_tei(pdf_path, grobid_url=GROBID_URL, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT):
+    """POST a PDF to GROBID and return the TEI, retrying while the server is busy"""
+    if not hasattr(_sessions, 'session'):
+        _sessions.session = requests.Session()
+    url = f"{grobid_url.rstrip('/')}/api/processFulltextDocument"
+
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        try:
+            with open(pdf_path, 'rb') as f:
+                r = _sessions.session.post(url, files={'input': (os.path.basename(pdf_path), f, 'application/pdf')},
+                                           data=GROBID_OPTIONS, timeout=timeout)
+        except requests.ConnectionError:
+            metrics.record_request('grobid', time.perf_counter() - start, False)
+            if attempt == max_retries:
+                raise
+            metrics.sleep(backoff_seconds(attempt))
+            continue
+        metrics.record_request('grobid', time.perf_counter() - start, r.status_code == 200, len(r.content))
+
+        if r.status_code == 200:
+            return r.text
+        if r.status_code == 503 and attempt < max_retries:
+            metrics.sleep(backoff_seconds(attempt, r.headers.get('Retry-After')))
+            continue
+        raise RuntimeError(f"GROBID returned {r.status_code} for {os.path.basename(pdf_path)}: {r.text[:200]}")
+
+    raise RuntimeError(f"GROBID still busy after {max_retries} retries")
+
+
+@lru_cache(maxsize=None)
+def grobid_available(grobid_url=GROBID_URL):
+    """True if a GROBID service answers at grobid_url (checked once per process)"""
+    try:
+        response = requests.get(f"{grobid_url.rstrip('/')}/api/isalive", timeout=5)
+    except requests.RequestException:
+        return False
+    return response.ok and response.text.strip().lower() == 'true'
+
+
+def process_pdf_to_tei(pdf_path, grobid_url=GROBID_URL, cache_dir=TEI_CACHE_DIR, refresh=False, sha256=None):
+    """Return (TEI, cached) for a PDF, calling GROBID only on a cache miss"""
+    sha256 = sha256 or pdf_sha256(pdf_path)
+    if not refresh:
+        tei = load_cached_tei(sha256, cache_dir)
+        metrics.record_cache('tei', tei is not None)
+        if tei is not None:
+            return tei, True
+    tei = request_tei(pdf_path, grobid_url)
+    save_cached_tei(sha256, tei, cache_dir)
+    return tei, False
+
+
+def process_pdf_to_markdown(pdf_path: str, grobid_url: str = GROBID_URL) -> str:
+    """Convert PDF to Markdown via GROBID."""
+    tei, _ = process_pdf_to_tei(pdf_path, grobid_url)
+    return tei_to_markdown(tei)
+
+
+def find_pdfs(paths):
+    """Expand files and directories (recursively) into a sorted list of PDF paths"""
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                pdfs += [os.path.join(directory, n) for n in names if n.lower().endswith('.pdf')]
+        else:
+            pdfs.append(path)
+    return sorted(pdfs)
+
+
+def markdown_path(pdf_path, markdown_dir):
+    return os.path.join(markdown_dir, os.path.splitext(os.path.basename(pdf_path))[0] + '.md')
+
+
+def process_batch(pdf_paths, grobid_url=GROBID_URL, concurrency=DEFAULT_CONCURRENCY, cache_dir=TEI_CACHE_DIR,
+                  refresh=False, markdown_dir=None):
+    """
+    Process many PDFs with at most concurrency GROBID requests in flight.
+    Writes <markdown_dir>/<pdf name>.md if markdown_dir is given. Returns a
+    list of {pdf, sha256, status ('cached', 'processed' or 'error'), seconds, error}.
+    """
+    start = time.perf_counter()
+    print(f"\n{'='*60}")
+    print(f"GROBID BATCH: {len(pdf_paths)} PDFs, {concurrency} in flight ({grobid_url})")
+    print(f"{'='*60}")
+
+    with metrics.stage('hash'):
+        hashes = {pdf: pdf_sha256(pdf) for pdf in pdf_paths}
+    # Identical PDFs saved under different names only go to GROBID once
+    by_hash = {}
+    for pdf, sha256 in hashes.items():
+        by_hash.setdefault(sha256, []).append(pdf)
+
+    if markdown_dir:
+        os.makedirs(markdown_dir, exist_ok=True)
+
+    results = []
+
+    def finish(sha256, status, tei=None, seconds=0.0, error=None):
+        for pdf in by_hash[sha256]:
+            if tei is not None and markdown_dir:
+                with open(markdown_path(pdf, markdown_dir), 'w', encoding='utf-8') as f:
+                    f.write(tei_to_markdown(tei))
+            results.append({'pdf': pdf, 'sha256': sha256, 'status': status,
+                            'seconds': round(seconds, 3), 'error': error})
+        marker = '⚠️ ' if error else '✓'
+        print(f"  [{len(results)}/{len(pdf_paths)}] {marker} {os.path.basename(by_hash[sha256][0])}: "
+              f"{error or status} ({seconds:.1f}s)")
+
+    to_request = []
+    for sha256, pdfs in by_hash.items():
+        tei = None if refresh else load_cached_tei(sha256, cache_dir)
+        metrics.record_cache('tei', tei is not None)
+        if tei is not None:
+            finish(sha256, 'cached', tei)
+        else:
+            to_request.append(sha256)
+    print(f"  {len(by_hash) - len(to_request)} cached, {len(to_request)} to send to GROBID")
+
+    def work(sha256):
+        t0 = time.perf_counter()
+        tei = request_tei(by_hash[sha256][0], grobid_url)
+        save_cached_tei(sha256, tei, cache_dir)
+        return tei, time.perf_counter() - t0
+
+    with metrics.stage('grobid'), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(work, sha256): sha256 for sha256 in to_request}
+        for future in as_completed(futures):
+            sha256 = futures[future]
+            try:
+                tei, seconds = future.result()
+                finish(sha256, 'processed', tei, seconds)
+            except Exception as e:
+                finish(sha256, 'error', error=f"{type(e).__name__}: {e}")
+
+    elapsed = time.perf_counter() - start
+    counts = {status: sum(r['status'] == status for r in results) for status in ('cached', 'processed', 'error')}
+    print(f"\n✓ {counts['processed']} processed, {counts['cached']} from cache, {counts['error']} failed "
+          f"in {elapsed:.1f}s ({len(results) / elapsed * 60 if elapsed else 0:.1f} PDFs/min)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert PDFs to TEI (cached) and Markdown with a GROBID service",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.grobid_client ~/PDFs/in_ground_truth_dataset --markdown-dir markdown/
+  python -m pdf_processing.grobid_client paper.pdf --grobid-url http://grobid.internal:8070 --concurrency 16
+  python -m pdf_processing.grobid_client ~/PDFs --refresh --metrics-out grobid_metrics.json
+        """
+    )
+    parser.add_argument('paths', nargs='+', help='PDF files or directories containing PDFs')
+    parser.add_argument('--grobid-url', type=str, default=GROBID_URL, help=f'GROBID service (default: {GROBID_URL})')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                       help=f'Requests in flight at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--markdown-dir', type=str, default=None, help='Write one .md file per PDF here')
+    parser.add_argument('--cache-dir', type=str, default=TEI_CACHE_DIR, help='TEI cache directory')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached TEI and reprocess every PDF')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                       help='Write GROBID request and cache metrics to this JSON file (plus a .prom Prometheus textfile)')
+
+    args = parser.parse_args()
+    try:
+        process_batch(find_pdfs(args.paths), args.grobid_url, args.concurrency, args.cache_dir,
+                      args.refresh, args.markdown_dir)
+    finally:
+        if args.metrics_out:
+            metrics.write_metrics(args.metrics_out)
@@ -0,0 +1,390 @@
+"""
+LLM Extraction of Structured Data from Paper Markdown
+
+Sends a paper's Markdown to Claude with the prompt in prompts.py and parses
+the JSON it returns into the shape in schemas.py.
+
+Results are cached by (sha256 of the Markdown, PROMPT_VERSION, model,
+SCHEMA_VERSION), so rerunning over the ground-truth set only pays for papers
+whose Markdown, prompt, model or schema actually changed. Each cached record
+keeps the token usage and latency of the call that produced it.
+
+The batch runner keeps at most --concurrency requests in flight and retries
+rate limits (429), overload (529) and server errors with exponential backoff,
+honoring retry-after.
+
+With --rules-first the rule-based extractor (rule_extractor.py) runs first and
+the model is only called for papers it can't handle.
+
+With --prefilter only the metadata, abstract and statistics-bearing passages
+are sent (see prefilter.py), which cuts tokens and latency several-fold.
+
+--model rules uses only the rule-based extractor. --model stub uses a local rule-based stand-in instead of the API (no key,
+no cost), so caching, batching, backoff and accounting can be tested
+offline. --stub-rate-limit-rate makes it raise rate limits at random.
+
+Cache layout: .llm_cache/<key[:2]>/<key>.json
+
+Usage:
+    python -m pdf_processing.llm_extractor markdown/ --concurrency 4 --report-out extraction_report.json
+    python -m pdf_processing.llm_extractor markdown/ --rules-first --prefilter
+    python -m pdf_processing.llm_extractor markdown/ --model stub --stub-rate-limit-rate 0.2
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import metrics
+from pdf_processing.grobid_client import backoff_seconds
+from pdf_processing.prefilter import prefilter_markdown
+from pdf_processing.prompts import PROMPT_VERSION, SYSTEM_PROMPT, USER_PROMPT
+from pdf_processing.rule_extractor import extract_statistics, is_handled
+from pdf_processing.schemas import SCHEMA_VERSION, normalize_extraction
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LLM_CACHE_DIR = os.path.join(SCRIPT_DIR, '.llm_cache')
+
+DEFAULT_MODEL = os.environ.get('METASCIENCE_LLM_MODEL', 'claude-sonnet-4-5')
+STUB_MODEL = 'stub'
+RULES_MODEL = 'rules'
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 8
+MAX_OUTPUT_TOKENS = 8192
+
+# USD per million (input, output) tokens, for cost estimates only
+MODEL_PRICES = {
+    'claude-sonnet-4-5': (3.00, 15.00),
+    'claude-haiku-4-5': (1.00, 5.00),
+    'claude-opus-4-1': (15.00, 75.00),
+    STUB_MODEL: (0.0, 0.0),
+    RULES_MODEL: (0.0, 0.0),
+}
+
+STUB_OPTIONS = {
+    'latency': 0.05,            # seconds per call
+    'rate_limit_rate': 0.0,     # fraction of calls that raise RateLimited
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class RateLimited(Exception):
+    """The model asked us to slow down (or is overloaded); retry after a delay"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ---------- Cache ----------
+
+def markdown_sha256(markdown):
+    return hashlib.sha256(markdown.encode('utf-8')).hexdigest()
+
+
+def cache_key(markdown_hash, model):
+    """Cache key for a paper, covering everything that changes the extraction"""
+    parts = [markdown_hash, PROMPT_VERSION, model, SCHEMA_VERSION]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+def cache_path(key, cache_dir=LLM_CACHE_DIR):
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def load_cached(key, cache_dir=LLM_CACHE_DIR):
+    path = cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cached(key, record, cache_dir=LLM_CACHE_DIR):
+    path = cache_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+# ---------- Models ----------
+
+def call_anthropic(prompt, model, max_tokens=MAX_OUTPUT_TOKENS):
+    """One Claude API call. Returns (text, input tokens, output tokens)."""
+    try:
+        import anthropic
+    except ImportError:
+        raise ImportError("LLM extraction requires anthropic: pip install anthropic (or use --model stub)")
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Retries are done by extract_record so they show up in the accounting
+            _client = anthropic.Anthropic(max_retries=0)
+    try:
+        response = _client.messages.create(
+            model=model, max_tokens=max_tokens, system=SYSTEM_PROMPT,
+            messages=[{'role': 'user', 'content': prompt}],
+        )
+    except anthropic.APIStatusError as e:
+        if e.status_code == 429 or e.status_code >= 500:
+            raise RateLimited(f"{e.status_code}: {e.message}", e.response.headers.get('retry-after')) from e
+        raise
+    except anthropic.APIConnectionError as e:
+        raise RateLimited(str(e)) from e
+    text = ''.join(block.text for block in response.content if block.type == 'text')
+    return text, response.usage.input_tokens, response.usage.output_tokens
+
+
+def call_stub(prompt):
+    """A local stand-in for the API: the rule-based extractor, with simulated latency and rate limits"""
+    time.sleep(STUB_OPTIONS['latency'])
+    if random.random() < STUB_OPTIONS['rate_limit_rate']:
+        raise RateLimited('stub rate limit')
+    text = json.dumps(extract_statistics(prompt.split('\nPaper:\n', 1)[-1]))
+    # Roughly 4 characters per token
+    return text, (len(SYSTEM_PROMPT) + len(prompt)) // 4, len(text) // 4
+
+
+def parse_model_json(text):
+    """The JSON object in a model response (tolerating code fences or text around it)"""
+    text = text.strip()
+    fenced = re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, flags=re.S)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find('{'), text.rfind('}')
+        if 0 <= start < end:
+            return json.loads(text[start:end + 1])
+        raise
+
+
+# ---------- Extraction ----------
+
+def extract_record(markdown, model=DEFAULT_MODEL, cache_dir=LLM_CACHE_DIR, refresh=False,
+                   max_retries=MAX_RETRIES, max_tokens=MAX_OUTPUT_TOKENS, prefilter=False, rules_first=False):
+    """
+    Extract structured data from one paper, using the cache if possible.
+    Returns the cache record (extraction plus token usage and latency) with
+    'cached' set to whether it came from the cache. With prefilter, only the
+    statistics-bearing passages are sent (and cached under their own hash).
+    With rules_first, papers the rule-based extractor handles never reach
+    the model (their record has model 'rules' and no tokens); model 'rules'
+    uses the rule-based extractor alone.
+    """
+    if rules_first or model == RULES_MODEL:
+        start = time.perf_counter()
+        extraction = extract_statistics(markdown)
+        metrics.record_cache('rules', is_handled(extraction))
+        if is_handled(extraction) or model == RULES_MODEL:
+            return {
+                'markdown_sha256': markdown_sha256(markdown), 'prompt_version': None, 'model': RULES_MODEL,
+                'schema_version': SCHEMA_VERSION, 'extraction': extraction, 'input_tokens': 0,
+                'output_tokens': 0, 'latency_seconds': round(time.perf_counter() - start, 3), 'attempts': 0,
+                'created_at': datetime.now().isoformat(timespec='seconds'), 'cached': False,
+            }
+    if prefilter:
+        markdown, _ = prefilter_markdown(markdown)
+    markdown_hash = markdown_sha256(markdown)
+    key = cache_key(markdown_hash, model)
+    if not refresh:
+        record = load_cached(key, cache_dir)
+        metrics.record_cache('llm', record is not None)
+        if record is not None:
+            return dict(record, cached=True)
+
+    provider = STUB_MODEL if model == STUB_MODEL else 'anthropic'
+    prompt = USER_PROMPT.format(markdown=markdown)
+    start = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        call_start = time.perf_counter()
+        try:
+            if model == STUB_MODEL:
+                text, input_tokens, output_tokens = call_stub(prompt)
+            else:
+                text, input_tokens, output_tokens = call_anthropic(prompt, model, max_tokens)
+        except RateLimited as e:
+            metrics.record_request(provider, time.perf_counter() - call_start, False)
+            if attempt == max_retries:
+                raise RuntimeError(f"Still rate limited after {max_retries} retries: {e}")
+            metrics.sleep(backoff_seconds(attempt, e.retry_after))
+            continue
+        metrics.record_request(provider, time.perf_counter() - call_start, True, len(text))
+        metrics.record_tokens(provider, input_tokens, output_tokens)
+        break
+
+    try:
+        extraction = normalize_extraction(parse_model_json(text))
+    except json.JSONDecodeError:
+        raise RuntimeError(f"Model returned invalid JSON: {text[:200]!r}")
+
+    record = {
+        'markdown_sha256': markdown_hash,
+        'prompt_version': PROMPT_VERSION,
+        'model': model,
+        'schema_version': SCHEMA_VERSION,
+        'extraction': extraction,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'latency_seconds': round(time.perf_counter() - start, 3),
+        'attempts': attempt + 1,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    save_cached(key, record, cache_dir)
+    return dict(record, cached=False)
+
+
+def extract_data_from_markdown(markdown: str, model: str = DEFAULT_MODEL, prefilter: bool = False,
+                               rules_first: bool = False) -> dict:
+    """Extract structured data from paper Markdown using Claude API."""
+    return extract_record(markdown, model, prefilter=prefilter, rules_first=rules_first)['extraction']
+
+
+def record_cost(record):
+    """Estimated USD cost of the call that produced a record (None for unknown models)"""
+    prices = MODEL_PRICES.get(record['model'])
+    if prices is None:
+        return None
+    return (record['input_tokens'] * prices[0] + record['output_tokens'] * prices[1]) / 1e6
+
+
+def extract_batch(items, model=DEFAULT_MODEL, concurrency=DEFAULT_CONCURRENCY, cache_dir=LLM_CACHE_DIR,
+                  refresh=False, prefilter=False, rules_first=False):
+    """
+    Extract many papers with at most concurrency model calls in flight.
+    items is a list of (name, markdown). Returns one report dict per paper:
+    name, cached, error, results, input/output tokens, latency and cost.
+    """
+    start = time.perf_counter()
+    print(f"\n{'='*60}")
+    print(f"LLM EXTRACTION: {len(items)} papers with {model}, {concurrency} in flight"
+          f"{' (prefiltered)' if prefilter else ''}")
+    print(f"{'='*60}")
+
+    reports = []
+
+    def work(name, markdown):
+        try:
+            record = extract_record(markdown, model, cache_dir, refresh, prefilter=prefilter,
+                                    rules_first=rules_first)
+        except Exception as e:
+            return {'name': name, 'cached': False, 'error': f"{type(e).__name__}: {e}"}
+        return {
+            'name': name,
+            'cached': record['cached'],
+            'model': record['model'],
+            'error': None,
+            'results': len(record['extraction']['statistical_results']),
+            'input_tokens': record['input_tokens'],
+            'output_tokens': record['output_tokens'],
+            'latency_seconds': record['latency_seconds'],
+            'attempts': record['attempts'],
+            'cost_usd': record_cost(record),
+            'extraction': record['extraction'],
+        }
+
+    with metrics.stage('llm_extraction'), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(work, name, markdown) for name, markdown in items]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            if report['error']:
+                print(f"  [{len(reports)}/{len(items)}] ⚠️  {report['name']}: {report['error']}")
+            else:
+                print(f"  [{len(reports)}/{len(items)}] ✓ {report['name']}: {report['results']} results, "
+                      f"{report['input_tokens']:,} in / {report['output_tokens']:,} out tokens, "
+                      f"{report['latency_seconds']:.1f}s{' (cached)' if report['cached'] else ''}"
+                      f"{' (rules)' if report['model'] == RULES_MODEL else ''}")
+
+    elapsed = time.perf_counter() - start
+    done = [r for r in reports if not r['error']]
+    called = [r for r in done if not r['cached'] and r['model'] != RULES_MODEL]
+    by_rules = [r for r in done if r['model'] == RULES_MODEL]
+    cached = [r for r in done if r['cached']]
+    billed_cost = sum(r['cost_usd'] or 0 for r in called)
+    saved_cost = sum(r['cost_usd'] or 0 for r in cached)
+    print(f"\n✓ {len(done)} papers extracted ({len(cached)} from cache), {len(reports) - len(done)} failed "
+          f"in {elapsed:.1f}s ({len(reports) / elapsed * 60 if elapsed else 0:.1f} papers/min)")
+    if rules_first:
+        print(f"  Handled by rules without the model: {len(by_rules)}")
+    print(f"  Tokens used: {sum(r['input_tokens'] for r in called):,} in / "
+          f"{sum(r['output_tokens'] for r in called):,} out (~${billed_cost:.2f}); "
+          f"cache saved ~${saved_cost:.2f}")
+    if called:
+        latencies = sorted(r['latency_seconds'] for r in called)
+        print(f"  Latency per paper: median {latencies[len(latencies) // 2]:.1f}s, max {latencies[-1]:.1f}s")
+    return reports
+
+
+def read_markdown_files(paths):
+    """(name, markdown) for each .md file in paths (files or directories)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, n) for n in sorted(os.listdir(path)) if n.endswith('.md')]
+        else:
+            files.append(path)
+    items = []
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            items.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    return items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract structured data from paper Markdown with Claude (cached)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.llm_extractor markdown/ --report-out extraction_report.json
+  python -m pdf_processing.llm_extractor markdown/ --model claude-haiku-4-5 --concurrency 8
+  python -m pdf_processing.llm_extractor markdown/ --model stub --stub-rate-limit-rate 0.2
+        """
+    )
+    parser.add_argument('paths', nargs='+', help='Markdown files or directories of .md files')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL,
+                       help=f'Model name, "rules" for the rule-based extractor alone, or "stub" for the '
+                            f'offline stand-in (default: {DEFAULT_MODEL})')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                       help=f'Requests in flight at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--cache-dir', type=str, default=LLM_CACHE_DIR, help='Extraction cache directory')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached extractions')
+    parser.add_argument('--rules-first', action='store_true',
+                       help='Use the rule-based extractor, and the model only for papers it cannot handle')
+    parser.add_argument('--prefilter', action='store_true',
+                       help='Send only metadata, abstract and statistics-bearing passages')
+    parser.add_argument('--report-out', type=str, default=None,
+                       help='Write per-paper extractions, tokens, latency and cost to this JSON file')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                       help='Write request, token and cache metrics to this JSON file (plus a .prom Prometheus textfile)')
+    parser.add_argument('--stub-latency', type=float, default=STUB_OPTIONS['latency'],
+                       help='Seconds per call for --model stub')
+    parser.add_argument('--stub-rate-limit-rate', type=float, default=STUB_OPTIONS['rate_limit_rate'],
+                       help='Fraction of --model stub calls that are rate limited')
+
+    args = parser.parse_args()
+    STUB_OPTIONS.update(latency=args.stub_latency, rate_limit_rate=args.stub_rate_limit_rate)
+    try:
+        reports = extract_batch(read_markdown_files(args.paths), args.model, args.concurrency,
+                                args.cache_dir, args.refresh, args.prefilter, args.rules_first)
+        if args.report_out:
+            with open(args.report_out, 'w') as f:
+                json.dump(reports, f, indent=2)
+            print(f"\n✓ Wrote report to {args.report_out}")
+    finally:
+        if args.metrics_out:
+            metrics.write_metrics(args.metrics_out)
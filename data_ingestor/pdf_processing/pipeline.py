@@ -0,0 +1,80 @@
+"""
+PDF → Markdown → JSON Pipeline
+
+Runs one paper through the whole flow: GROBID (with the TEI cache in
+grobid_client.py), TEI → Markdown, then extraction with the chosen backend
+(a Claude model, "rules" or "stub"; see llm_extractor.py). Papers that are
+already Markdown (.md) skip the first two stages.
+
+--converter picks how PDFs become text: "grobid", "text" (the PDF's text
+layer via text_layer.py, no GROBID needed) or "auto" (the default: GROBID
+if a service answers at --grobid-url, else the text layer).
+
+Usage:
+    python -m pdf_processing.pipeline paper.pdf
+    python -m pdf_processing.pipeline paper.pdf --model rules --converter text
+"""
+
+import argparse
+import json
+
+from pdf_processing.grobid_client import GROBID_URL, grobid_available, process_pdf_to_markdown
+from pdf_processing.llm_extractor import DEFAULT_MODEL, LLM_CACHE_DIR, extract_record
+from pdf_processing.text_layer import process_pdf_to_text
+
+CONVERTERS = ('auto', 'grobid', 'text')
+
+
+def load_markdown(path, grobid_url=GROBID_URL, converter='auto'):
+    """
+    Markdown for a paper: read as-is for .md files, converted via GROBID or
+    the text layer for PDFs (see CONVERTERS)
+    """
+    if path.lower().endswith('.md'):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    if converter == 'text' or (converter == 'auto' and not grobid_available(grobid_url)):
+        return process_pdf_to_text(path)[0]
+    return process_pdf_to_markdown(path, grobid_url)
+
+
+def process_pdf_record(pdf_path, model=DEFAULT_MODEL, grobid_url=GROBID_URL, cache_dir=LLM_CACHE_DIR,
+                       refresh=False, prefilter=False, rules_first=False, converter='auto'):
+    """Full pipeline, returning the extraction record (with tokens, latency and model) from extract_record"""
+    markdown = load_markdown(pdf_path, grobid_url, converter)
+    return extract_record(markdown, model, cache_dir, refresh, prefilter=prefilter, rules_first=rules_first)
+
+
+def process_pdf(pdf_path: str, model: str = DEFAULT_MODEL, grobid_url: str = GROBID_URL,
+                converter: str = 'auto') -> dict:
+    """Full pipeline: PDF → Markdown → JSON."""
+    return process_pdf_record(pdf_path, model, grobid_url, converter=converter)['extraction']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a PDF (or Markdown) paper through GROBID and extraction, printing the JSON",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.pipeline paper.pdf
+  python -m pdf_processing.pipeline paper.pdf --model rules --converter text
+  python -m pdf_processing.pipeline markdown/10.1037--mot0000097.md --model stub
+        """
+    )
+    parser.add_argument('path', help='PDF or Markdown file')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL,
+                       help=f'Extraction backend: a model name, "rules" or "stub" (default: {DEFAULT_MODEL})')
+    parser.add_argument('--grobid-url', type=str, default=GROBID_URL,
+                       help=f'GROBID server URL (default: {GROBID_URL})')
+    parser.add_argument('--converter', choices=CONVERTERS, default='auto',
+                       help='PDF to text: GROBID, the PDF text layer, or GROBID if reachable (default: auto)')
+    parser.add_argument('--rules-first', action='store_true',
+                       help='Use the rule-based extractor, and the model only if it finds nothing convertible')
+    parser.add_argument('--prefilter', action='store_true',
+                       help='Send only the statistics-bearing passages to the model')
+
+    args = parser.parse_args()
+    record = process_pdf_record(args.path, args.model, args.grobid_url, prefilter=args.prefilter,
+                                rules_first=args.rules_first, converter=args.converter)
+    print(json.dumps(record['extraction'], indent=2, ensure_ascii=False))
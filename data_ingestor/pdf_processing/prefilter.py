@@ -0,0 +1,314 @@
+"""
+Statistical-Passage Prefilter
+
+Whole-paper Markdown is mostly introduction, discussion and references, but
+the fields the extraction schema needs (test statistics, effect sizes,
+p-values, sample sizes) sit in a few Results paragraphs and tables. This
+keeps only:
+
+  - the metadata block (title, authors, journal, year, DOI) and the abstract
+  - paragraphs and tables that score at least --min-score, plus the
+    paragraph before each one (it usually says what is being tested)
+  - the headings of sections with something kept
+
+Passages are scored by how many APA statistics they contain: test statistics
+use the grammar of parse_test_statistic (TEST_STATISTIC_PATTERNS) plus looser
+variants (Welch df, F with any df, χ² with any df, z without N), then effect
+sizes, p-values, confidence intervals and N mentions. The reference list is
+always dropped. Omitted stretches are marked with [...].
+
+Recall is measured against ground_truth.csv: for each paper with Markdown,
+the sample sizes and the statistics that convert to the validated effect
+size (_es_r) are located in the full Markdown, and we count how many of them
+survive the filter.
+
+Usage:
+    python -m pdf_processing.prefilter markdown/ --ground-truth ground_truth.csv
+    python -m pdf_processing.prefilter paper.md --show
+"""
+
+import argparse
+import math
+import os
+import re
+
+from data_ingestor import TEST_STATISTIC_PATTERNS, parse_test_statistic
+from dois import canonical_doi, doi_filename
+
+OMITTED = '[...]'
+DEFAULT_MIN_SCORE = 2
+DEFAULT_CONTEXT = 1
+
+NUMBER = r'-?\d*\.?\d+'
+SCORE_PATTERNS = {
+    # name: (compiled pattern, weight)
+    'test_statistic': (re.compile('|'.join(TEST_STATISTIC_PATTERNS.values()), re.I), 3),
+    'test_statistic_loose': (re.compile(
+        rf'\b(?:t\s*\(\s*\d+(?:\.\d+)?\s*\)|F\s*\(\s*\d+(?:\.\d+)?\s*,\s*\d+(?:\.\d+)?\s*\)'
+        rf'|x2\s*\([^)]{{1,30}}\)|z)\s*=\s*{NUMBER}'), 2),
+    'effect_size': (re.compile(
+        rf'(?:\b(?:d|g|r|rs|R2|OR|b|f|f2)|β|φ|ηp?2|η2p)\s*=\s*{NUMBER}'), 2),
+    'p_value': (re.compile(rf'\bp\s*[<=>≤≥]\s*0?\.\d+|\bp\s*=\s*{NUMBER}', re.I), 2),
+    'confidence_interval': (re.compile(
+        rf'\b(?:95\s*%\s*)?CI\b|\[\s*{NUMBER}\s*,\s*{NUMBER}\s*\]', re.I), 1),
+    'sample_size': (re.compile(
+        r'\b[Nn]\s*=\s*\d[\d,]*|\b\d[\d,]*\s+(?:participants|subjects|respondents|children|students|adults)\b'), 2),
+}
+
+
+def normalize_text(text):
+    """Spellings that would defeat the patterns: χ → x, superscript 2, Unicode minus signs"""
+    return (text.replace('χ', 'x').replace('Χ', 'x').replace('²', '2')
+                .replace('−', '-').replace('–', '-').replace(' ', ' ').replace(' ', ' '))
+
+
+def score_passage(text):
+    """Return (score, {pattern name: hits}) for a passage"""
+    text = normalize_text(text)
+    hits = {name: len(pattern.findall(text)) for name, (pattern, _) in SCORE_PATTERNS.items()}
+    # A statistic in parse_test_statistic's grammar also matches the loose pattern
+    hits['test_statistic_loose'] = max(0, hits['test_statistic_loose'] - hits['test_statistic'])
+    score = sum(hits[name] * weight for name, (_, weight) in SCORE_PATTERNS.items())
+    return score, hits
+
+
+def split_sections(markdown):
+    """
+    Split Markdown into [(heading line or None, [blocks])]. Blocks are
+    separated by blank lines; a table is joined to the caption before it.
+    """
+    sections = [(None, [])]
+    for block in re.split(r'\n\s*\n', markdown.strip()):
+        block = block.strip()
+        if not block:
+            continue
+        if block.startswith('#') and '\n' not in block:
+            sections.append((block, []))
+        elif block.startswith('|') and sections[-1][1]:
+            sections[-1][1][-1] += '\n\n' + block
+        else:
+            sections[-1][1].append(block)
+    return sections
+
+
+def is_metadata_section(heading):
+    return heading is None or heading.startswith('# ') or heading.lower().lstrip('# ').startswith('abstract')
+
+
+def is_reference_section(heading):
+    name = heading.lower().lstrip('# ').strip() if heading else ''
+    return name.startswith(('references', 'bibliography', 'literature cited'))
+
+
+def prefilter_markdown(markdown, min_score=DEFAULT_MIN_SCORE, context=DEFAULT_CONTEXT, max_chars=None):
+    """
+    Keep metadata, abstract and high-scoring passages of a paper's Markdown.
+    max_chars trims the lowest-density passages if the result is still too long.
+    Returns (filtered Markdown, info dict).
+    """
+    sections = split_sections(markdown)
+    kept = []           # (section index, block index) to keep
+    scores = {}
+    for s, (heading, blocks) in enumerate(sections):
+        if is_reference_section(heading):
+            continue
+        for b, block in enumerate(blocks):
+            if is_metadata_section(heading):
+                kept.append((s, b))
+                continue
+            score, _ = score_passage(block)
+            scores[(s, b)] = score
+            if score >= min_score:
+                kept += [(s, c) for c in range(max(0, b - context), b + 1)]
+    kept = set(kept)
+
+    if max_chars:
+        # Drop the least dense passages (never metadata) until the budget fits
+        def size():
+            return sum(len(sections[s][1][b]) for s, b in kept)
+        droppable = sorted((k for k in kept if k in scores),
+                           key=lambda k: scores[k] / math.sqrt(len(sections[k[0]][1][k[1]]) + 1))
+        for k in droppable:
+            if size() <= max_chars:
+                break
+            kept.discard(k)
+
+    parts = []
+    for s, (heading, blocks) in enumerate(sections):
+        selected = [b for b in range(len(blocks)) if (s, b) in kept]
+        if not selected:
+            if parts and parts[-1] != OMITTED:
+                parts.append(OMITTED)
+            continue
+        if heading:
+            parts.append(heading)
+        previous = -1
+        for b in selected:
+            if b != previous + 1 and parts[-1] != OMITTED:
+                parts.append(OMITTED)
+            parts.append(blocks[b])
+            previous = b
+        if previous != len(blocks) - 1:
+            parts.append(OMITTED)
+    while parts and parts[-1] == OMITTED:
+        parts.pop()
+
+    filtered = '\n\n'.join(parts) + '\n'
+    info = {
+        'chars_in': len(markdown),
+        'chars_out': len(filtered),
+        'passages_total': len(scores),
+        'passages_kept': sum(1 for k in kept if k in scores),
+    }
+    return filtered, info
+
+
+# ---------- Recall against ground_truth.csv ----------
+
+def number_pattern(value):
+    """Regex matching a number as written in a paper (1,503 / 1503 / 0.45 / .45)"""
+    if float(value).is_integer():
+        written = sorted({f"{int(value)}", f"{int(value):,}"}, key=len, reverse=True)
+        return re.compile(rf'(?<![\d.,])(?:{"|".join(map(re.escape, written))})(?![\d,]|\.\d)')
+    text = f"{value:.2f}".rstrip('0').rstrip('.')
+    if text.startswith(('0.', '-0.')):
+        text = text.replace('0.', '0?.', 1)
+    return re.compile(rf'(?<![\d.]){text.replace(".", r"[.]")}\d?(?!\d)')
+
+
+def statistic_spans(text):
+    """(start, end, r) of every statistic in parse_test_statistic's grammar in text"""
+    spans = []
+    for name, pattern in TEST_STATISTIC_PATTERNS.items():
+        for match in re.finditer(pattern, text, re.I):
+            r = parse_test_statistic(match.group(0))
+            if r is not None:
+                spans.append((match.start(), match.end(), abs(r)))
+    return spans
+
+
+def without_references(markdown):
+    """The Markdown minus its reference list (which the filter always drops)"""
+    parts = []
+    for heading, blocks in split_sections(markdown):
+        if not is_reference_section(heading):
+            parts += ([heading] if heading else []) + blocks
+    return '\n\n'.join(parts)
+
+
+def find_targets(text, n=None, es_r=None):
+    """
+    (kind, snippet, position) of each place in text (normalized, references
+    removed) holding the ground-truth N or a statistic that converts to es_r
+    """
+    targets = []
+    if n and n == n:
+        targets += [('n', m.group(0), m.start()) for m in number_pattern(n).finditer(text)]
+    if es_r is not None and es_r == es_r:
+        for start, end, r in statistic_spans(text):
+            if abs(r - abs(es_r)) <= 0.01:
+                targets.append(('statistic', text[start:end], start))
+        # Reported directly as r = .xx
+        for m in re.finditer(rf'\br\s*\(?\d*\)?\s*=\s*{number_pattern(abs(es_r)).pattern}', text):
+            targets.append(('statistic', m.group(0), m.start()))
+    return targets
+
+
+def target_kept(target, full_text, filtered_text, width=30):
+    """A target survives if the filtered text contains it with the same surroundings (within its paragraph)"""
+    _, snippet, position = target
+    start = max(position - width, full_text.rfind('\n\n', 0, position) + 1)
+    end = full_text.find('\n\n', position)
+    end = position + len(snippet) + width if end == -1 else min(end, position + len(snippet) + width)
+    return full_text[start:end] in filtered_text
+
+
+def markdown_for_doi(markdown_dir, doi):
+    """Markdown file for a DOI, named like the PDFs pull_pdfs.ipynb saves (10.1037--abc.md)"""
+    path = os.path.join(markdown_dir, doi_filename(doi) + '.md')
+    return path if os.path.exists(path) else None
+
+
+def measure_recall(markdown_dir, ground_truth_csv, min_score=DEFAULT_MIN_SCORE, context=DEFAULT_CONTEXT,
+                   max_chars=None):
+    """Size reduction and recall of ground-truth statistics over the papers with Markdown"""
+    import pandas as pd
+
+    ground_truth = pd.read_csv(ground_truth_csv)
+    rows = []
+    for prefix in ('original', 'replication'):
+        for _, row in ground_truth.iterrows():
+            doi = canonical_doi(row.get(f'{prefix}_url'))
+            path = markdown_for_doi(markdown_dir, doi) if doi else None
+            if path:
+                rows.append((path, row.get(f'{prefix}_n'), row.get(f'{prefix}_es_r')))
+
+    print(f"\n{'='*60}")
+    print(f"PREFILTER RECALL: {len(rows)} ground-truth studies with Markdown in {markdown_dir}")
+    print(f"{'='*60}")
+    totals = {'chars_in': 0, 'chars_out': 0, 'targets': {'n': 0, 'statistic': 0}, 'kept': {'n': 0, 'statistic': 0}}
+    papers_with_loss = 0
+    filtered_by_path = {}
+    for path, n, es_r in rows:
+        with open(path, encoding='utf-8') as f:
+            markdown = f.read()
+        if path not in filtered_by_path:
+            filtered_by_path[path] = prefilter_markdown(markdown, min_score, context, max_chars)
+            totals['chars_in'] += filtered_by_path[path][1]['chars_in']
+            totals['chars_out'] += filtered_by_path[path][1]['chars_out']
+        filtered = normalize_text(filtered_by_path[path][0])
+        full = normalize_text(without_references(markdown))
+        lost = 0
+        for target in find_targets(full, n, es_r):
+            totals['targets'][target[0]] += 1
+            if target_kept(target, full, filtered):
+                totals['kept'][target[0]] += 1
+            else:
+                lost += 1
+        papers_with_loss += lost > 0
+
+    if not rows:
+        print("  No Markdown files matched ground-truth DOIs")
+        return totals
+    reduction = totals['chars_in'] / totals['chars_out'] if totals['chars_out'] else float('inf')
+    print(f"  Papers: {len(filtered_by_path)}")
+    print(f"  Size: {totals['chars_in'] // 4:,} → {totals['chars_out'] // 4:,} tokens (~{reduction:.1f}x smaller)")
+    for kind in ('statistic', 'n'):
+        found = totals['targets'][kind]
+        if found:
+            print(f"  Recall ({kind}): {totals['kept'][kind]}/{found} = {totals['kept'][kind] / found:.1%}")
+    print(f"  Studies losing at least one target: {papers_with_loss}")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep only the statistics-bearing passages of paper Markdown",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.prefilter markdown/ --ground-truth ground_truth.csv
+  python -m pdf_processing.prefilter markdown/ --ground-truth ground_truth.csv --min-score 3 --context 0
+  python -m pdf_processing.prefilter markdown/10.1037--mot0000097.md --show
+        """
+    )
+    parser.add_argument('path', help='A Markdown file, or a directory of them (with --ground-truth)')
+    parser.add_argument('--ground-truth', type=str, default=None,
+                       help='Measure recall of ground-truth N and effect sizes (e.g. ground_truth.csv)')
+    parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE,
+                       help=f'Minimum passage score to keep (default: {DEFAULT_MIN_SCORE})')
+    parser.add_argument('--context', type=int, default=DEFAULT_CONTEXT,
+                       help=f'Paragraphs kept before each selected one (default: {DEFAULT_CONTEXT})')
+    parser.add_argument('--max-chars', type=int, default=None, help='Trim the result to about this many characters')
+    parser.add_argument('--show', action='store_true', help='Print the filtered Markdown')
+
+    args = parser.parse_args()
+    if args.ground_truth:
+        measure_recall(args.path, args.ground_truth, args.min_score, args.context, args.max_chars)
+    else:
+        with open(args.path, encoding='utf-8') as f:
+            filtered, info = prefilter_markdown(f.read(), args.min_score, args.context, args.max_chars)
+        if args.show:
+            print(filtered)
+        print(f"{info['chars_in']:,} → {info['chars_out']:,} characters, "
+              f"{info['passages_kept']}/{info['passages_total']} passages kept")
@@ -0,0 +1,47 @@
+"""
+Prompt Templates for LLM Extraction
+
+Bump PROMPT_VERSION whenever SYSTEM_PROMPT or USER_PROMPT changes: it is part
+of the extraction cache key, so old cached results are not reused for the new
+prompt (and are still there if the change is reverted).
+"""
+
+PROMPT_VERSION = 2
+
+SYSTEM_PROMPT = """You extract statistical results from scientific papers for the Metascience Observatory, \
+a database of replication studies. You are given one paper converted to Markdown. \
+Return only a JSON object, with no commentary and no code fences."""
+
+USER_PROMPT = """Extract the following from the paper below and return it as JSON with exactly this structure:
+
+{{
+  "metadata": {{"title": "", "authors": [], "journal": "", "year": null, "doi": "", "abstract": ""}},
+  "statistical_results": [
+    {{
+      "description": "Brief description of the effect tested",
+      "effect_size_value": null,
+      "effect_size_type": "d | r | eta_sq | f | f2 | or | R2 | phi | ...",
+      "p_value": null,
+      "p_value_type": "exact | less_than | ns",
+      "p_value_tails": "one | two",
+      "confidence_interval_95": "",
+      "sample_size": null,
+      "test_statistic": "e.g. t(45) = 2.31, F(1, 98) = 4.56, chi2(1, N=200) = 5.12"
+    }}
+  ],
+  "methodology": {{"study_design": "", "sample_description": "", "key_variables": []}},
+  "claims": ["One-sentence summary of each key claim or hypothesis tested"]
+}}
+
+Rules:
+- Include one statistical_results entry per reported focal test, in the order they appear.
+- Copy numbers exactly as reported; use null for anything the paper does not report.
+- Write test statistics in APA format, e.g. t(45) = 2.31.
+- Use the p_value_type "less_than" for values reported as p < x, and "ns" for "not significant".
+- The paper may be given as excerpts (metadata, abstract and the passages that report statistics), \
+with [...] marking omitted text.
+
+Paper:
+
+{markdown}
+"""
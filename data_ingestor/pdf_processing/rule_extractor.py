@@ -0,0 +1,212 @@
+"""
+Rule-Based Statistic Extractor
+
+Scans paper Markdown (or plain text) for statistics reported in APA form and
+returns them in the statistical_results shape of schemas.py, without an LLM:
+
+    t(45) = 2.31     F(1, 98) = 4.56     χ2(1, N = 200) = 5.12     z = 2.81
+    r = .32    d = 0.45    g = 0.3    η2 = .08    ηp2 = .08    OR = 2.1    R2 = .12    f2 = .04
+
+Each test statistic starts a result; the p-value, effect size, 95% CI and N
+that follow it in the same sentence are attached to it. An effect size
+reported without a test statistic is a result of its own. The description is
+the sentence the statistic appears in, and effect_size_r is filled by
+normalize_extraction (convert_effect_size / parse_test_statistic).
+
+A paper counts as handled when at least one result converts to r; only the
+others need the LLM (see --rules-first in llm_extractor.py).
+
+Usage:
+    python -m pdf_processing.rule_extractor paper.md
+    python -m pdf_processing.rule_extractor markdown/ --summary
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from pdf_processing.prefilter import normalize_text, without_references
+from pdf_processing.schemas import normalize_extraction
+
+NUMBER = r'-?(?:\d+\.?\d*|\.\d+)'
+
+STATISTIC = re.compile(
+    rf'(?P<t>\bt\s*\(\s*(?P<t_df>\d+(?:\.\d+)?)\s*\)\s*=\s*(?P<t_value>{NUMBER}))'
+    rf'|(?P<F>\bF\s*\(\s*(?P<F_df1>\d+)\s*,\s*(?P<F_df2>\d+(?:\.\d+)?)\s*\)\s*=\s*(?P<F_value>{NUMBER}))'
+    rf'|(?P<chi2>\bx2\s*\(\s*(?P<chi2_df>\d+)\s*(?:,\s*N\s*=\s*(?P<chi2_n>\d[\d,]*))?\s*\)\s*=\s*(?P<chi2_value>{NUMBER}))'
+    rf'|(?P<z>\b[zZ]\s*=\s*(?P<z_value>{NUMBER}))'
+)
+
+# Reported effect size symbol -> schema effect_size_type
+EFFECT_SIZE_TYPES = {
+    'd': 'd', 'g': 'g', 'r': 'r', 'OR': 'or', 'R2': 'R2', 'f': 'f', 'f2': 'f2',
+    'φ': 'phi', 'phi': 'phi', 'η2': 'eta_sq', 'ηp2': 'partial_eta_sq', 'η2p': 'partial_eta_sq',
+    'partial η2': 'partial_eta_sq',
+}
+EFFECT_SIZE = re.compile(
+    rf'(?P<es>partial η2|ηp2|η2p|η2|φ|\b(?:phi|OR|R2|f2|d|g|r|f))\s*(?:\(\s*\d+\s*\))?\s*=\s*(?P<es_value>{NUMBER})')
+P_VALUE = re.compile(r'\bp\s*(?P<p_op>[<=>≤≥])\s*(?P<p_value>\d*\.\d+(?:e-?\d+)?|[01])\b|\b(?P<ns>n\.s\.|ns)(?=[\s,;)]|$)',
+                     re.I)
+CI = re.compile(rf'(?:95\s*%\s*)?CI\s*[:=]?\s*[\[(]\s*(?P<ci_low>{NUMBER})\s*[,;]\s*(?P<ci_high>{NUMBER})\s*[\])]',
+                re.I)
+SAMPLE_SIZE = re.compile(r'\b[Nn]\s*=\s*(?P<n>\d[\d,]*)')
+MENTIONS = [('statistic', STATISTIC), ('effect_size', EFFECT_SIZE), ('p_value', P_VALUE),
+            ('ci', CI), ('n', SAMPLE_SIZE)]
+
+ABBREVIATIONS = ('al.', 'e.g.', 'i.e.', 'vs.', 'cf.', 'Fig.', 'Eq.', 'approx.', 'ca.', 'No.')
+
+
+def sentences(text):
+    """Split text into sentences (table rows count as one each), skipping headings"""
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph or paragraph.startswith('#'):
+            continue
+        if paragraph.startswith('|') or '\n|' in paragraph:
+            yield from (line for line in paragraph.splitlines() if line.strip())
+            continue
+        current = ''
+        for piece in re.split(r'(?<=[.!?])\s+(?=[A-Z(])', ' '.join(paragraph.split())):
+            current = f"{current} {piece}" if current else piece
+            if not current.endswith(ABBREVIATIONS):
+                yield current
+                current = ''
+        if current:
+            yield current
+
+
+def canonical_statistic(match):
+    """APA string parse_test_statistic understands, plus the N the statistic itself reports"""
+    if match.group('t'):
+        return f"t({match.group('t_df')}) = {match.group('t_value')}", None
+    if match.group('F'):
+        return f"F({match.group('F_df1')}, {match.group('F_df2')}) = {match.group('F_value')}", None
+    if match.group('chi2'):
+        n = match.group('chi2_n')
+        if n:
+            n = int(n.replace(',', ''))
+            return f"χ2({match.group('chi2_df')}, N = {n}) = {match.group('chi2_value')}", n
+        return f"χ2({match.group('chi2_df')}) = {match.group('chi2_value')}", None
+    return f"z = {match.group('z_value')}", None
+
+
+def tails(sentence):
+    lowered = sentence.lower()
+    if 'one-tailed' in lowered or 'one-sided' in lowered:
+        return 'one'
+    if 'two-tailed' in lowered or 'two-sided' in lowered:
+        return 'two'
+    return ''
+
+
+def sentence_results(sentence):
+    """statistical_results entries (before normalization) for one sentence"""
+    text = normalize_text(sentence)
+    mentions = sorted((m.start(), kind, m) for kind, pattern in MENTIONS for m in pattern.finditer(text))
+    results = []
+    current = None
+    sentence_n = None
+    for _, kind, m in mentions:
+        if kind == 'statistic':
+            statistic, n = canonical_statistic(m)
+            current = {'test_statistic': statistic, 'sample_size': n}
+            results.append(current)
+        elif kind == 'effect_size':
+            if current is None or current.get('effect_size_value') is not None:
+                current = {}
+                results.append(current)
+            current['effect_size_value'] = m.group('es_value')
+            current['effect_size_type'] = EFFECT_SIZE_TYPES[m.group('es')]
+        elif kind == 'p_value' and current is not None and current.get('p_value_type') is None:
+            if m.group('ns'):
+                current['p_value_type'] = 'ns'
+            else:
+                current['p_value'] = m.group('p_value')
+                # p > .05 is how "not significant" is usually reported
+                current['p_value_type'] = {'=': 'exact', '<': 'less_than', '≤': 'less_than'}.get(m.group('p_op'), 'ns')
+        elif kind == 'ci' and current is not None and not current.get('confidence_interval_95'):
+            current['confidence_interval_95'] = f"[{m.group('ci_low')}, {m.group('ci_high')}]"
+        elif kind == 'n':
+            sentence_n = int(m.group('n').replace(',', ''))
+
+    description = ' '.join(sentence.split())[:300]
+    for result in results:
+        result['description'] = description
+        result['p_value_tails'] = tails(sentence)
+        result['p_value_type'] = result.get('p_value_type') or ''
+        if result.get('sample_size') is None:
+            result['sample_size'] = sentence_n
+        if result.get('test_statistic', '').startswith('z') and result['sample_size']:
+            # z converts to r only with N
+            result['test_statistic'] += f", N = {result['sample_size']}"
+    return results
+
+
+def extract_metadata(markdown):
+    """Title, authors, journal, year, DOI and abstract from tei_to_markdown's header"""
+    fields = dict(re.findall(r'^\*\*(\w+):\*\* (.+)$', markdown, flags=re.M))
+    title = re.search(r'^# (.+)$', markdown, flags=re.M)
+    abstract = re.search(r'^## Abstract\n\n(.+)$', markdown, flags=re.M)
+    return {
+        'title': title.group(1) if title else '',
+        'authors': fields.get('Authors', ''),
+        'journal': fields.get('Journal', ''),
+        'year': fields.get('Year'),
+        'doi': fields.get('DOI', ''),
+        'abstract': abstract.group(1) if abstract else '',
+    }
+
+
+def extract_statistics(markdown):
+    """Rule-based extraction in the schemas.py shape (statistical_results and metadata)"""
+    results = []
+    for sentence in sentences(without_references(markdown)):
+        results += sentence_results(sentence)
+    return normalize_extraction({'metadata': extract_metadata(markdown), 'statistical_results': results})
+
+
+def is_handled(extraction):
+    """True if the rules found at least one result that converts to r"""
+    return any(r['effect_size_r'] is not None for r in extraction['statistical_results'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract APA-formatted statistics from paper Markdown without an LLM",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.rule_extractor markdown/10.1037--mot0000097.md
+  python -m pdf_processing.rule_extractor markdown/ --summary
+        """
+    )
+    parser.add_argument('paths', nargs='+', help='Markdown/text files or directories of .md files')
+    parser.add_argument('--summary', action='store_true',
+                       help="Only report how many papers the rules handle (the rest need the LLM)")
+
+    args = parser.parse_args()
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, n) for n in sorted(os.listdir(path)) if n.endswith('.md')]
+        else:
+            files.append(path)
+
+    handled = 0
+    results = 0
+    seconds = 0.0
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            markdown = f.read()
+        start = time.perf_counter()
+        extraction = extract_statistics(markdown)
+        seconds += time.perf_counter() - start
+        handled += is_handled(extraction)
+        results += len(extraction['statistical_results'])
+        if not args.summary:
+            print(json.dumps(extraction['statistical_results'], indent=2, ensure_ascii=False))
+    print(f"\n✓ {handled}/{len(files)} papers handled by rules ({results} results) "
+          f"in {seconds * 1000:.1f} ms ({seconds / len(files) * 1e6 if files else 0:.0f} µs/paper); "
+          f"{len(files) - handled} need the LLM")
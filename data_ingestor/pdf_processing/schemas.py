@@ -0,0 +1,106 @@
+"""
+Shape of the Structured Data Extracted from a Paper
+
+Mirrors the JSON in PDF_PROCESSING_CONTEXT.md, plus effect_size_r: each
+result converted to Pearson's r the same way the database converts _es to
+_es_r. Bump SCHEMA_VERSION whenever the shape or normalize_extraction
+changes: it is part of the extraction cache key.
+"""
+
+import copy
+import re
+
+from data_ingestor import convert_effect_size, parse_test_statistic
+
+SCHEMA_VERSION = 2
+
+EMPTY_EXTRACTION = {
+    'metadata': {'title': '', 'authors': [], 'journal': '', 'year': None, 'doi': '', 'abstract': ''},
+    'statistical_results': [],
+    'methodology': {'study_design': '', 'sample_description': '', 'key_variables': []},
+    'claims': [],
+}
+
+RESULT_FIELDS = {
+    'description': '',
+    'effect_size_value': None,
+    'effect_size_type': '',
+    'p_value': None,
+    'p_value_type': '',
+    'p_value_tails': '',
+    'confidence_interval_95': '',
+    'sample_size': None,
+    'test_statistic': '',
+    'effect_size_r': None,
+}
+
+NUMERIC_RESULT_FIELDS = ['effect_size_value', 'p_value', 'sample_size', 'effect_size_r']
+
+# Schema effect size types that ESTYPE_MAP / CANNOT_CONVERT spell differently
+ES_TYPE_ALIASES = {
+    'eta_sq': 'etasq',
+    'partial_eta_sq': 'partial etasq',
+    'g': "hedges' g",
+}
+
+
+def to_number(value):
+    """float for numbers and numeric strings ('2.31', '.04'), else None"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip().lstrip('<>=≤ ').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def effect_size_r(result):
+    """
+    Pearson's r for a result: from the reported effect size if it can be
+    converted, else from the test statistic (via parse_test_statistic)
+    """
+    es_type = str(result.get('effect_size_type') or '').strip()
+    if result.get('effect_size_value') is not None and es_type:
+        r = convert_effect_size(result['effect_size_value'], ES_TYPE_ALIASES.get(es_type.lower(), es_type))
+        if r is not None:
+            return r
+    statistic = str(result.get('test_statistic') or '').strip()
+    if not statistic:
+        return None
+    # parse_test_statistic wants whole degrees of freedom (Welch df are fractional)
+    statistic = re.sub(r'(\d+\.\d+)(?=\s*\))', lambda m: str(round(float(m.group(1)))), statistic)
+    return parse_test_statistic(statistic)
+
+
+def normalize_extraction(data):
+    """
+    Fill missing keys with defaults, drop unknown ones, and coerce numeric
+    result fields, so every extraction (whatever the model returned) has the
+    same shape.
+    """
+    result = copy.deepcopy(EMPTY_EXTRACTION)
+    if not isinstance(data, dict):
+        return result
+    for section in ('metadata', 'methodology'):
+        if isinstance(data.get(section), dict):
+            for key in result[section]:
+                if key in data[section]:
+                    result[section][key] = data[section][key]
+    if isinstance(result['metadata']['authors'], str):
+        result['metadata']['authors'] = [a.strip() for a in result['metadata']['authors'].split(';') if a.strip()]
+    year = to_number(result['metadata']['year'])
+    result['metadata']['year'] = int(year) if year else None
+
+    for entry in data.get('statistical_results') or []:
+        if not isinstance(entry, dict):
+            continue
+        normalized = {key: entry.get(key, default) for key, default in RESULT_FIELDS.items()}
+        for key in NUMERIC_RESULT_FIELDS:
+            normalized[key] = to_number(normalized[key])
+        if normalized['effect_size_r'] is None:
+            normalized['effect_size_r'] = effect_size_r(normalized)
+        result['statistical_results'].append(normalized)
+    result['claims'] = [c for c in data.get('claims') or [] if isinstance(c, str)]
+    return result
@@ -0,0 +1,333 @@
+"""
+TEI XML → Markdown
+
+Converts the TEI that GROBID returns for a paper into readable Markdown:
+title, authors and affiliations, journal/year/DOI, abstract, sections (with
+numbered subsection levels), formulas, figure and table captions, tables as
+Markdown tables, and the reference list.
+
+The TEI is streamed with iterparse rather than loaded as a whole tree. Each
+self-contained unit (the header, a top-level section, a figure or table, one
+reference) is written out as soon as its end tag is parsed and then cleared
+and detached, so memory per document is bounded by the largest single unit,
+not by the paper's length or the size of its reference list.
+
+Batch mode converts a directory of TEI files (by default the GROBID client's
+cache) with a process pool.
+
+Usage:
+    python -m pdf_processing.tei_to_markdown --markdown-dir markdown/
+    python -m pdf_processing.tei_to_markdown paper.tei.xml other.tei.xml --markdown-dir markdown/ --workers 8
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+TEI = '{http://www.tei-c.org/ns/1.0}'
+
+
+def text_of(element):
+    """All text inside an element, with whitespace collapsed"""
+    return ' '.join(''.join(element.itertext()).split()) if element is not None else ''
+
+
+def person_name(pers_name):
+    """'Forename Middle Surname' from a persName element"""
+    forenames = [text_of(f) for f in pers_name.findall(f'{TEI}forename')]
+    return ' '.join(forenames + [text_of(pers_name.find(f'{TEI}surname'))]).strip()
+
+
+def table_markdown(table):
+    """A TEI table as a Markdown table (first row is the header)"""
+    rows = [[text_of(cell).replace('|', '\\|') for cell in row.findall(f'{TEI}cell')]
+            for row in table.findall(f'{TEI}row')]
+    rows = [row for row in rows if row]
+    if not rows:
+        return ''
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + ' --- |' * width]
+    lines += ['| ' + ' | '.join(row) + ' |' for row in rows[1:]]
+    return '\n'.join(lines)
+
+
+def figure_markdown(figure):
+    """Caption (and table, for table figures) of a TEI figure"""
+    label = text_of(figure.find(f'{TEI}label'))
+    head = text_of(figure.find(f'{TEI}head'))
+    desc = text_of(figure.find(f'{TEI}figDesc'))
+    kind = 'Table' if figure.get('type') == 'table' else 'Figure'
+    title = head or f"{kind} {label}".strip()
+    caption = f"**{title}.** {desc}".strip() if desc else f"**{title}.**"
+    table = figure.find(f'{TEI}table')
+    if table is not None:
+        return caption + '\n\n' + table_markdown(table)
+    return caption
+
+
+def formula_markdown(formula):
+    """A TEI formula as a display equation"""
+    label = text_of(formula.find(f'{TEI}label'))
+    text = (formula.text or '').strip() or text_of(formula)
+    return f"$$ {text} $$" + (f" {label}" if label else '')
+
+
+def reference_markdown(bibl):
+    """One reference list entry from a biblStruct"""
+    analytic = bibl.find(f'{TEI}analytic')
+    monogr = bibl.find(f'{TEI}monogr')
+    authors = [person_name(p) for p in bibl.iter(f'{TEI}persName')]
+    title = text_of(analytic.find(f'{TEI}title')) if analytic is not None else ''
+    source = text_of(monogr.find(f'{TEI}title')) if monogr is not None else ''
+    if not title:
+        title, source = source, ''
+    date = bibl.find(f'.//{TEI}imprint/{TEI}date')
+    year = (date.get('when') or text_of(date))[:4] if date is not None else ''
+    volume = text_of(bibl.find(f'.//{TEI}biblScope[@unit="volume"]'))
+    page = bibl.find(f'.//{TEI}biblScope[@unit="page"]')
+    pages = ''
+    if page is not None:
+        pages = '-'.join(p for p in (page.get('from'), page.get('to')) if p) or text_of(page)
+    doi = text_of(bibl.find(f'.//{TEI}idno[@type="DOI"]'))
+
+    parts = ['; '.join(authors)] if authors else []
+    if year:
+        parts.append(f"({year})")
+    if title:
+        parts.append(title.rstrip('.') + '.')
+    if source:
+        parts.append(f"*{source}*" + (f", {volume}" if volume else '') + (f", {pages}" if pages else '') + '.')
+    if doi:
+        parts.append(f"https://doi.org/{doi}")
+    return ' '.join(parts) or text_of(bibl)
+
+
+def header_markdown(header):
+    """Title, authors, affiliations, journal, year and DOI from the teiHeader"""
+    lines = []
+    title = text_of(header.find(f'.//{TEI}titleStmt/{TEI}title'))
+    if title:
+        lines += [f"# {title}", '']
+
+    source = header.find(f'.//{TEI}sourceDesc/{TEI}biblStruct')
+    if source is not None:
+        authors = []
+        affiliations = []
+        for author in source.findall(f'{TEI}analytic/{TEI}author'):
+            pers_name = author.find(f'{TEI}persName')
+            if pers_name is None:
+                continue
+            authors.append(person_name(pers_name))
+            for affiliation in author.findall(f'{TEI}affiliation'):
+                name = ', '.join(text_of(org) for org in affiliation.findall(f'{TEI}orgName'))
+                if name and name not in affiliations:
+                    affiliations.append(name)
+        if authors:
+            lines.append(f"**Authors:** {'; '.join(authors)}")
+        if affiliations:
+            lines.append(f"**Affiliations:** {'; '.join(affiliations)}")
+        journal = text_of(source.find(f'{TEI}monogr/{TEI}title'))
+        if journal:
+            lines.append(f"**Journal:** {journal}")
+        date = source.find(f'.//{TEI}imprint/{TEI}date')
+        if date is not None and (date.get('when') or text_of(date)):
+            lines.append(f"**Year:** {(date.get('when') or text_of(date))[:4]}")
+        doi = text_of(source.find(f'{TEI}idno[@type="DOI"]'))
+        if doi:
+            lines.append(f"**DOI:** {doi}")
+        if lines and lines[-1]:
+            lines.append('')
+
+    abstract = header.find(f'.//{TEI}profileDesc/{TEI}abstract')
+    if abstract is not None:
+        paragraphs = [text_of(p) for p in abstract.iter(f'{TEI}p')] or [text_of(abstract)]
+        paragraphs = [p for p in paragraphs if p]
+        if paragraphs:
+            lines += ['## Abstract', '']
+            for paragraph in paragraphs:
+                lines += [paragraph, '']
+    return lines
+
+
+def div_markdown(div):
+    """A body section: heading (level from its number, e.g. 2.1 → ###) and contents"""
+    lines = []
+    head = div.find(f'{TEI}head')
+    if head is not None and text_of(head):
+        number = head.get('n', '')
+        level = 2 + number.rstrip('.').count('.') if number else 2
+        lines += [f"{'#' * min(level, 6)} {f'{number} ' if number else ''}{text_of(head)}", '']
+    for child in div:
+        if child.tag == f'{TEI}p':
+            lines += [text_of(child), '']
+        elif child.tag == f'{TEI}formula':
+            lines += [formula_markdown(child), '']
+        elif child.tag == f'{TEI}figure':
+            lines += [figure_markdown(child), '']
+        elif child.tag == f'{TEI}div':
+            lines += div_markdown(child)
+    return lines
+
+
+class MarkdownWriter:
+    """Writes Markdown blocks to a stream, separated like '\\n'.join(lines).strip() would"""
+
+    def __init__(self, out):
+        self.out = out
+        self.started = False
+
+    def block(self, lines, separator='\n\n'):
+        text = '\n'.join(lines).strip()
+        if not text:
+            return
+        if self.started:
+            self.out.write(separator)
+        self.out.write(text)
+        self.started = True
+
+    def close(self):
+        self.out.write('\n')
+
+
+def convert_stream(source, out):
+    """Stream TEI from source (path or binary file object) and write Markdown to out (text stream)"""
+    writer = MarkdownWriter(out)
+    stack = []
+    figures_started = False
+    references = 0
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        parent = stack[-1] if stack else None
+        parent_tag = parent.tag if parent is not None else None
+
+        if elem.tag == f'{TEI}teiHeader':
+            writer.block(header_markdown(elem))
+        elif parent_tag == f'{TEI}body' and elem.tag == f'{TEI}div':
+            writer.block(div_markdown(elem))
+        elif parent_tag == f'{TEI}body' and elem.tag == f'{TEI}formula':
+            writer.block([formula_markdown(elem)])
+        elif parent_tag == f'{TEI}body' and elem.tag == f'{TEI}figure':
+            if not figures_started:
+                # GROBID puts floats after the sections
+                writer.block(['## Figures and Tables'])
+                figures_started = True
+            writer.block([figure_markdown(elem)])
+        elif parent_tag == f'{TEI}listBibl' and elem.tag == f'{TEI}biblStruct':
+            references += 1
+            if references == 1:
+                writer.block(['## References'])
+            writer.block([f"{references}. {reference_markdown(elem)}"],
+                         separator='\n\n' if references == 1 else '\n')
+        else:
+            continue
+        # Done with this unit: free it and drop the parent's reference to it
+        elem.clear()
+        if parent is not None:
+            parent.remove(elem)
+
+    writer.close()
+
+
+def tei_to_markdown(tei):
+    """Convert a GROBID TEI document (str or bytes) to Markdown"""
+    out = io.StringIO()
+    convert_stream(io.BytesIO(tei.encode('utf-8') if isinstance(tei, str) else tei), out)
+    return out.getvalue()
+
+
+def markdown_name(tei_path):
+    """paper.tei.xml / paper.xml -> paper.md"""
+    name = os.path.basename(tei_path)
+    for suffix in ('.tei.xml', '.xml'):
+        if name.endswith(suffix):
+            return name[:-len(suffix)] + '.md'
+    return name + '.md'
+
+
+def convert_file(tei_path, markdown_dir):
+    """Convert one TEI file into markdown_dir. Returns (tei_path, error or None)."""
+    md_path = os.path.join(markdown_dir, markdown_name(tei_path))
+    fd, tmp_path = tempfile.mkstemp(dir=markdown_dir, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            convert_stream(tei_path, out)
+        os.replace(tmp_path, md_path)
+        return tei_path, None
+    except Exception as e:
+        os.remove(tmp_path)
+        return tei_path, f"{type(e).__name__}: {e}"
+
+
+def find_tei_files(paths):
+    """Expand files and directories (recursively) into a sorted list of TEI paths"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                files += [os.path.join(directory, n) for n in names
+                          if n.endswith('.xml') and not n.startswith('.tmp_')]
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def convert_many(tei_paths, markdown_dir, workers=None):
+    """Convert TEI files to Markdown with a process pool. Returns {tei_path: error} for failures."""
+    os.makedirs(markdown_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    print(f"\n{'='*60}")
+    print(f"TEI → MARKDOWN: {len(tei_paths)} files, {workers} workers")
+    print(f"{'='*60}")
+
+    errors = {}
+    if workers == 1:
+        results = (convert_file(path, markdown_dir) for path in tei_paths)
+        for tei_path, error in results:
+            if error:
+                errors[tei_path] = error
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Batches of files per task keep the pickling overhead per file small
+            chunksize = max(1, min(64, len(tei_paths) // (workers * 4)))
+            for tei_path, error in pool.map(convert_file, tei_paths, [markdown_dir] * len(tei_paths),
+                                            chunksize=chunksize):
+                if error:
+                    errors[tei_path] = error
+
+    for tei_path, error in errors.items():
+        print(f"  ⚠️  {os.path.basename(tei_path)}: {error}")
+    elapsed = time.perf_counter() - start
+    print(f"\n✓ Converted {len(tei_paths) - len(errors)} files ({len(errors)} failed) in {elapsed:.1f}s "
+          f"({len(tei_paths) / elapsed * 60 if elapsed else 0:.0f} files/min) -> {markdown_dir}")
+    return errors
+
+
+if __name__ == "__main__":
+    from pdf_processing.grobid_client import TEI_CACHE_DIR
+
+    parser = argparse.ArgumentParser(
+        description="Convert GROBID TEI files to Markdown",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.tei_to_markdown --markdown-dir markdown/
+  python -m pdf_processing.tei_to_markdown paper.tei.xml --markdown-dir markdown/ --workers 1
+        """
+    )
+    parser.add_argument('paths', nargs='*', default=[TEI_CACHE_DIR],
+                       help='TEI files or directories (default: the GROBID client TEI cache)')
+    parser.add_argument('--markdown-dir', type=str, required=True, help='Write one .md file per TEI file here')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+
+    args = parser.parse_args()
+    convert_many(find_tei_files(args.paths), args.markdown_dir, args.workers)
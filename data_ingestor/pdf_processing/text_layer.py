@@ -0,0 +1,253 @@
+"""
+Text-Layer PDF Extraction (no GROBID)
+
+Pulls the embedded text layer out of PDFs with pypdf (pure Python), for when
+no GROBID service is running or the full TEI structure isn't needed, e.g.
+triaging thousands of PDFs for whether they report any test statistics.
+There are no headings, tables or reference parsing, but the output is plain
+paragraphs that rule_extractor.py, prefilter.py and llm_extractor.py accept
+like GROBID's Markdown.
+
+  - PDFs are read in a process pool (--workers, default one per CPU)
+  - each file gets --timeout seconds and only its first --max-pages pages,
+    so a pathological PDF can't stall the batch
+  - the text is cached by the PDF's sha256 (and page limit), so reruns and
+    duplicate PDFs under other names cost nothing
+
+Each PDF's report says how many t/F/χ²/z statistics the text contains
+(outside the reference list), which is the triage answer on its own.
+
+Cache layout: .text_cache/<sha256[:2]>/<sha256>.p<max pages>.txt
+
+Usage:
+    python -m pdf_processing.text_layer ~/PDFs --markdown-dir text/
+    python -m pdf_processing.text_layer ~/PDFs --max-pages 20 --timeout 10 --report-out triage.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+from pdf_processing.grobid_client import find_pdfs, markdown_path, pdf_sha256
+from pdf_processing.prefilter import normalize_text, without_references
+from pdf_processing.rule_extractor import STATISTIC
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXT_CACHE_DIR = os.path.join(SCRIPT_DIR, '.text_cache')
+
+DEFAULT_MAX_PAGES = 50
+DEFAULT_TIMEOUT = 30
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+class _Alarm(BaseException):
+    """Raised by the SIGALRM handler; a BaseException so pypdf's own except Exception blocks can't swallow it"""
+
+
+# ---------- Cache ----------
+
+def text_cache_path(sha256, max_pages=DEFAULT_MAX_PAGES, cache_dir=TEXT_CACHE_DIR):
+    return os.path.join(cache_dir, sha256[:2], f"{sha256}.p{max_pages or 'all'}.txt")
+
+
+def load_cached_text(sha256, max_pages=DEFAULT_MAX_PAGES, cache_dir=TEXT_CACHE_DIR):
+    path = text_cache_path(sha256, max_pages, cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def save_cached_text(sha256, text, max_pages=DEFAULT_MAX_PAGES, cache_dir=TEXT_CACHE_DIR):
+    """Write atomically, so concurrent workers never see a partial file"""
+    path = text_cache_path(sha256, max_pages, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# ---------- Extraction ----------
+
+def clean_page_text(text):
+    """Join words hyphenated across line breaks and collapse runs of blank lines"""
+    text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
+    text = re.sub(r'[ \t]+\n', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+def _raise_timeout(signum, frame):
+    raise _Alarm()
+
+
+def extract_text(pdf_path, max_pages=DEFAULT_MAX_PAGES, timeout=None):
+    """
+    The text layer of a PDF's first max_pages pages, one paragraph block per
+    page. Raises ExtractionTimeout after timeout seconds (on platforms with
+    SIGALRM, and only in a process's main thread, as in the worker pool).
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("Text-layer extraction requires pypdf: pip install pypdf")
+    logging.getLogger('pypdf').setLevel(logging.ERROR)
+
+    use_alarm = (bool(timeout) and hasattr(signal, 'SIGALRM')
+                 and threading.current_thread() is threading.main_thread())
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        reader = PdfReader(pdf_path)
+        pages = reader.pages if not max_pages else reader.pages[:max_pages]
+        return '\n\n'.join(clean_page_text(page.extract_text() or '') for page in pages)
+    except _Alarm:
+        raise ExtractionTimeout(f"gave up after {timeout}s")
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def count_statistics(text):
+    """Number of t/F/χ²/z test statistics in the text, ignoring the reference list"""
+    return sum(1 for _ in STATISTIC.finditer(normalize_text(without_references(text))))
+
+
+def process_pdf_to_text(pdf_path, max_pages=DEFAULT_MAX_PAGES, timeout=DEFAULT_TIMEOUT, cache_dir=TEXT_CACHE_DIR,
+                        refresh=False, sha256=None):
+    """Return (text, cached) for a PDF, reading its text layer only on a cache miss"""
+    sha256 = sha256 or pdf_sha256(pdf_path)
+    if not refresh:
+        text = load_cached_text(sha256, max_pages, cache_dir)
+        metrics.record_cache('text', text is not None)
+        if text is not None:
+            return text, True
+    text = extract_text(pdf_path, max_pages, timeout)
+    save_cached_text(sha256, text, max_pages, cache_dir)
+    return text, False
+
+
+def _text_worker(pdf_path, sha256, max_pages, timeout, cache_dir):
+    """Process pool task: extract and cache one PDF. Returns (text, statistics, seconds, error)."""
+    start = time.perf_counter()
+    try:
+        text = extract_text(pdf_path, max_pages, timeout)
+        save_cached_text(sha256, text, max_pages, cache_dir)
+        return text, count_statistics(text), time.perf_counter() - start, None
+    except Exception as e:
+        return None, None, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def process_batch(pdf_paths, workers=None, max_pages=DEFAULT_MAX_PAGES, timeout=DEFAULT_TIMEOUT,
+                  cache_dir=TEXT_CACHE_DIR, refresh=False, markdown_dir=None):
+    """
+    Extract the text layer of many PDFs with a process pool. Writes
+    <markdown_dir>/<pdf name>.md if markdown_dir is given. Returns a list of
+    {pdf, sha256, status ('cached', 'processed' or 'error'), statistics, chars, seconds, error}.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    print(f"\n{'='*60}")
+    print(f"TEXT LAYER BATCH: {len(pdf_paths)} PDFs, {workers} workers "
+          f"(first {max_pages or 'all'} pages, {timeout}s timeout)")
+    print(f"{'='*60}")
+
+    with metrics.stage('hash'):
+        hashes = {pdf: pdf_sha256(pdf) for pdf in pdf_paths}
+    # Identical PDFs saved under different names are only read once
+    by_hash = {}
+    for pdf, sha256 in hashes.items():
+        by_hash.setdefault(sha256, []).append(pdf)
+
+    if markdown_dir:
+        os.makedirs(markdown_dir, exist_ok=True)
+
+    results = []
+
+    def finish(sha256, status, text=None, statistics=None, seconds=0.0, error=None):
+        for pdf in by_hash[sha256]:
+            if text is not None and markdown_dir:
+                with open(markdown_path(pdf, markdown_dir), 'w', encoding='utf-8') as f:
+                    f.write(text)
+            results.append({'pdf': pdf, 'sha256': sha256, 'status': status, 'statistics': statistics,
+                            'chars': len(text) if text is not None else None,
+                            'seconds': round(seconds, 3), 'error': error})
+        if error:
+            print(f"  [{len(results)}/{len(pdf_paths)}] ⚠️  {os.path.basename(by_hash[sha256][0])}: {error}")
+
+    to_extract = []
+    for sha256 in by_hash:
+        text = None if refresh else load_cached_text(sha256, max_pages, cache_dir)
+        metrics.record_cache('text', text is not None)
+        if text is not None:
+            finish(sha256, 'cached', text, count_statistics(text))
+        else:
+            to_extract.append(sha256)
+    print(f"  {len(by_hash) - len(to_extract)} cached, {len(to_extract)} to extract")
+
+    with metrics.stage('text_layer'), ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_text_worker, by_hash[sha256][0], sha256, max_pages, timeout, cache_dir): sha256
+                   for sha256 in to_extract}
+        for future in as_completed(futures):
+            text, statistics, seconds, error = future.result()
+            finish(futures[future], 'error' if error else 'processed', text, statistics, seconds, error)
+
+    elapsed = time.perf_counter() - start
+    counts = {status: sum(r['status'] == status for r in results) for status in ('cached', 'processed', 'error')}
+    with_statistics = sum(1 for r in results if r['statistics'])
+    print(f"\n✓ {counts['processed']} processed, {counts['cached']} from cache, {counts['error']} failed "
+          f"in {elapsed:.1f}s ({len(results) / elapsed * 60 if elapsed else 0:.0f} PDFs/min)")
+    print(f"  {with_statistics}/{len(results)} PDFs report t/F/χ²/z statistics")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract the text layer of PDFs (no GROBID) with a process pool, cached by PDF hash",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m pdf_processing.text_layer ~/PDFs/in_ground_truth_dataset --markdown-dir text/
+  python -m pdf_processing.text_layer ~/PDFs --max-pages 20 --timeout 10 --report-out triage.json
+  python -m pdf_processing.rule_extractor text/ --summary
+        """
+    )
+    parser.add_argument('paths', nargs='+', help='PDF files or directories containing PDFs')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--max-pages', type=int, default=DEFAULT_MAX_PAGES,
+                       help=f'Only read the first N pages of each PDF, 0 for all (default: {DEFAULT_MAX_PAGES})')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                       help=f'Seconds allowed per PDF (default: {DEFAULT_TIMEOUT})')
+    parser.add_argument('--markdown-dir', type=str, default=None,
+                       help='Write one .md file of plain text per PDF here (for the extractors)')
+    parser.add_argument('--cache-dir', type=str, default=TEXT_CACHE_DIR, help='Text cache directory')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached text and re-read every PDF')
+    parser.add_argument('--report-out', type=str, default=None,
+                       help='Write per-PDF results (status, statistics found, timing) as JSON')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                       help='Write cache and stage metrics to this JSON file (plus a .prom Prometheus textfile)')
+
+    args = parser.parse_args()
+    try:
+        results = process_batch(find_pdfs(args.paths), args.workers, args.max_pages, args.timeout,
+                                args.cache_dir, args.refresh, args.markdown_dir)
+        if args.report_out:
+            with open(args.report_out, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"  Report: {args.report_out}")
+    finally:
+        if args.metrics_out:
+            metrics.write_metrics(args.metrics_out)
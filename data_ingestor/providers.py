@@ -0,0 +1,41 @@
+"""
+Base URLs of the Scholarly Metadata APIs
+
+The fetch modules build every request URL from provider_url(name) instead of
+hard-coding hosts, so they can be pointed at a local mock server
+(mock_api_server.py) or a caching proxy.
+
+Overrides, from most to least specific:
+    METASCIENCE_<NAME>_URL       e.g. METASCIENCE_CROSSREF_URL=http://localhost:9000/crossref
+    METASCIENCE_API_BASE_URL     every provider at <base>/<name>, e.g. http://localhost:8765
+
+Usage:
+    METASCIENCE_API_BASE_URL=http://localhost:8765 python data_ingestor.py new_rows.csv
+"""
+
+import os
+
+PROVIDER_URLS = {
+    'openalex': 'https://api.openalex.org',
+    'datacite': 'https://api.datacite.org',
+    'crossref': 'https://api.crossref.org',
+    'unpaywall': 'https://api.unpaywall.org',
+    'europepmc': 'https://www.ebi.ac.uk/europepmc/webservices/rest',
+    'semanticscholar': 'https://api.semanticscholar.org',
+    'osf_api': 'https://api.osf.io',
+    'osf': 'https://osf.io',
+    'doi': 'https://doi.org',
+}
+
+BASE_URL_ENV = 'METASCIENCE_API_BASE_URL'
+
+
+def provider_url(name):
+    """Base URL for a provider (no trailing slash), honoring environment overrides"""
+    override = os.environ.get(f"METASCIENCE_{name.upper()}_URL")
+    if override:
+        return override.rstrip('/')
+    base = os.environ.get(BASE_URL_ENV)
+    if base:
+        return f"{base.rstrip('/')}/{name}"
+    return PROVIDER_URLS[name]
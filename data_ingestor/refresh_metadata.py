@@ -0,0 +1,283 @@
+"""
+Background Metadata Refresh for the Replications Database
+
+Master rows with missing volume/issue/pages, missing years or abbreviated
+authors only get fixed when they happen to be re-ingested. This command
+refreshes them a little at a time, so it can run overnight (e.g. from cron)
+without one giant blocking run:
+
+  1. Find papers (DOIs) whose rows need enrichment (the enrichment_mask
+     bitmask of the whole master, computed in one pass), ordered by
+     priority: DOIs never tried before first, then by how many fields are
+     missing across all rows citing them.
+  2. Fill what other master rows already know about the same DOI (free).
+  3. Fetch metadata for the remaining DOIs until the request budget or time
+     limit is used up, waiting --min-interval seconds between lookups.
+     Empty fields are filled, and abbreviated authors and journals are
+     replaced when the fetched value is not abbreviated itself.
+  4. Regenerate citations for the changed rows and commit the changes as a
+     new delta in version_history.txt.
+
+DOIs that were looked up recently are skipped until --retry-after-days have
+passed, so rows the APIs can't complete don't use up every run's budget.
+Lookup times are kept in data/.refresh_state.json.
+
+Usage:
+    python refresh_metadata.py --max-requests 500
+    python refresh_metadata.py --max-requests 200 --max-minutes 30 --dry-run
+"""
+
+import pandas as pd
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import metrics
+from data_ingestor import (
+    ABBREVIATED_AUTHORS_RE, ENRICHMENT_BITS, METADATA_FIELDS, build_master_metadata, enrichment_mask,
+    generate_citations, is_abbreviated_journal, is_empty, missing_field_count,
+)
+from dois import canonical_doi_series
+from export_aggregates import export_aggregates
+from fetch_metadata_from_doi import MAX_REQUESTS_PER_DOI, fetch_metadata_from_doi
+from versioning import (
+    DATA_DIR, atomic_write_text, commit_version, diff_frames, head_version, materialize_version, write_pending,
+)
+
+REFRESH_STATE_PATH = os.path.join(DATA_DIR, '.refresh_state.json')
+PREFIXES = ('original', 'replication')
+
+
+def load_refresh_state(path=REFRESH_STATE_PATH):
+    """Return {doi: ISO timestamp of the last lookup}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_refresh_state(state, path=REFRESH_STATE_PATH):
+    atomic_write_text(path, json.dumps(state, indent=1, sort_keys=True))
+
+
+def row_dois(df, prefix):
+    """Normalized DOI of each row's {prefix}_url (NaN where there is none)"""
+    if f'{prefix}_url' not in df.columns:
+        return pd.Series(float('nan'), index=df.index, dtype=object)
+    return canonical_doi_series(df[f'{prefix}_url'])
+
+
+def enrichment_masks(df):
+    """{prefix: enrichment_mask(df, prefix)} for the whole frame"""
+    return {prefix: enrichment_mask(df, prefix) for prefix in PREFIXES}
+
+
+def enrichment_reason_counts(masks):
+    """Number of rows (original and replication) with each ENRICHMENT_BITS reason set"""
+    return {name: int(sum(((mask & bit) != 0).sum() for mask in masks.values()))
+            for name, bit in ENRICHMENT_BITS.items()}
+
+
+def select_refresh_candidates(df, state, retry_after_days=30, now=None, masks=None):
+    """
+    Return a DataFrame of DOIs to refresh, highest priority first, with
+    columns doi, rows (number of rows needing enrichment), missing (empty
+    fields across those rows) and last_attempt. masks is enrichment_masks(df),
+    computed here if not given.
+    """
+    now = now or datetime.now()
+    masks = masks or enrichment_masks(df)
+    frames = []
+    for prefix in PREFIXES:
+        needs = masks[prefix] != 0
+        frames.append(pd.DataFrame({
+            'doi': row_dois(df, prefix)[needs],
+            'missing': missing_field_count(masks[prefix][needs]),
+        }))
+    needing = pd.concat(frames).dropna(subset=['doi'])
+    if needing.empty:
+        return pd.DataFrame(columns=['doi', 'rows', 'missing', 'last_attempt'])
+
+    candidates = needing.groupby('doi').agg(rows=('missing', 'size'), missing=('missing', 'sum')).reset_index()
+    candidates['last_attempt'] = pd.to_datetime(candidates['doi'].map(state))
+    stale = candidates['last_attempt'].isna() | (candidates['last_attempt'] < now - timedelta(days=retry_after_days))
+    candidates = candidates[stale]
+    candidates = candidates.assign(never_tried=candidates['last_attempt'].isna())
+    return candidates.sort_values(['never_tried', 'missing', 'rows'], ascending=False, kind='stable') \
+                     .drop(columns='never_tried').reset_index(drop=True)
+
+
+def is_abbreviated_authors(authors):
+    return isinstance(authors, str) and bool(ABBREVIATED_AUTHORS_RE.search(authors))
+
+
+# Fields whose abbreviated values are replaced by a full fetched value
+ABBREVIATION_CHECKS = {'authors': is_abbreviated_authors, 'journal': is_abbreviated_journal}
+
+
+def doi_rows(df):
+    """{prefix: {DOI: index labels of the rows citing it}}, so a DOI's rows are a lookup rather than a scan"""
+    rows = {}
+    for prefix in PREFIXES:
+        dois = row_dois(df, prefix).dropna()
+        rows[prefix] = dois.groupby(dois, sort=False).groups
+    return rows
+
+
+def apply_metadata(df, rows_by_doi, doi, metadata):
+    """
+    Fill empty fields in every row citing doi (as original or replication),
+    like enrich_from_metadata, and replace abbreviated authors and journals
+    with an unabbreviated metadata value. rows_by_doi is doi_rows(df); only
+    the rows citing doi are looked at. Returns the number of fields filled or replaced.
+    """
+    filled = 0
+    for prefix in PREFIXES:
+        rows = rows_by_doi[prefix].get(doi)
+        if rows is None:
+            continue
+        for field in METADATA_FIELDS:
+            column = f'{prefix}_{field}'
+            if not metadata.get(field):
+                continue
+            if column not in df.columns:
+                df[column] = None
+            values = df.loc[rows, column]
+            empty = values.map(is_empty)
+            is_abbreviated = ABBREVIATION_CHECKS.get(field)
+            if is_abbreviated and not is_abbreviated(metadata[field]):
+                empty |= values.map(is_abbreviated)
+            if empty.any():
+                if df[column].dtype != object:
+                    df[column] = df[column].astype(object)
+                df.loc[rows[empty.values], column] = metadata[field]
+                filled += int(empty.sum())
+    return filled
+
+
+def request_count():
+    """HTTP requests made so far in this process (from metrics)"""
+    return sum(p['requests'] for p in metrics.snapshot()['providers'].values())
+
+
+def refresh_metadata(max_requests=500, max_minutes=None, min_interval=1.0, retry_after_days=30,
+                     dry_run=False, export=True, state_path=REFRESH_STATE_PATH):
+    """Run one budgeted refresh pass and commit the changes. Returns the new version filename or None."""
+    print(f"\n{'='*60}")
+    print(f"METADATA REFRESH (budget: {max_requests} requests"
+          f"{f', {max_minutes} minutes' if max_minutes else ''})")
+    print(f"{'='*60}")
+
+    master_entry = head_version()
+    if not master_entry:
+        print("No master database found in version_history.txt")
+        return None
+    with metrics.stage('load_master'):
+        master_df = materialize_version(master_entry)
+    print(f"  Loaded {len(master_df)} rows as of {master_entry}")
+    df = master_df.copy()
+    rows_by_doi = doi_rows(df)
+
+    state = load_refresh_state(state_path)
+    with metrics.stage('select'):
+        masks = enrichment_masks(df)
+        candidates = select_refresh_candidates(df, state, retry_after_days, masks=masks)
+    print(f"  {len(candidates)} papers need enrichment and are due for a refresh")
+    if dry_run:
+        reasons = {name: count for name, count in enrichment_reason_counts(masks).items() if count}
+        print(f"  Rows needing enrichment, by reason: {reasons}")
+        print(candidates.head(20).to_string(index=False))
+        return None
+
+    # Fill from other rows for the same paper before spending any requests
+    with metrics.stage('fill_from_master'):
+        master_metadata = build_master_metadata(df)
+        filled = sum(apply_metadata(df, rows_by_doi, doi, master_metadata[doi])
+                     for doi in candidates['doi'] if doi in master_metadata)
+    print(f"  ✓ Filled {filled} fields from other rows of the master database")
+
+    print(f"\n{'='*60}")
+    print(f"FETCHING METADATA")
+    print(f"{'='*60}")
+    deadline = time.monotonic() + max_minutes * 60 if max_minutes else None
+    start_requests = request_count()
+    looked_up = 0
+    with metrics.stage('fetch'):
+        for doi in candidates['doi']:
+            # A lookup can make a request to every provider in the chain, so stop before one could overshoot
+            if max_requests - (request_count() - start_requests) < MAX_REQUESTS_PER_DOI:
+                print(f"\n  Request budget used up")
+                break
+            if deadline and time.monotonic() >= deadline:
+                print(f"\n  Time limit reached")
+                break
+            if not any(enrichment_mask(df.loc[rows_by_doi[prefix][doi]], prefix).any()
+                       for prefix in PREFIXES if doi in rows_by_doi[prefix]):
+                continue  # completed from the master database above
+            print(f"  [{looked_up + 1}] Fetching metadata for DOI: {doi}")
+            metadata = fetch_metadata_from_doi(doi)
+            state[doi] = datetime.now().isoformat(timespec='seconds')
+            looked_up += 1
+            if metadata:
+                filled += apply_metadata(df, rows_by_doi, doi, metadata)
+            metrics.sleep(min_interval)  # Rate limiting
+    save_refresh_state(state, state_path)
+    print(f"  Looked up {looked_up} DOIs using {request_count() - start_requests} requests")
+
+    print(f"\n{'='*60}")
+    print(f"SAVING UPDATED DATABASE")
+    print(f"{'='*60}")
+    with metrics.stage('save'):
+        # Only rows whose citation inputs changed get new citation HTML
+        df = generate_citations(df, previous_df=master_df)
+        delta = diff_frames(master_df, df)
+        output_filename = None
+        if delta.empty:
+            print(f"  No changes to save")
+        else:
+            print(f"  ✓ Saving delta: {len(delta)} rows changed ({filled} fields filled)")
+            output_filename = commit_version(write_pending(delta), master_entry)
+            print(f"✓ Added {output_filename} to version_history.txt")
+
+    if export and output_filename:
+        head = head_version()
+        with metrics.stage('export'):
+            export_aggregates(materialize_version(head), head)
+    return output_filename
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Refresh metadata for incomplete rows of the Replications Database, within a request budget",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python refresh_metadata.py --max-requests 500
+  python refresh_metadata.py --max-requests 200 --max-minutes 30
+  python refresh_metadata.py --dry-run
+        """
+    )
+    parser.add_argument('--max-requests', type=int, default=500,
+                       help='Never make more than this many HTTP requests to the metadata APIs (default: 500)')
+    parser.add_argument('--max-minutes', type=float, default=None,
+                       help='Stop fetching after this many minutes')
+    parser.add_argument('--min-interval', type=float, default=1.0,
+                       help='Seconds to wait between DOI lookups (default: 1.0)')
+    parser.add_argument('--retry-after-days', type=float, default=30,
+                       help='Skip DOIs looked up less than this many days ago (default: 30)')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Only list the highest priority papers, without fetching or saving')
+    parser.add_argument('--skip-export', action='store_true',
+                       help='Skip exporting aggregate JSON shards for the website')
+    parser.add_argument('--metrics-out', type=str, default=None,
+                       help='Write stage timings and provider metrics to this JSON file (plus a .prom Prometheus textfile)')
+
+    args = parser.parse_args()
+    try:
+        refresh_metadata(max_requests=args.max_requests, max_minutes=args.max_minutes,
+                         min_interval=args.min_interval, retry_after_days=args.retry_after_days,
+                         dry_run=args.dry_run, export=not args.skip_export)
+    finally:
+        if args.metrics_out:
+            metrics.write_metrics(args.metrics_out)
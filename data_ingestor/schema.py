@@ -0,0 +1,97 @@
+"""
+Typed Loader for the Replications Database
+
+pd.read_csv infers dtypes, so label columns like result or discipline come
+back as object columns and integer columns with gaps (years, volumes, sample
+sizes) come back as float64. This module reads the column types from
+data_dictionary.csv once and loads the database with compact dtypes:
+
+  - enumerated columns (result, validated, ...) and repeated labels
+    (discipline, *_es_type, *_journal, ...) -> category
+  - integer columns -> nullable Int32 (only if every value is a whole number,
+    otherwise the column is left as is, e.g. issues like "7-8")
+  - float columns -> float32 (optional, see below)
+
+float32 is meant for analysis only: values written back to the database
+should keep full precision, so ingestion loads with float32=False.
+
+Usage:
+    from schema import read_replications_csv, load_master_typed
+    df = read_replications_csv("../data/replications_database_2026_01_28_151337.csv")
+    df = load_master_typed()           # latest version (snapshot + deltas)
+"""
+
+import pandas as pd
+import os
+from functools import lru_cache
+from versioning import SCRIPT_DIR, materialize_version
+
+DATA_DICT_PATH = os.path.join(SCRIPT_DIR, 'data_dictionary.csv')
+
+# String columns that hold a small set of repeated labels
+LABEL_COLUMNS = [
+    'discipline', 'original_es_type', 'replication_es_type', 'original_journal', 'replication_journal',
+    'original_p_value_type', 'replication_p_value_type', 'validated_person',
+    'openalex_field', 'openalex_subfield', 'project_tag',
+]
+
+
+@lru_cache(maxsize=None)
+def load_schema(data_dict_path=DATA_DICT_PATH):
+    """
+    Read data_dictionary.csv and return {column name: kind}, where kind is
+    "category", "integer", "float" or "string".
+    """
+    data_dict = pd.read_csv(data_dict_path)
+    schema = {}
+    for column, column_type in zip(data_dict['column_name'], data_dict['type'].fillna('')):
+        column_type = column_type.lower()
+        if ' or ' in column_type or column in LABEL_COLUMNS:
+            schema[column] = 'category'
+        elif column_type in ('integer', 'positive integer'):
+            schema[column] = 'integer'
+        elif column_type == 'float':
+            schema[column] = 'float'
+        else:
+            schema[column] = 'string'
+    for column in LABEL_COLUMNS:
+        schema.setdefault(column, 'category')
+    return schema
+
+
+def to_nullable_int(series):
+    """Convert to Int32 if every non-missing value is a whole number, else return series unchanged"""
+    numeric = pd.to_numeric(series, errors='coerce')
+    if numeric.notna().sum() != series.notna().sum() or (numeric.dropna() % 1 != 0).any():
+        return series
+    return numeric.astype('Int32')
+
+
+def apply_schema_dtypes(df, float32=True, data_dict_path=DATA_DICT_PATH):
+    """Return a copy of df with compact dtypes from the data dictionary applied"""
+    df = df.copy()
+    for column, kind in load_schema(data_dict_path).items():
+        if column not in df.columns:
+            continue
+        if kind == 'category':
+            df[column] = df[column].astype('category')
+        elif kind == 'integer':
+            df[column] = to_nullable_int(df[column])
+        elif kind == 'float' and float32:
+            numeric = pd.to_numeric(df[column], errors='coerce')
+            # Leave columns with unparseable values (e.g. "<.001" p values) untouched
+            if numeric.notna().sum() == df[column].notna().sum():
+                df[column] = numeric.astype('float32')
+    return df
+
+
+def read_replications_csv(path, float32=True, data_dict_path=DATA_DICT_PATH):
+    """Read a replications database CSV with schema dtypes"""
+    categories = {column: 'category' for column, kind in load_schema(data_dict_path).items() if kind == 'category'}
+    df = pd.read_csv(path, dtype=categories)
+    return apply_schema_dtypes(df, float32=float32, data_dict_path=data_dict_path)
+
+
+def load_master_typed(version=None, float32=True, data_dict_path=DATA_DICT_PATH):
+    """Materialize a version of the master database (default: latest) with schema dtypes"""
+    return apply_schema_dtypes(materialize_version(version), float32=float32, data_dict_path=data_dict_path)
@@ -0,0 +1,293 @@
+"""
+SQLite Storage Backend for Replications Database
+
+An optional alternative to the CSV snapshots: the database lives in a single
+SQLite file with one row per replication and indexes on the columns that
+ingestion and analysis filter on, so questions like "does this DOI pair
+exist", "all rows for discipline X" or "rows missing es_r" are indexed
+queries instead of a full CSV load.
+
+The replications table has the columns of data_dictionary.csv plus:
+    row_id          - row identity, same scheme as versioning.compute_row_ids (primary key)
+    row_hash        - hash part of row_id, used to continue occurrence counts
+    dedup_key       - duplicate-detection key from dedup.dedup_keys
+    original_doi    - canonical DOI from original_url (dois.py, NULL if not a DOI)
+    replication_doi - canonical DOI from replication_url (NULL if not a DOI)
+    position        - insertion order, used to order exports
+
+Rows are written with upserts keyed on row_id. CSV and Parquet snapshots are
+exported from the table (Parquet needs pyarrow).
+
+Usage:
+    python sqlite_store.py import [--version <entry>]      # seed from the CSV version history
+    python sqlite_store.py export --csv out.csv [--parquet out.parquet]
+    python sqlite_store.py publish                         # commit a CSV snapshot to version_history.txt
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import sqlite3
+from dedup import dedup_keys
+from dois import canonical_doi_series
+from schema import apply_schema_dtypes, load_schema
+from versioning import (
+    DATA_DIR, compute_row_ids, head_version, materialize_version, snapshot_columns, write_pending, commit_version,
+)
+
+SQLITE_PATH = os.path.join(DATA_DIR, 'replications.sqlite')
+TABLE = 'replications'
+
+INTERNAL_COLUMNS = ['row_id', 'row_hash', 'dedup_key', 'original_doi', 'replication_doi', 'position']
+
+INDEXES = {
+    'idx_original_doi': 'original_doi',
+    'idx_replication_doi': 'replication_doi',
+    'idx_doi_pair': 'original_doi, replication_doi',
+    'idx_dedup_key': 'dedup_key',
+    'idx_row_hash': 'row_hash',
+    'idx_discipline': 'discipline',
+    'idx_result': 'result',
+    'idx_original_year': 'original_year',
+    'idx_replication_year': 'replication_year',
+    'idx_position': 'position',
+}
+
+SQL_TYPES = {'integer': 'INTEGER', 'float': 'REAL'}
+
+# SQLite can't bind numpy scalars directly
+for numpy_type in (np.int8, np.int16, np.int32, np.int64):
+    sqlite3.register_adapter(numpy_type, int)
+sqlite3.register_adapter(np.float32, float)
+sqlite3.register_adapter(np.bool_, bool)
+
+
+def connect(path=SQLITE_PATH):
+    """Open the database, creating the table and indexes if needed"""
+    conn = sqlite3.connect(path)
+    columns = [f"{column} {SQL_TYPES.get(kind, 'TEXT')}" for column, kind in load_schema().items()]
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE} (
+            row_id TEXT PRIMARY KEY,
+            row_hash TEXT,
+            dedup_key TEXT,
+            original_doi TEXT,
+            replication_doi TEXT,
+            position INTEGER,
+            {', '.join(columns)}
+        )
+    """)
+    for name, indexed in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({indexed})")
+    conn.commit()
+    return conn
+
+
+def table_columns(conn):
+    """Return the column names of the replications table"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
+
+
+def data_columns(conn):
+    """Return the data (non-internal) columns of the replications table, in order"""
+    return [c for c in table_columns(conn) if c not in INTERNAL_COLUMNS]
+
+
+def ensure_columns(conn, columns):
+    """Add any columns not in the data dictionary (e.g. project_tag) as TEXT columns"""
+    existing = set(table_columns(conn))
+    for column in columns:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {TABLE} ADD COLUMN "{column}" TEXT')
+
+
+def normalized_dois(urls):
+    """Canonical DOI for each URL (see dois.py), or None where the URL isn't a DOI"""
+    return canonical_doi_series(urls)
+
+
+def row_hash_counts(conn, hashes):
+    """Return {row_hash: number of rows} for the given hashes (indexed lookups)"""
+    counts = {}
+    hashes = list(set(hashes))
+    for start in range(0, len(hashes), 500):
+        batch = hashes[start:start + 500]
+        query = f"SELECT row_hash, COUNT(*) FROM {TABLE} WHERE row_hash IN ({','.join('?' * len(batch))}) GROUP BY row_hash"
+        counts.update(dict(conn.execute(query, batch).fetchall()))
+    return counts
+
+
+def existing_dedup_keys(conn, keys):
+    """Return the subset of keys that already exist in the table (indexed lookups)"""
+    found = set()
+    keys = [k for k in set(keys) if k is not None]
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        query = f"SELECT dedup_key FROM {TABLE} WHERE dedup_key IN ({','.join('?' * len(batch))})"
+        found.update(row[0] for row in conn.execute(query, batch))
+    return found
+
+
+def upsert_rows(conn, df, row_ids=None):
+    """
+    Insert rows, or update them if their row_id already exists.
+    New rows get ids continuing the occurrence counts already in the table,
+    unless row_ids (e.g. from select_rows) are given. Returns the row ids.
+    """
+    if df.empty:
+        return pd.Series([], dtype=object)
+    ensure_columns(conn, df.columns)
+
+    if row_ids is None:
+        digests = compute_row_ids(df).str.slice(0, 16)
+        row_ids = compute_row_ids(df, row_hash_counts(conn, digests))
+    row_ids = pd.Series(row_ids.to_numpy(), index=df.index)
+
+    next_position = conn.execute(f"SELECT COALESCE(MAX(position), -1) + 1 FROM {TABLE}").fetchone()[0]
+    records = df.copy()
+    records['row_id'] = row_ids
+    records['row_hash'] = row_ids.str.slice(0, 16)
+    records['dedup_key'] = dedup_keys(df)
+    records['original_doi'] = normalized_dois(df.get('original_url', pd.Series(None, index=df.index)))
+    records['replication_doi'] = normalized_dois(df.get('replication_url', pd.Series(None, index=df.index)))
+    records['position'] = range(next_position, next_position + len(df))
+
+    columns = list(records.columns)
+    values = records.astype(object).where(records.notna(), None).to_numpy().tolist()
+    quoted_columns = ', '.join(f'"{c}"' for c in columns)
+    # Existing rows keep their position; everything else is overwritten
+    updates = ', '.join(f'"{c}" = excluded."{c}"' for c in columns if c not in ('row_id', 'position'))
+    conn.executemany(
+        f"INSERT INTO {TABLE} ({quoted_columns}) "
+        f"VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT(row_id) DO UPDATE SET {updates}",
+        values,
+    )
+    conn.commit()
+    return row_ids
+
+
+def select_rows(conn, where='1', params=()):
+    """
+    Return (DataFrame of data columns, Series of row ids) for rows matching a
+    WHERE clause, in insertion order.
+    """
+    query = f"SELECT * FROM {TABLE} WHERE {where} ORDER BY position"
+    df = pd.read_sql_query(query, conn, params=params)
+    row_ids = df['row_id']
+    return df[data_columns(conn)], row_ids
+
+
+def rows_for_dois(conn, dois):
+    """
+    Rows citing any of the DOIs as original or replication paper (indexed
+    lookups), e.g. the part of the master an ingest needs for metadata fill
+    and citation reuse. Returns a DataFrame of data columns.
+    """
+    dois = [d for d in set(dois) if isinstance(d, str)]
+    frames, seen = [], set()
+    for start in range(0, len(dois), 250):
+        batch = dois[start:start + 250]
+        marks = ','.join('?' * len(batch))
+        df, row_ids = select_rows(conn, f"original_doi IN ({marks}) OR replication_doi IN ({marks})", batch + batch)
+        # A row citing DOIs from two batches is returned by both
+        new = ~row_ids.isin(seen)
+        seen.update(row_ids)
+        frames.append(df[new.values])
+    if not frames:
+        return pd.DataFrame(columns=data_columns(conn))
+    return pd.concat(frames, ignore_index=True)
+
+
+def rows_missing_es_r(conn):
+    """Rows where an es_r value is missing but the es value and type needed to compute it exist"""
+    return select_rows(conn, """
+        (original_es_r IS NULL AND original_es IS NOT NULL AND original_es_type IS NOT NULL)
+        OR (replication_es_r IS NULL AND replication_es IS NOT NULL AND replication_es_type IS NOT NULL)
+    """)
+
+
+def import_version(conn, entry=None):
+    """Seed the table from a CSV version (default: latest). Returns the number of rows imported."""
+    df = materialize_version(entry)
+    upsert_rows(conn, df, compute_row_ids(df))
+    return len(df)
+
+
+def export_frame(conn):
+    """
+    Return the whole table as a DataFrame in the same layout as the CSV
+    snapshots: columns in the order of the latest snapshot, then any it
+    doesn't have in table order (columns added by ALTER TABLE, e.g.
+    project_tag, would otherwise come last)
+    """
+    df, _ = select_rows(conn)
+    # read_sql_query makes INTEGER columns with NULLs float ("2018.0"); snapshots store them as integers
+    df = apply_schema_dtypes(df, float32=False)
+    ordered = [c for c in snapshot_columns() if c in df.columns]
+    return df[ordered + [c for c in df.columns if c not in ordered]]
+
+
+def export_csv(conn, path):
+    """Export the table as a CSV snapshot"""
+    df = export_frame(conn)
+    df.to_csv(path, index=False)
+    return len(df)
+
+
+def export_parquet(conn, path):
+    """Export the table as a Parquet snapshot (requires pyarrow)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+    df = export_frame(conn)
+    df.to_parquet(path, index=False)
+    return len(df)
+
+
+def publish(conn):
+    """
+    Commit the table to version_history.txt as a new full CSV snapshot.
+    The snapshot is exactly the table's contents, so rows that only exist in
+    the CSV history (ingested without the SQLite backend) are dropped.
+    """
+    pending_path = write_pending(export_frame(conn))
+    return commit_version(pending_path, head_version(), snapshot=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="SQLite storage backend for the Replications Database",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python sqlite_store.py import
+  python sqlite_store.py export --csv replications.csv --parquet replications.parquet
+  python sqlite_store.py publish
+        """
+    )
+    parser.add_argument('--db', type=str, default=SQLITE_PATH, help='SQLite database file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Seed the database from the CSV version history')
+    import_parser.add_argument('--version', type=str, default=None, help='Version entry to import (default: latest)')
+    export_parser = subparsers.add_parser('export', help='Export CSV and/or Parquet snapshots')
+    export_parser.add_argument('--csv', type=str, default=None, help='CSV output path')
+    export_parser.add_argument('--parquet', type=str, default=None, help='Parquet output path')
+    subparsers.add_parser('publish', help='Commit the database as a new CSV snapshot in version_history.txt')
+
+    args = parser.parse_args()
+    conn = connect(args.db)
+
+    if args.command == 'import':
+        print(f"✓ Imported {import_version(conn, args.version)} rows into {args.db}")
+    elif args.command == 'export':
+        if args.csv:
+            print(f"✓ Exported {export_csv(conn, args.csv)} rows to {args.csv}")
+        if args.parquet:
+            print(f"✓ Exported {export_parquet(conn, args.parquet)} rows to {args.parquet}")
+    elif args.command == 'publish':
+        filename = publish(conn)
+        if filename:
+            print(f"✓ Added {filename} to version_history.txt")
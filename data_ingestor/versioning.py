@@ -0,0 +1,401 @@
+"""
+Delta Versioning for Replications Database
+
+Instead of writing a full copy of the database on every ingest, each ingest
+writes a small delta CSV containing only the rows that were added, changed or
+removed. Entries in version_history.txt are either full snapshots
+(replications_database_*.csv) or deltas (replications_delta_*.csv). Any
+version can be rebuilt by taking the last snapshot at or before it and
+applying the deltas that follow it in order.
+
+Rows are identified by a hash of (original_url, replication_url, description).
+Rows that share the same key get an occurrence suffix ("<hash>-1", "<hash>-2"...)
+so that existing duplicates in the database keep distinct identities.
+
+Usage:
+    python versioning.py log
+    python versioning.py materialize [--version <entry>] --output <csv_file>
+    python versioning.py compact
+"""
+
+import pandas as pd
+import argparse
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from dedup import build_dedup_index, find_duplicates
+
+# Get the directory where this script lives
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
+VERSION_HISTORY_PATH = os.path.join(DATA_DIR, 'version_history.txt')
+
+SNAPSHOT_PREFIX = 'replications_database_'
+DELTA_PREFIX = 'replications_delta_'
+
+# Columns that define the identity of a row
+ROW_IDENTITY_COLUMNS = ['original_url', 'replication_url', 'description']
+
+# Bookkeeping columns stored in delta files only
+ROW_ID_COLUMN = '_row_id'
+OP_COLUMN = '_op'
+
+
+def read_version_history(path=VERSION_HISTORY_PATH):
+    """Return the list of version entries (filenames) in version_history.txt, oldest first"""
+    if not os.path.exists(path):
+        return []
+
+    with open(path, 'r') as f:
+        lines = f.readlines()
+
+    entries = []
+    for line in lines:
+        line = line.strip()
+        # Skip empty lines and comments
+        if not line or line.startswith('#'):
+            continue
+        # Extract just the filename (remove any path prefix and comments)
+        filename = line.split('#')[0].strip()
+        if filename.startswith('../data/'):
+            filename = filename.replace('../data/', '')
+        entries.append(filename)
+    return entries
+
+
+def head_version(path=VERSION_HISTORY_PATH):
+    """Return the most recent version entry, or None if there is no history"""
+    entries = read_version_history(path)
+    return entries[-1] if entries else None
+
+
+def is_delta(entry):
+    """True if a version entry refers to a delta file rather than a full snapshot"""
+    return os.path.basename(entry).startswith(DELTA_PREFIX)
+
+
+def compute_row_ids(df, occurrence_counts=None):
+    """
+    Compute a stable identity for every row from ROW_IDENTITY_COLUMNS.
+    Returns a Series of ids aligned with df.index.
+
+    occurrence_counts (optional dict of hash -> rows seen so far) lets ids be
+    computed chunk by chunk: occurrences continue from the counts, and the
+    dict is updated with this chunk's rows.
+    """
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+
+    key_parts = df.reindex(columns=ROW_IDENTITY_COLUMNS).fillna('').astype(str)
+    key = key_parts[ROW_IDENTITY_COLUMNS[0]]
+    for col in ROW_IDENTITY_COLUMNS[1:]:
+        key = key + '\x1f' + key_parts[col]
+
+    digests = key.map(lambda k: hashlib.sha1(k.encode('utf-8')).hexdigest()[:16])
+    occurrence = digests.groupby(digests).cumcount()
+    if occurrence_counts is not None:
+        occurrence = occurrence + digests.map(occurrence_counts).fillna(0).astype(int)
+        for digest, count in digests.value_counts().items():
+            occurrence_counts[digest] = occurrence_counts.get(digest, 0) + count
+    return digests.where(occurrence == 0, digests + '-' + occurrence.astype(str)).astype(object)
+
+
+def diff_frames(old_df, new_df):
+    """
+    Compute the delta that turns old_df into new_df.
+
+    Returns a DataFrame with an _op column ("added", "changed" or "removed"),
+    a _row_id column, and the full contents of added and changed rows.
+    Removed rows only carry their id.
+    """
+    old = old_df.set_index(compute_row_ids(old_df))
+    new = new_df.set_index(compute_row_ids(new_df))
+
+    added_ids = new.index.difference(old.index, sort=False)
+    removed_ids = old.index.difference(new.index, sort=False)
+    common_ids = new.index.intersection(old.index, sort=False)
+
+    # Compare common rows cell by cell (two missing values count as equal)
+    old_common = old.reindex(index=common_ids, columns=new.columns).astype(object)
+    new_common = new.loc[common_ids, new.columns].astype(object)
+    same = (old_common == new_common) | (old_common.isna() & new_common.isna())
+    changed_ids = common_ids[~same.all(axis=1).to_numpy()]
+
+    added = new.loc[added_ids].assign(**{OP_COLUMN: 'added'})
+    changed = new.loc[changed_ids].assign(**{OP_COLUMN: 'changed'})
+    removed = pd.DataFrame({OP_COLUMN: 'removed'}, index=removed_ids)
+
+    delta = pd.concat([added, changed, removed])
+    delta.index.name = ROW_ID_COLUMN
+    delta = delta.reset_index()
+    return delta[[OP_COLUMN, ROW_ID_COLUMN] + list(new.columns)]
+
+
+def apply_delta(df, delta):
+    """
+    Apply a delta (as produced by diff_frames) to df.
+    Row order is preserved: changed rows stay in place, added rows go at the end.
+    """
+    data_columns = [c for c in delta.columns if c not in (OP_COLUMN, ROW_ID_COLUMN)]
+    base = df.set_index(compute_row_ids(df))
+
+    ops = delta[OP_COLUMN]
+    delta = delta.set_index(ROW_ID_COLUMN)[data_columns]
+    removed_ids = delta.index[(ops == 'removed').to_numpy()]
+    changed = delta[(ops == 'changed').to_numpy()]
+    added = delta[(ops == 'added').to_numpy()]
+
+    base = base.drop(index=base.index.intersection(removed_ids))
+    changed = changed[changed.index.isin(base.index)]
+    if not changed.empty:
+        # Swap in the new version of changed rows, keeping their original position
+        order = base.index
+        base = pd.concat([base.drop(index=changed.index), changed]).reindex(order)
+
+    result = pd.concat([base, added])
+    # Keep the base column order, followed by any columns introduced by the delta
+    columns = list(df.columns) + [c for c in data_columns if c not in df.columns]
+    return result.reset_index(drop=True)[columns]
+
+
+def materialize_version(entry=None, path=VERSION_HISTORY_PATH):
+    """
+    Rebuild the database as of a version entry (defaults to the latest).
+    Loads the last full snapshot at or before the entry, then applies the
+    deltas after it in order. Returns an empty DataFrame if there is no history.
+    """
+    entries = read_version_history(path)
+    if entry is None:
+        if not entries:
+            return pd.DataFrame()
+        entry = entries[-1]
+    if entry not in entries:
+        raise ValueError(f"Version {entry} not found in {path}")
+
+    data_dir = os.path.dirname(path)
+    end = entries.index(entry)
+    start = end
+    while start >= 0 and is_delta(entries[start]):
+        start -= 1
+    if start < 0:
+        raise ValueError(f"No full snapshot found at or before {entry}")
+
+    df = pd.read_csv(os.path.join(data_dir, entries[start]))
+    for delta_entry in entries[start + 1:end + 1]:
+        df = apply_delta(df, read_delta(os.path.join(data_dir, delta_entry), df))
+    return df
+
+
+def snapshot_columns(entry=None, path=VERSION_HISTORY_PATH):
+    """
+    Column order of the full snapshot that entry (default: latest) is built
+    on, read from its header only. Returns [] if there is no history.
+    """
+    entries = read_version_history(path)
+    end = entries.index(entry) if entry in entries else len(entries) - 1
+    snapshots = [e for e in entries[:end + 1] if not is_delta(e)]
+    if not snapshots:
+        return []
+    return list(pd.read_csv(os.path.join(os.path.dirname(path), snapshots[-1]), nrows=0).columns)
+
+
+def read_delta(delta_path, base_df):
+    """
+    Read a delta CSV. Text columns of base_df are read as strings so a small
+    delta doesn't infer e.g. issue "4" as the float 4.0.
+    """
+    dtypes = {col: str for col in base_df.columns if not pd.api.types.is_numeric_dtype(base_df[col])}
+    dtypes.update({ROW_ID_COLUMN: str, OP_COLUMN: str})
+    return pd.read_csv(delta_path, dtype=dtypes)
+
+
+@contextmanager
+def version_history_lock(path=VERSION_HISTORY_PATH):
+    """
+    Hold an exclusive lock on version_history.txt (via a sibling .lock file)
+    so that only one ingest job commits a new version at a time.
+    """
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def atomic_write_text(path, text):
+    """Write a text file via a temp file + rename so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        # mkstemp creates files readable only by the owner; keep the usual mode
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def pending_version_path(data_dir=DATA_DIR):
+    """Return a fresh hidden path in data_dir to write a version file to before it is committed"""
+    fd, pending_path = tempfile.mkstemp(dir=data_dir, prefix='.pending_', suffix='.csv')
+    os.close(fd)
+    os.remove(pending_path)
+    return pending_path
+
+
+def write_pending(df, data_dir=DATA_DIR):
+    """Write a snapshot or delta DataFrame to a pending file and return its path"""
+    pending_path = pending_version_path(data_dir)
+    df.to_csv(pending_path, index=False)
+    return pending_path
+
+
+def append_to_version_history(filename, path=VERSION_HISTORY_PATH):
+    """Append a filename to version_history.txt (atomically; call with the lock held)"""
+    content = ''
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            content = f.read()
+    # Strip trailing whitespace and ensure single newline at end
+    atomic_write_text(path, (content.rstrip() + '\n' if content.strip() else '') + filename + '\n')
+
+
+def new_version_filename(prefix, timestamp=None):
+    """Return a timestamped filename for a new snapshot (SNAPSHOT_PREFIX) or delta (DELTA_PREFIX)"""
+    timestamp = timestamp or datetime.now().strftime("%Y_%m_%d_%H%M%S")
+    return f"{prefix}{timestamp}.csv"
+
+
+def append_delta_rows(delta_path, df, op, row_ids, columns):
+    """
+    Append rows to a delta CSV being written incrementally, writing the header
+    on the first call. columns fixes the data column order across calls.
+    """
+    chunk = df.reindex(columns=columns)
+    chunk.insert(0, ROW_ID_COLUMN, row_ids.to_numpy())
+    chunk.insert(0, OP_COLUMN, op)
+    chunk.to_csv(delta_path, mode='a', header=not os.path.exists(delta_path), index=False)
+
+
+def rebase_pending(pending_path, base_entry, head, snapshot, path=VERSION_HISTORY_PATH):
+    """
+    Rewrite a pending version computed against base_entry so it applies on top
+    of head instead. Added rows that duplicate rows already in head are
+    dropped; changed rows overwrite head's version of the row. Returns the
+    rebased pending delta path, or None if nothing is left to commit.
+    """
+    base_df = materialize_version(base_entry, path) if base_entry else pd.DataFrame()
+    if snapshot:
+        delta = diff_frames(base_df, pd.read_csv(pending_path))
+    else:
+        delta = read_delta(pending_path, base_df)
+    os.remove(pending_path)
+
+    head_df = materialize_version(head, path)
+    added = delta[OP_COLUMN] == 'added'
+    is_duplicate, _ = find_duplicates(delta[added], build_dedup_index(head_df))
+    if is_duplicate.any():
+        print(f"  Dropping {int(is_duplicate.sum())} added rows that are already in {head}")
+        delta = delta.drop(index=is_duplicate[is_duplicate].index)
+
+    rebased_delta = diff_frames(head_df, apply_delta(head_df, delta))
+    if rebased_delta.empty:
+        return None
+    return write_pending(rebased_delta, os.path.dirname(path))
+
+
+def commit_version(pending_path, base_entry, snapshot=False, path=VERSION_HISTORY_PATH):
+    """
+    Publish a pending snapshot or delta as a new version.
+
+    Takes the version history lock, then checks that the head is still
+    base_entry (the version the pending file was computed against). If
+    another job committed in the meantime, the pending file is rebased onto
+    the new head first. The file is moved into place and version_history.txt
+    rewritten with atomic renames. Returns the new filename, or None if the
+    rebase left nothing to commit.
+    """
+    data_dir = os.path.dirname(path)
+    with version_history_lock(path):
+        head = head_version(path)
+        if head != base_entry:
+            print(f"  Version history moved from {base_entry} to {head} while ingesting, rebasing...")
+            pending_path = rebase_pending(pending_path, base_entry, head, snapshot, path)
+            snapshot = False
+            if pending_path is None:
+                print("  Nothing left to commit after rebasing")
+                return None
+
+        filename = new_version_filename(SNAPSHOT_PREFIX if snapshot else DELTA_PREFIX)
+        while os.path.exists(os.path.join(data_dir, filename)):
+            # Another version was committed this second; timestamps must stay unique
+            time.sleep(1)
+            filename = new_version_filename(SNAPSHOT_PREFIX if snapshot else DELTA_PREFIX)
+        os.replace(pending_path, os.path.join(data_dir, filename))
+        append_to_version_history(filename, path)
+    return filename
+
+
+def compact(path=VERSION_HISTORY_PATH):
+    """
+    Fold all deltas since the last snapshot into a new full snapshot and
+    append it to version_history.txt. Older files are kept so earlier versions
+    remain reconstructable. Returns the new snapshot filename, or None if the
+    latest version is already a full snapshot.
+    """
+    head = head_version(path)
+    if head is None or not is_delta(head):
+        print("Latest version is already a full snapshot, nothing to compact")
+        return None
+
+    df = materialize_version(head, path)
+    pending_path = write_pending(df, os.path.dirname(path))
+    # If another job commits meanwhile, its delta is rebased onto our snapshot
+    filename = commit_version(pending_path, head, snapshot=True, path=path)
+    if filename:
+        print(f"✓ Compacted {head} into {filename} ({len(df)} rows)")
+    return filename
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Delta versioning for the Replications Database",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python versioning.py log
+  python versioning.py materialize --output latest.csv
+  python versioning.py materialize --version replications_delta_2026_02_01_120000.csv --output old.csv
+  python versioning.py compact
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('log', help='List versions and whether each is a snapshot or a delta')
+    materialize_parser = subparsers.add_parser('materialize', help='Rebuild a version as a full CSV')
+    materialize_parser.add_argument('--version', type=str, default=None,
+                                    help='Version entry to rebuild (default: latest)')
+    materialize_parser.add_argument('--output', type=str, required=True,
+                                    help='Where to write the rebuilt CSV')
+    subparsers.add_parser('compact', help='Fold deltas into a new full snapshot')
+
+    args = parser.parse_args()
+
+    if args.command == 'log':
+        for entry in read_version_history():
+            print(f"{'delta   ' if is_delta(entry) else 'snapshot'}  {entry}")
+    elif args.command == 'materialize':
+        df = materialize_version(args.version)
+        df.to_csv(args.output, index=False)
+        print(f"✓ Wrote {len(df)} rows to {args.output}")
+    elif args.command == 'compact':
+        filename = compact()
+        if filename:
+            # Imported here: doi_index imports this module
+            from doi_index import write_doi_index
+            write_doi_index(materialize_version(filename), filename)